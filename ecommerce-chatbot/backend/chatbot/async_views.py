@@ -0,0 +1,198 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
+
+from products.cache import aget_catalog_version
+from products.models import Product
+from .models import ChatSession
+from .serializers import ChatMessageSerializer
+from .renderers import format_event
+from .replies import ReplyPlan, plan_reply, iter_product_lines, format_product_details, remember_plan
+from .context import conversation_contexts, aload_context, may_be_follow_up, resolve_follow_up, DETAIL
+from .reply_cache import reply_cache
+from .turns import save_turn
+
+# Native async versions of the chat hot path, served by the ASGI application.
+# They accept JWT (Bearer) authentication or, for anonymous sessions, the
+# session_id query parameter, mirroring ChatSessionViewSet.get_queryset().
+
+jwt_authentication = JWTAuthentication()
+
+
+async def authenticate(request):
+    """
+    Return the JWT-authenticated user, or None for anonymous requests
+    """
+    result = await sync_to_async(jwt_authentication.authenticate)(request)
+    return result[0] if result else None
+
+
+async def get_session(request, user, pk):
+    if user is not None:
+        sessions = ChatSession.objects.filter(user=user)
+    else:
+        session_id = request.GET.get('session_id')
+        if not session_id:
+            return None
+        sessions = ChatSession.objects.filter(session_id=session_id)
+    try:
+        return await sessions.aget(pk=pk)
+    except ChatSession.DoesNotExist:
+        return None
+
+
+async def aiter_reply(plan):
+    """
+    Async counterpart of replies.iter_reply, fetching the listed products with the async ORM
+    """
+    yield plan.text
+    if plan.product_ids:
+        products = await Product.objects.ain_bulk(plan.product_ids)
+        for chunk in iter_product_lines(products[pk] for pk in plan.product_ids if pk in products):
+            yield chunk
+
+
+async def afollow_up_reply(message, session):
+    """
+    Async counterpart of replies.follow_up_reply
+    """
+    if not may_be_follow_up(message):
+        return None
+    context = await aload_context(session)
+    if not context or not context.product_ids:
+        return None
+    products = await Product.objects.ain_bulk(context.product_ids)
+    product = resolve_follow_up(message, context, [products[pk] for pk in context.product_ids if pk in products])
+    if product is None:
+        return None
+    conversation_contexts.set(session.session_id, context._replace(intent=DETAIL))
+    # The category name comes from the category cache, which may need a (sync) reload
+    return ReplyPlan(DETAIL, await sync_to_async(format_product_details)(product), [product.id])
+
+
+async def aiter_text(text):
+    yield text
+
+
+async def astart_reply(message, session):
+    """
+    Async counterpart of replies.start_reply: returns (plan, async chunks)
+    """
+    plan = await afollow_up_reply(message, session)
+    if plan is not None:
+        return plan, aiter_text(plan.text)
+
+    # The cache is valid for one catalog version, read with the async ORM
+    version = await aget_catalog_version()
+    cached = reply_cache.get(message, version)
+    if cached is not None:
+        remember_plan(session, cached.plan)
+        return cached.plan, aiter_text(cached.text)
+
+    # Intent resolution is sync code that queries the database on every call:
+    # full-text search (the default backend), the category fallback and, now
+    # and then, category cache and search index reloads. It runs as one
+    # thread-sensitive call; Django's ASGI handler gives every request its
+    # own thread for those (ThreadSensitiveContext), so concurrent requests do
+    # not queue behind one another, and the request's connection is closed
+    # with it as usual.
+    plan = await sync_to_async(plan_reply)(message)
+    remember_plan(session, plan)
+    return plan, aiter_caching_reply(message, plan, version)
+
+
+async def aiter_caching_reply(message, plan, version):
+    chunks = []
+    async for chunk in aiter_reply(plan):
+        chunks.append(chunk)
+        yield chunk
+    reply_cache.set(message, plan, "".join(chunks), version)
+
+
+async def start_turn(request, pk):
+    """
+    Authenticate, load the session and validate the user message; nothing is saved yet.
+    Returns (session, content, None) or (None, None, error_response).
+    """
+    try:
+        user = await authenticate(request)
+    except (InvalidToken, AuthenticationFailed) as error:
+        detail = error.detail if isinstance(error.detail, dict) else {"detail": error.detail}
+        return None, None, JsonResponse(detail, status=401)
+
+    session = await get_session(request, user, pk)
+    if session is None:
+        return None, None, JsonResponse({"detail": "No ChatSession matches the given query."}, status=404)
+
+    try:
+        content = json.loads(request.body or b'{}').get('message', '')
+    except (ValueError, AttributeError):
+        return None, None, JsonResponse({"detail": "Malformed JSON request body."}, status=400)
+    if not isinstance(content, str) or not content.strip():
+        return None, None, JsonResponse({"content": ["This field may not be blank."]}, status=400)
+    return session, content, None
+
+
+# Both messages and the session's updated_at in one transaction, as the sync views do
+asave_turn = sync_to_async(save_turn)
+
+
+@csrf_exempt
+@require_POST
+async def send_message(request, pk):
+    """
+    Send a message in the chat session and get a response from the chatbot
+    """
+    session, content, error = await start_turn(request, pk)
+    if error is not None:
+        return error
+
+    plan, reply = await astart_reply(content, session)
+    reply_content = "".join([chunk async for chunk in reply])
+    user_message, assistant_message = await asave_turn(session, content, reply_content, plan)
+
+    return JsonResponse({
+        'messages': ChatMessageSerializer([user_message, assistant_message], many=True).data,
+        'cursor': assistant_message.id,
+    })
+
+
+async def aevent_stream(session, content):
+    """
+    The Server-Sent Events of one chat turn: 'delta' events as the reply is
+    produced, then the saved 'user' and 'assistant' messages
+    """
+    plan, reply = await astart_reply(content, session)
+    chunks = []
+    async for chunk in reply:
+        chunks.append(chunk)
+        yield format_event('delta', {'content': chunk})
+
+    user_message, assistant_message = await asave_turn(session, content, "".join(chunks), plan)
+    yield format_event('user', ChatMessageSerializer(user_message).data)
+    yield format_event('assistant', {
+        'message': ChatMessageSerializer(assistant_message).data,
+        'cursor': assistant_message.id,
+    })
+
+
+@csrf_exempt
+@require_POST
+async def send_message_stream(request, pk):
+    """
+    Send a message in the chat session and stream the chatbot's reply as Server-Sent Events,
+    in the same order as ChatSessionViewSet.send_message_stream
+    """
+    session, content, error = await start_turn(request, pk)
+    if error is not None:
+        return error
+
+    response = StreamingHttpResponse(aevent_stream(session, content), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Stop proxies from buffering the stream
+    return response
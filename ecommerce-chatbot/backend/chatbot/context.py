@@ -0,0 +1,238 @@
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+
+from .intents import CATEGORY, SEARCH
+
+DETAIL = 'detail'
+
+# What the chatbot last showed in a session: the intent, the listed product ids and the active filters
+ConversationContext = namedtuple('ConversationContext', ['intent', 'product_ids', 'filters'])
+
+# Product lines as written by replies.format_product_line()
+PRODUCT_LINE_RE = re.compile(r'^- (?P<name>.+): \$[\d.]+ \(\d+ in stock\)$', re.MULTILINE)
+# Replies may open with a "Did you mean ...?" correction before the header
+CATEGORY_HEADER_RE = re.compile(r'Here are some (?P<keyword>.+) products I found for you:')
+SEARCH_HEADER = "I found these products that might interest you:"
+
+# How many recent assistant messages to scan when rebuilding a context
+REBUILD_MESSAGES = 5
+
+
+class ConversationContextStore:
+    """
+    Bounded, TTL-evicted store of the conversation context of each chat session,
+    keyed by ChatSession.session_id.
+
+    Holds at most CHAT_CONTEXT_MAX_SESSIONS sessions (least recently used are
+    evicted first); entries idle for longer than CHAT_CONTEXT_TTL seconds expire.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    @property
+    def max_sessions(self):
+        return getattr(settings, 'CHAT_CONTEXT_MAX_SESSIONS', 10000)
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'CHAT_CONTEXT_TTL', 30 * 60)
+
+    def get(self, session_id):
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return None
+            stored_at, context = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[session_id]
+                return None
+            self._entries.move_to_end(session_id)
+            return context
+
+    def set(self, session_id, context):
+        with self._lock:
+            self._entries.pop(session_id, None)
+            self._entries[session_id] = (time.monotonic(), context)
+            while len(self._entries) > self.max_sessions:
+                self._entries.popitem(last=False)
+
+    def discard(self, session_id):
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+conversation_contexts = ConversationContextStore()
+
+
+def parse_reply(content):
+    """
+    Recover (intent, product names, filters) from the text of an assistant
+    reply; only needed for replies saved without their intent and product ids
+    """
+    names = [match.group('name') for match in PRODUCT_LINE_RE.finditer(content)]
+    header = CATEGORY_HEADER_RE.search(content)
+    if header:
+        return CATEGORY, names, {'keyword': header.group('keyword')}
+    if SEARCH_HEADER in content:
+        return SEARCH, names, {}
+    return None, names, {}
+
+
+def select_context(replies):
+    """
+    Pick a context from recent assistant replies, newest first, given as
+    (intent, product_ids, content) rows: the intent of the newest reply and
+    the products of the newest non-detail reply that listed any. Replies
+    saved before their intent and product ids were recorded are parsed from
+    their text; their products come back as names.
+    Returns (intent, product_ids, names, filters).
+    """
+    intent = None
+    for position, (reply_intent, product_ids, content) in enumerate(replies):
+        if not reply_intent:
+            reply_intent, names, filters = parse_reply(content)
+            product_ids = None
+        else:
+            names, filters = None, {}
+        if position == 0:
+            intent = reply_intent
+        if reply_intent != DETAIL and (product_ids or names):
+            return intent, product_ids or [], names or [], filters
+    return intent, [], [], {}
+
+
+def recent_replies(session):
+    from .models import ChatMessage
+
+    replies = ChatMessage.objects.filter(session=session, role='assistant').order_by('-timestamp', '-id')
+    return replies.values_list('intent', 'product_ids', 'content')[:REBUILD_MESSAGES]
+
+
+def rebuild_context(session):
+    """
+    Rebuild a session's context from its most recent assistant messages
+    """
+    from products.models import Product
+
+    replies = list(recent_replies(session))
+    if not replies:
+        return None
+    intent, product_ids, names, filters = select_context(replies)
+    if names:
+        ids_by_name = dict(Product.objects.filter(name__in=names).values_list('name', 'id'))
+        product_ids = [ids_by_name[name] for name in names if name in ids_by_name]
+    return ConversationContext(intent, product_ids, filters)
+
+
+def load_context(session):
+    """
+    Return the context of a session, rebuilding and storing it on a cache miss
+    """
+    context = conversation_contexts.get(session.session_id)
+    if context is None:
+        context = rebuild_context(session)
+        if context is not None:
+            conversation_contexts.set(session.session_id, context)
+    return context
+
+
+async def arebuild_context(session):
+    from products.models import Product
+
+    replies = [reply async for reply in recent_replies(session)]
+    if not replies:
+        return None
+    intent, product_ids, names, filters = select_context(replies)
+    if names:
+        ids_by_name = {}
+        async for name, product_id in Product.objects.filter(name__in=names).values_list('name', 'id'):
+            ids_by_name[name] = product_id
+        product_ids = [ids_by_name[name] for name in names if name in ids_by_name]
+    return ConversationContext(intent, product_ids, filters)
+
+
+async def aload_context(session):
+    context = conversation_contexts.get(session.session_id)
+    if context is None:
+        context = await arebuild_context(session)
+        if context is not None:
+            conversation_contexts.set(session.session_id, context)
+    return context
+
+
+ORDINALS = {
+    'first': 0, '1st': 0, 'second': 1, '2nd': 1, 'third': 2, '3rd': 2,
+    'fourth': 3, '4th': 3, 'fifth': 4, '5th': 4, 'last': -1,
+}
+# An ordinal only points into the listing on its own ("the second", "the last?")
+# or before a word for an entry ("the first one"), not in "first aid kit"
+ORDINAL_RE = re.compile(
+    r'\b(%s)\b(?=\s+(?:one|item|product|option|result)s?\b|\s+please\b|\s*[?.!,;]|\s*$)' % '|'.join(ORDINALS)
+)
+NUMBERED_RE = re.compile(r'(?:\bnumber|\bno\.|#|\boption)\s*(\d+)\b')
+DETAIL_RE = re.compile(r'\b(details?|about|more|tell me|info|information)\b')
+PRONOUN_RE = re.compile(r'\b(it|that|this|that one|this one)\b')
+# Words referring back to what was listed
+ANAPHORA_RE = re.compile(r'\b(it|that|this|these|those|them|one|ones)\b')
+
+# Longer messages are new requests unless they refer back to the listing
+FOLLOW_UP_MAX_WORDS = 8
+
+
+def refers_back(message):
+    """
+    Whether a (lowercased) message is short or anaphoric enough to be a follow-up
+    """
+    return len(message.split()) <= FOLLOW_UP_MAX_WORDS or bool(ANAPHORA_RE.search(message))
+
+
+def resolve_follow_up(message, context, products):
+    """
+    Work out which previously listed product a follow-up message refers to.
+    `products` are the context's products in the order they were listed.
+    Returns the product, or None when the message is not a follow-up.
+    Positions ("the second one", "number 3") only count in short or
+    anaphoric messages; a detail request naming a listed product always does.
+    """
+    if not context or not products:
+        return None
+    message = message.lower()
+
+    if refers_back(message):
+        ordinal = ORDINAL_RE.search(message)
+        if ordinal:
+            position = ORDINALS[ordinal.group(1)]
+            return products[position] if position < len(products) else None
+
+        numbered = NUMBERED_RE.search(message)
+        if numbered:
+            position = int(numbered.group(1)) - 1
+            return products[position] if 0 <= position < len(products) else None
+
+    if DETAIL_RE.search(message):
+        for product in products:
+            if product.name.lower() in message:
+                return product
+        if len(products) == 1 and PRONOUN_RE.search(message):
+            return products[0]
+    return None
+
+
+def may_be_follow_up(message):
+    """
+    Cheap pre-check so that ordinary messages never load the previous products
+    """
+    message = message.lower()
+    if DETAIL_RE.search(message):
+        return True
+    return refers_back(message) and bool(ORDINAL_RE.search(message) or NUMBERED_RE.search(message))
@@ -0,0 +1,111 @@
+import re
+from collections import namedtuple
+
+from products.fuzzy import TrigramIndex
+
+# Dictionary mapping common product categories and terms to their database equivalents
+PRODUCT_CATEGORIES = {
+    'mobile': 'Electronics',
+    'phone': 'Electronics',
+    'smartphone': 'Electronics',
+    'laptop': 'Electronics',
+    'computer': 'Electronics',
+    'camera': 'Electronics',
+    'headphone': 'Electronics',
+    'speaker': 'Electronics',
+    'watch': 'Electronics',
+    'smartwatch': 'Electronics',
+    'clothing': 'Clothing',
+    'shirt': 'Clothing',
+    'pants': 'Clothing',
+    'dress': 'Clothing',
+    'shoes': 'Clothing',
+    'kitchen': 'Home & Kitchen',
+    'home': 'Home & Kitchen',
+    'furniture': 'Home & Kitchen',
+    'book': 'Books',
+    'sport': 'Sports & Outdoors',
+    'fitness': 'Sports & Outdoors',
+    'beauty': 'Beauty & Personal Care',
+    'cosmetic': 'Beauty & Personal Care',
+    'toy': 'Toys & Games',
+    'game': 'Toys & Games',
+    'health': 'Health & Wellness',
+    'wellness': 'Health & Wellness'
+}
+
+SEARCH_KEYWORDS = ['search', 'find', 'looking for', 'show', 'display', 'get', 'want']
+GREETING_KEYWORDS = ['hello', 'hi', 'hey', 'greetings']
+HELP_KEYWORDS = ['help', 'assist', 'support']
+BROWSE_KEYWORDS = ['category', 'categories', 'browse']
+
+# Words that carry no product meaning when extracting search keywords
+SEARCH_STOP_WORDS = frozenset([
+    'search', 'find', 'looking', 'for', 'show', 'me', 'a', 'the', 'and', 'or',
+    'in', 'display', 'get', 'want', 'to', 'see'
+])
+
+CATEGORY = 'category'
+SEARCH = 'search'
+GREETING = 'greeting'
+HELP = 'help'
+BROWSE = 'browse'
+
+KeywordMatch = namedtuple('KeywordMatch', ['keyword', 'intent', 'value', 'start', 'end'])
+
+
+class IntentMatcher:
+    """
+    Finds every intent and category keyword in a message with a single regex pass.
+
+    Keywords only match on word boundaries (so "home" does not match inside
+    "homework") and may carry a plural suffix ("phones", "watches"). Longer
+    keywords are tried first, so "smartphone" wins over "phone".
+    """
+
+    def __init__(self, keywords):
+        # keywords maps keyword -> (intent, value)
+        self.keywords = dict(keywords)
+        alternatives = sorted(self.keywords, key=lambda keyword: (-len(keyword), keyword))
+        self.pattern = re.compile(
+            r'\b(%s)(?:e?s)?\b' % '|'.join(re.escape(keyword) for keyword in alternatives)
+        )
+
+    def scan(self, message):
+        """
+        Return the keyword matches in the order they appear in the message
+        """
+        matches = []
+        for match in self.pattern.finditer(message.lower()):
+            keyword = match.group(1)
+            intent, value = self.keywords[keyword]
+            matches.append(KeywordMatch(keyword, intent, value, match.start(), match.end()))
+        return matches
+
+    def intents(self, message):
+        """
+        Group the matches of a message by intent
+        """
+        grouped = {}
+        for match in self.scan(message):
+            grouped.setdefault(match.intent, []).append(match)
+        return grouped
+
+
+def _build_keywords():
+    keywords = {}
+    for intent, words in ((SEARCH, SEARCH_KEYWORDS), (GREETING, GREETING_KEYWORDS),
+                          (HELP, HELP_KEYWORDS), (BROWSE, BROWSE_KEYWORDS)):
+        for word in words:
+            keywords[word] = (intent, None)
+    for keyword, category_name in PRODUCT_CATEGORIES.items():
+        keywords[keyword] = (CATEGORY, category_name)
+    return keywords
+
+
+intent_matcher = IntentMatcher(_build_keywords())
+
+# Every word the intent matcher knows, for correcting misspelled keywords ("smarphone")
+keyword_vocabulary = TrigramIndex(
+    word for keyword in intent_matcher.keywords for word in keyword.split()
+)
@@ -0,0 +1,95 @@
+import io
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from chatbot.models import ChatSession, ChatMessage
+from chatbot.views import ChatSessionViewSet
+from ecommerce_backend.renderers import FastJSONParser, FastJSONRenderer, orjson
+from products.models import Category, Product
+from products.views import ProductViewSet
+
+
+class Command(BaseCommand):
+    help = "Time DRF's JSON renderer and parser against the orjson-backed ones on /api/products/ and chat history"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100, help="Throwaway products to list (default 100)")
+        parser.add_argument('--sessions', type=int, default=20, help="Throwaway chat sessions (default 20)")
+        parser.add_argument('--messages', type=int, default=50, help="Messages per chat session (default 50)")
+        parser.add_argument('--repeat', type=int, default=50, help="Timed runs of each renderer (default 50)")
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING("orjson is not installed: the fast classes fall back to json"))
+        # The benchmark data is rolled back afterwards
+        with transaction.atomic():
+            user = self.create_data(options['products'], options['sessions'], options['messages'])
+            factory = APIRequestFactory()
+            responses = {}
+
+            request = factory.get('/api/products/', {'page_size': 100})
+            responses['/api/products/'] = ProductViewSet.as_view({'get': 'list'})(request)
+
+            request = factory.get('/api/chat-sessions/history/', {'page_size': 100, 'messages': 200})
+            force_authenticate(request, user=user)
+            responses['history'] = ChatSessionViewSet.as_view({'get': 'history'})(request)
+
+            for name, response in responses.items():
+                self.benchmark(name, response.data, options['repeat'])
+            transaction.set_rollback(True)
+
+    def create_data(self, products, sessions, messages):
+        # bulk_create sends no signals, so the search indexes are left alone
+        category, _ = Category.objects.get_or_create(slug='benchmark', defaults={'name': 'Benchmark'})
+        Product.objects.bulk_create([
+            Product(
+                name=f"Benchmark product {number}",
+                slug=f"benchmark-product-{number}",
+                description="A product created by benchmark_renderers, with a description of typical length. " * 3,
+                price=Decimal(number % 1000) + Decimal('0.99'),
+                category=category,
+                image_url='https://example.com/benchmark.png',
+                stock=number % 50,
+            )
+            for number in range(products)
+        ], batch_size=1000)
+        user = User.objects.create_user(username='benchmark-renderers')
+        chat_sessions = ChatSession.objects.bulk_create([
+            ChatSession(user=user, session_id=f"benchmark-renderers-{number}") for number in range(sessions)
+        ])
+        ChatMessage.objects.bulk_create([
+            ChatMessage(session=session, role=role, content=f"Do you have anything like product {number}? " * 4)
+            for session in chat_sessions
+            for number in range(messages // 2)
+            for role in ('user', 'assistant')
+        ], batch_size=1000)
+        return user
+
+    def benchmark(self, name, data, repeat):
+        expected = JSONRenderer().render(data)
+        if FastJSONRenderer().render(data) != expected:
+            raise CommandError(f"{name}: the fast renderer output differs from JSONRenderer")
+        self.stdout.write(f"{name}: {len(expected)} bytes, {repeat} runs each")
+        timings = {}
+        for label, render in (
+            ('JSONRenderer', lambda: JSONRenderer().render(data)),
+            ('FastJSONRenderer', lambda: FastJSONRenderer().render(data)),
+            ('JSONParser', lambda: JSONParser().parse(io.BytesIO(expected))),
+            ('FastJSONParser', lambda: FastJSONParser().parse(io.BytesIO(expected))),
+        ):
+            started = time.perf_counter()
+            for _ in range(repeat):
+                render()
+            timings[label] = (time.perf_counter() - started) / repeat
+            self.stdout.write(f"  {label:<17} {timings[label] * 1000:8.3f} ms")
+        self.stdout.write(self.style.SUCCESS(
+            f"  Rendering {timings['JSONRenderer'] / timings['FastJSONRenderer']:.1f}x faster, "
+            f"parsing {timings['JSONParser'] / timings['FastJSONParser']:.1f}x faster"
+        ))
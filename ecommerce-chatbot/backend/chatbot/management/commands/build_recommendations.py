@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from chatbot.recommendations import build_recommendations
+
+
+class Command(BaseCommand):
+    help = "Update the product recommendations from the chat messages written since the last run"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help="Reprocess all chat history instead of only the new messages",
+        )
+
+    def handle(self, *args, **options):
+        watermark, written = build_recommendations(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Updated {written} neighbor lists (chat messages read up to id {watermark})"
+        ))
@@ -0,0 +1,142 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Max
+
+from chatbot.models import ChatSession, ChatMessage
+from ecommerce_backend import synthetic
+from products.importing import refresh_catalog
+from products.models import Category, Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a deterministic synthetic dataset for load testing: products, users with profiles, "
+        "chat sessions and messages. The same seed and counts always give the same rows, "
+        "so run it against an empty database to compare benchmarks across commits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0, help="Seed of the dataset (default 0)")
+        parser.add_argument('--products', type=int, default=1000, help="Products to generate (default 1000)")
+        parser.add_argument('--users', type=int, default=1000, help="Users to generate (default 1000)")
+        parser.add_argument(
+            '--sessions', type=int, default=2000,
+            help="Chat sessions to generate, with about 7 messages each on average (default 2000)",
+        )
+        parser.add_argument(
+            '--password', default='loadtest', help="Password of every generated user (default 'loadtest')",
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help="Processes generating rows; 0 generates them in this process (default: one per CPU)",
+        )
+
+    def handle(self, *args, **options):
+        for option in ('products', 'users', 'sessions', 'workers'):
+            if options[option] < 0:
+                raise CommandError(f"--{option} must not be negative")
+        self.started = time.monotonic()
+        seed = options['seed']
+        workers = options['workers']
+
+        # Rows are generated and converted for the database in worker
+        # processes, and written here in chunk order
+        self.executor = ProcessPoolExecutor(workers, initializer=django.setup) if workers else None
+        self.window = 2 * workers
+        try:
+            first_product_id = self.next_id(Product)
+            products = self.create_products(seed, options['products'], first_product_id)
+            first_user_id = self.next_id(User)
+            users = self.create_users(seed, options['users'], first_user_id, options['password'])
+            sessions, messages = self.create_sessions(
+                seed, options['sessions'], users, first_user_id, products, first_product_id,
+            )
+        except IntegrityError as exc:
+            raise CommandError(f"{exc}: this seed's rows are already in the database; start from an empty one")
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown(cancel_futures=True)
+
+        # Rows were inserted with explicit ids: move the sequences past them
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [Product, User, ChatSession]):
+                cursor.execute(sql)
+
+        self.stderr.write('')
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {products} products, {users} users, {sessions} chat sessions and {messages} messages "
+            f"with seed {seed} in {time.monotonic() - self.started:.1f}s"
+        ))
+
+    def next_id(self, model):
+        return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+    def progress(self, name, done, total):
+        self.stderr.write(f"{name}: {done}/{total} ({time.monotonic() - self.started:.1f}s)", ending='\r')
+
+    def insert_chunks(self, function, tasks, name, total):
+        """
+        Insert the tables generated by function(*task) for every task, one transaction per chunk;
+        returns the number of rows written per model
+        """
+        written = {}
+        for tables in synthetic.ordered_results(self.executor, function, tasks, self.window):
+            with transaction.atomic():
+                for model, columns, rows in tables:
+                    synthetic.insert(model, columns, rows)
+            for model, _, rows in tables:
+                written[model] = written.get(model, 0) + len(rows)
+            self.progress(name, written[tables[0][0]], total)
+        return written
+
+    def create_products(self, seed, total, first_id):
+        if not total:
+            return 0
+        category_ids = {}
+        for name in synthetic.category_names():
+            category, _ = Category.objects.get_or_create(name=name)
+            category_ids[name] = category.id
+        tasks = [
+            (seed, chunk, start, count, first_id, category_ids)
+            for chunk, start, count in synthetic.chunks(total)
+        ]
+        try:
+            self.insert_chunks(synthetic.generate_products, tasks, "Products", total)
+        finally:
+            # The inserts send no signals
+            if Product.objects.exists():
+                refresh_catalog()
+        return total
+
+    def create_users(self, seed, total, first_id, password):
+        if not total:
+            return 0
+        # One hash for every user: hashing millions of passwords would take hours
+        password = make_password(password, salt=f'loadtest{seed}')
+        tasks = [
+            (seed, chunk, start, count, total, first_id, password)
+            for chunk, start, count in synthetic.chunks(total)
+        ]
+        # Profiles are generated too: the post_save signal that creates them is not sent
+        self.insert_chunks(synthetic.generate_users, tasks, "Users", total)
+        return total
+
+    def create_sessions(self, seed, total, users, first_user_id, products, first_product_id):
+        if not total:
+            return 0, 0
+        first_id = self.next_id(ChatSession)
+        # Replies list the generated products, regenerated from the seed in the workers
+        tasks = [
+            (seed, chunk, start, count, first_id, users, first_user_id, products, first_product_id)
+            for chunk, start, count in synthetic.chunks(total)
+        ]
+        written = self.insert_chunks(synthetic.generate_sessions, tasks, "Chat sessions", total)
+        return total, written[ChatMessage]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.2 on 2026-10-18 18:59
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0002_alter_chatsession_user'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='chatmessage',
+            options={'ordering': ['timestamp', 'id']},
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.2 on 2026-10-18 20:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0004_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmessage',
+            name='intent',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='chatmessage',
+            name='product_ids',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
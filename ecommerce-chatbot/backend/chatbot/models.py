@@ -4,7 +4,8 @@ from django.contrib.auth import get_user_model
 User = get_user_model()
 
 class ChatSession(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chat_sessions', null=True, blank=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chat_sessions', null=True, blank=True,
+                             db_index=False)  # Covered by chat_session_user_updated_idx
     session_id = models.CharField(max_length=100, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -13,6 +14,12 @@ class ChatSession(models.Model):
         if self.user:
             return f"Chat session {self.session_id} - {self.user.username}"
         return f"Chat session {self.session_id} - Anonymous"
+    
+    class Meta:
+        indexes = [
+            # A user's sessions, most recently updated first (list and history)
+            models.Index(fields=['user', '-updated_at'], name='chat_session_user_updated_idx'),
+        ]
 
 class ChatMessage(models.Model):
     ROLE_CHOICES = (
@@ -20,13 +27,23 @@ class ChatMessage(models.Model):
         ('assistant', 'Assistant'),
     )
     
-    session = models.ForeignKey(ChatSession, on_delete=models.CASCADE, related_name='messages')
+    session = models.ForeignKey(ChatSession, on_delete=models.CASCADE, related_name='messages',
+                                db_index=False)  # Covered by chat_message_session_ts_idx
     role = models.CharField(max_length=10, choices=ROLE_CHOICES)
     content = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
+    # What an assistant reply showed: its intent and the ids of the products it
+    # listed, in order (for a detail reply, the product described). Empty for
+    # user messages and for replies saved before these were recorded.
+    intent = models.CharField(max_length=20, blank=True, default='')
+    product_ids = models.JSONField(default=list, blank=True)
     
     def __str__(self):
         return f"{self.role}: {self.content[:50]}..."
     
     class Meta:
-        ordering = ['timestamp']
+        ordering = ['timestamp', 'id']
+        indexes = [
+            # A session's messages in transcript order (the default ordering)
+            models.Index(fields=['session', 'timestamp', 'id'], name='chat_message_session_ts_idx'),
+        ]
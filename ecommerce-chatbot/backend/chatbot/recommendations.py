@@ -0,0 +1,211 @@
+import re
+
+from django.db import transaction
+from django.db.models import Q
+
+from products.models import Product, ProductNeighbors
+from products.recommendations import CooccurrenceMatrix, save_neighbors
+from .context import parse_reply, load_context, DETAIL
+from .models import ChatSession, ChatMessage
+
+# Event weights: products listed together in one reply, and products a user
+# asked about in the same session ("tell me about the second one")
+CO_LISTED_WEIGHT = 1.0
+FOLLOW_UP_WEIGHT = 3.0
+
+# How many earlier follow-ups of a session a new follow-up is paired with
+MAX_FOLLOW_UPS = 10
+
+# Detail replies as written by replies.format_product_details()
+DETAIL_HEADER_RE = re.compile(r'^Here are the details for (?P<name>.+):$', re.MULTILINE)
+
+BATCH_SIZE = 2000
+
+
+def parse_followed_up(content):
+    match = DETAIL_HEADER_RE.match(content)
+    return match.group('name') if match else None
+
+
+def ids_by_name(names):
+    """
+    Map product names to ids (the oldest product wins when names repeat)
+    """
+    names = list(set(names))
+    mapping = {}
+    for start in range(0, len(names), 500):
+        rows = Product.objects.filter(name__in=names[start:start + 500]).order_by('-id').values_list('name', 'id')
+        mapping.update(rows)
+    return mapping
+
+
+def reply_event(intent, product_ids, content):
+    """
+    What an assistant reply tells: ('detail', product) for a follow-up,
+    ('listed', products) for a listing, or None. Products are ids, or names
+    for replies saved before their intent and product ids were recorded.
+    """
+    if intent:
+        if intent == DETAIL:
+            return ('detail', product_ids[0]) if product_ids else None
+        return ('listed', product_ids) if product_ids else None
+    name = parse_followed_up(content)
+    if name:
+        return 'detail', name
+    names = parse_reply(content)[1]
+    return ('listed', names) if names else None
+
+
+def resolve_names(events):
+    """
+    Replace the product names of legacy reply events with ids, dropping unknown products
+    """
+    names = []
+    for kind, products in events:
+        if kind == 'detail':
+            products = [products]
+        names.extend(product for product in products if isinstance(product, str))
+    mapping = ids_by_name(names) if names else {}
+
+    def resolve(product):
+        return mapping.get(product) if isinstance(product, str) else product
+
+    resolved = []
+    for kind, products in events:
+        if kind == 'detail':
+            products = resolve(products)
+        else:
+            products = [product for product in map(resolve, products) if product is not None]
+        resolved.append((kind, products))
+    return resolved
+
+
+def earlier_follow_ups(session_ids, before_id):
+    """
+    The products each session followed up on before message `before_id`, oldest first
+    """
+    sessions, events = [], []
+    messages = ChatMessage.objects.filter(
+        Q(intent=DETAIL) | Q(intent='', content__startswith='Here are the details for '),
+        session_id__in=session_ids, role='assistant', id__lte=before_id,
+    ).order_by('id').values_list('session_id', 'intent', 'product_ids', 'content')
+    for session_id, intent, product_ids, content in messages.iterator(chunk_size=BATCH_SIZE):
+        event = reply_event(intent, product_ids, content)
+        if event is not None:
+            sessions.append(session_id)
+            events.append(event)
+    follow_ups = {}
+    for session_id, (_, product_id) in zip(sessions, resolve_names(events)):
+        if product_id is not None:
+            follow_ups.setdefault(session_id, []).append(product_id)
+    return {session_id: product_ids[-MAX_FOLLOW_UPS:] for session_id, product_ids in follow_ups.items()}
+
+
+class ChatEventReader:
+    """
+    Reads co-occurrence events from the assistant messages written after a
+    given message id, in batches:
+
+    - the products listed together in one reply (weight CO_LISTED_WEIGHT)
+    - each product a user asked about paired with the products the same
+      session asked about before it (weight FOLLOW_UP_WEIGHT)
+
+    Replies record their intent and product ids; older replies, saved
+    without them, are parsed from their text.
+    """
+
+    def __init__(self, after_id):
+        self.after_id = after_id
+        # session id -> ids of the products followed up on, oldest first
+        self.follow_ups = {}
+        self._loaded_sessions = set()
+
+    def batches(self):
+        """
+        Yield (id of the last message read, event groups) per batch
+        """
+        replies = ChatMessage.objects.filter(role='assistant', id__gt=self.after_id).order_by('id')
+        batch = []
+        rows = replies.values_list('id', 'session_id', 'intent', 'product_ids', 'content')
+        for message in rows.iterator(chunk_size=BATCH_SIZE):
+            batch.append(message)
+            if len(batch) == BATCH_SIZE:
+                yield batch[-1][0], self.events(batch)
+                batch = []
+        if batch:
+            yield batch[-1][0], self.events(batch)
+
+    def events(self, batch):
+        sessions, events = [], []
+        for _, session_id, intent, product_ids, content in batch:
+            event = reply_event(intent, product_ids, content)
+            if event is not None:
+                sessions.append(session_id)
+                events.append(event)
+
+        # Sessions that continue across the watermark pick up their earlier follow-ups
+        followed_sessions = {session_id for session_id, (kind, _) in zip(sessions, events) if kind == 'detail'}
+        followed_sessions -= self._loaded_sessions
+        if followed_sessions and self.after_id:
+            self.follow_ups.update(earlier_follow_ups(followed_sessions, self.after_id))
+        self._loaded_sessions |= followed_sessions
+
+        groups = []
+        for session_id, (kind, products) in zip(sessions, resolve_names(events)):
+            if kind == 'listed':
+                if len(products) > 1:
+                    groups.append((products, CO_LISTED_WEIGHT))
+                continue
+            if products is None:
+                continue
+            history = self.follow_ups.setdefault(session_id, [])
+            for earlier in history:
+                if earlier != products:
+                    groups.append(([earlier, products], FOLLOW_UP_WEIGHT))
+            if products in history:
+                history.remove(products)
+            history.append(products)
+            del history[:-MAX_FOLLOW_UPS]
+        return [group for group in groups if len(set(group[0])) > 1]
+
+
+def build_recommendations(full=False, directory=None):
+    """
+    Update the co-occurrence matrix with the chat messages written since the
+    last build and rewrite the neighbor lists of the affected products.
+    With full=True, all chat history is reprocessed from scratch.
+    Returns (messages watermark, number of neighbor lists written).
+    """
+    matrix = CooccurrenceMatrix() if full else CooccurrenceMatrix.load(directory)
+    touched = set()
+    for watermark, groups in ChatEventReader(matrix.watermark).batches():
+        touched.update(matrix.add(groups).tolist())
+        matrix.watermark = watermark
+
+    with transaction.atomic():
+        if full:
+            ProductNeighbors.objects.all().delete()
+            rows = range(matrix.counts.shape[0])
+        else:
+            rows = matrix.affected_rows(sorted(touched))
+        written = save_neighbors(matrix, rows)
+    matrix.save(directory)
+    return matrix.watermark, written
+
+
+def seed_product_ids(user=None, session_id=None):
+    """
+    The products a user or chat session was last shown, in the order listed:
+    those of the given session, or of the user's most recently active session
+    """
+    sessions = ChatSession.objects.all()
+    if session_id:
+        session = sessions.filter(session_id=session_id).first()
+    elif user is not None and user.is_authenticated:
+        session = sessions.filter(user=user).order_by('-updated_at').first()
+    else:
+        return []
+    if session is None:
+        return []
+    context = load_context(session)
+    return list(context.product_ids) if context else []
@@ -0,0 +1,25 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+def format_event(event, data):
+    """
+    Encode one Server-Sent Event with a JSON payload
+    """
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Lets views negotiate text/event-stream; streamed responses bypass rendering,
+    so this only has to encode error payloads as a single 'error' event
+    """
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return format_event('error', data).encode(self.charset)
@@ -0,0 +1,239 @@
+from collections import namedtuple
+
+from django.conf import settings
+
+from products.models import Product
+from products.cache import category_cache, get_catalog_version
+from products.search import search_product_ids, in_bulk_ordered
+from products.fuzzy import product_vocabulary, correct_words
+from products.semantic import semantic_index
+from .intents import intent_matcher, keyword_vocabulary, SEARCH_STOP_WORDS, CATEGORY, SEARCH, GREETING, HELP, BROWSE
+from .reply_cache import reply_cache
+from .context import (
+    ConversationContext, conversation_contexts, load_context, may_be_follow_up, resolve_follow_up, DETAIL
+)
+
+MAX_PRODUCTS = 5
+DEFAULT = 'default'
+
+CATEGORY_HEADER = "Here are some {} products I found for you:\n"
+SEARCH_HEADER = "I found these products that might interest you:\n"
+PRODUCT_FOLLOW_UP = "\n\nWould you like more details on any of these?"
+NO_RESULTS_REPLY = "I couldn't find any products matching your search. Could you try different keywords or browse our categories?"
+GREETING_REPLY = "Hello! I'm your shopping assistant. How can I help you today? You can ask me to search for products, show categories, or help with your order."
+HELP_REPLY = "I can help you with:\n- Searching for products\n- Exploring categories\n- Getting product recommendations\n- Checking product availability\n- Simulating purchases\n\nWhat would you like to do?"
+DID_YOU_MEAN = 'Did you mean "{}"?\n'
+DEFAULT_REPLY = "I'm here to help you find products! You can ask me to show you specific items like 'show me phones', browse categories, or search for products by name."
+
+# A resolved reply: the intent, the opening text, the ids of the products to list after it
+# and the filters that selected them
+ReplyPlan = namedtuple('ReplyPlan', ['intent', 'text', 'product_ids', 'filters'], defaults=(None,))
+
+
+def plan_reply(message):
+    """
+    Resolve the intent of a user message and the products the reply will list.
+    Only product ids are looked up here; the rows are fetched while rendering.
+
+    When nothing is found, misspelled words are corrected against the product
+    names and the chatbot keywords ("smarphone" -> "smartphone"); if the
+    corrected message finds products, the reply opens with "Did you mean ...?".
+    Failing that, a search ("find something to keep my coffee hot") asks the
+    semantic index for products close in meaning. Other messages never do:
+    small talk ("thanks") scores as close to some product as a real query.
+    """
+    plan = resolve_reply(message)
+    if plan.product_ids or plan.intent not in (SEARCH, DEFAULT):
+        return plan
+
+    corrected, corrections = correct_words(
+        message, [keyword_vocabulary, product_vocabulary], ignore=SEARCH_STOP_WORDS
+    )
+    if corrections:
+        corrected_plan = resolve_reply(corrected)
+        if corrected_plan.product_ids:
+            suggestion = " ".join(corrections.values())
+            return corrected_plan._replace(text=DID_YOU_MEAN.format(suggestion) + corrected_plan.text)
+
+    if plan.intent == SEARCH and getattr(settings, 'SEMANTIC_SEARCH', True):
+        product_ids = semantic_index.search(message, limit=MAX_PRODUCTS)
+        if product_ids:
+            return ReplyPlan(SEARCH, SEARCH_HEADER, product_ids, {'query': message})
+    return plan
+
+
+def resolve_reply(message):
+    """
+    Plan the reply to a message exactly as written
+    """
+    message = message.lower()
+    intents = intent_matcher.intents(message)
+
+    # Check for direct product category requests (e.g., "show me phones" or "I want to see laptops")
+    for match in intents.get(CATEGORY, []):
+        category_id = category_cache.id_for_name(match.value)
+        if category_id is None:
+            continue  # Continue to next check if category doesn't exist
+
+        # Get specific products that match the keyword
+        product_ids = search_product_ids([match.keyword], limit=MAX_PRODUCTS, category_id=category_id)
+
+        # If no specific products found, get any from that category
+        if not product_ids:
+            product_ids = list(
+                Product.objects.filter(category_id=category_id).values_list('id', flat=True)[:MAX_PRODUCTS]
+            )
+
+        if product_ids:
+            return ReplyPlan(
+                CATEGORY,
+                CATEGORY_HEADER.format(match.keyword),
+                product_ids,
+                {'category_id': category_id, 'keyword': match.keyword}
+            )
+
+    # Check for product search intent
+    if SEARCH in intents:
+        # Extract potential product keywords
+        product_keywords = [word for word in message.split() if word not in SEARCH_STOP_WORDS]
+
+        if product_keywords:
+            # Search for products matching all keywords at once, deduplicated and ranked
+            search_keywords = [keyword for keyword in product_keywords if len(keyword) > 2]  # Ignore very short words
+            product_ids = search_product_ids(search_keywords, limit=MAX_PRODUCTS)
+            if product_ids:
+                return ReplyPlan(SEARCH, SEARCH_HEADER, product_ids, {'keywords': search_keywords})
+            return ReplyPlan(SEARCH, NO_RESULTS_REPLY, [])
+
+    # Check for greeting intent
+    elif GREETING in intents:
+        return ReplyPlan(GREETING, GREETING_REPLY, [])
+
+    # Check for help intent
+    elif HELP in intents:
+        return ReplyPlan(HELP, HELP_REPLY, [])
+
+    # Check for category browsing intent
+    elif BROWSE in intents:
+        category_list = "\n".join([f"- {category['name']}" for category in category_cache.all()])
+        return ReplyPlan(
+            BROWSE,
+            f"Here are our product categories:\n{category_list}\n\nWhich category would you like to explore?",
+            []
+        )
+
+    # Default response
+    return ReplyPlan(DEFAULT, DEFAULT_REPLY, [])
+
+
+def format_product_line(product):
+    return f"- {product.name}: ${product.price} ({product.stock} in stock)"
+
+
+def iter_product_lines(products):
+    for position, product in enumerate(products):
+        yield ("\n" if position else "") + format_product_line(product)
+    yield PRODUCT_FOLLOW_UP
+
+
+def iter_reply(plan):
+    """
+    Yield the reply text in chunks: the opening text first, then one chunk per product
+    """
+    yield plan.text
+    if plan.product_ids:
+        yield from iter_product_lines(in_bulk_ordered(Product.objects.all(), plan.product_ids))
+
+
+def format_product_details(product, category_name=None):
+    if category_name is None:
+        category = category_cache.get(product.category_id)
+        category_name = category['name'] if category else 'Uncategorized'
+    return (
+        f"Here are the details for {product.name}:\n"
+        f"- Price: ${product.price}\n"
+        f"- Availability: {product.stock} in stock\n"
+        f"- Category: {category_name}\n\n"
+        f"{product.description}\n\n"
+        "Is there anything else you'd like to know?"
+    )
+
+
+def remember_plan(session, plan):
+    """
+    Record what a reply showed so that later turns can refer back to it.
+    Replies without products keep the previously listed products in context.
+    """
+    if session is None:
+        return
+    if plan.product_ids:
+        context = ConversationContext(plan.intent, list(plan.product_ids), plan.filters or {})
+    else:
+        previous = conversation_contexts.get(session.session_id)
+        context = previous._replace(intent=plan.intent) if previous else ConversationContext(plan.intent, [], {})
+    conversation_contexts.set(session.session_id, context)
+
+
+def follow_up_reply(message, session):
+    """
+    Answer a follow-up about a product listed earlier in the session
+    ("tell me about the second one") from the stored context: returns the
+    plan of the detail reply, or None
+    """
+    if session is None or not may_be_follow_up(message):
+        return None
+    context = load_context(session)
+    if not context or not context.product_ids:
+        return None
+    products = in_bulk_ordered(Product.objects.all(), context.product_ids)
+    product = resolve_follow_up(message, context, products)
+    if product is None:
+        return None
+    conversation_contexts.set(session.session_id, context._replace(intent=DETAIL))
+    return ReplyPlan(DETAIL, format_product_details(product), [product.id])
+
+
+def start_reply(message, session=None):
+    """
+    Resolve the reply to a message: returns (plan, chunks), the plan of what
+    the reply shows and an iterator over its text. The reply is served from
+    the reply cache when an equivalent message has already been answered for
+    the current catalog. With a session, follow-ups about previously listed
+    products are answered from the session's conversation context first.
+    """
+    plan = follow_up_reply(message, session)
+    if plan is not None:
+        return plan, iter([plan.text])
+
+    # Cache the reply under the version it was planned for
+    version = get_catalog_version()
+    cached = reply_cache.get(message, version)
+    if cached is not None:
+        remember_plan(session, cached.plan)
+        return cached.plan, iter([cached.text])
+
+    plan = plan_reply(message)
+    remember_plan(session, plan)
+    return plan, iter_caching_reply(message, plan, version)
+
+
+def iter_caching_reply(message, plan, version=None):
+    """
+    Yield the chunks of iter_reply(plan), then cache the whole reply for the message
+    """
+    chunks = []
+    for chunk in iter_reply(plan):
+        chunks.append(chunk)
+        yield chunk
+    reply_cache.set(message, plan, "".join(chunks), version)
+
+
+def iter_cached_reply(message, session=None):
+    """
+    Like iter_reply(plan_reply(message)), through start_reply()
+    """
+    yield from start_reply(message, session)[1]
+
+
+def render_reply(message, session=None):
+    return "".join(iter_cached_reply(message, session))
@@ -0,0 +1,128 @@
+import re
+import threading
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+
+from products.cache import get_catalog_version
+from .intents import SEARCH_STOP_WORDS, intent_matcher
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Filler words that never change the reply: the search stop words that are not intent keywords
+CACHE_STOP_WORDS = frozenset(
+    word for word in SEARCH_STOP_WORDS if not intent_matcher.scan(word)
+) - {'looking', 'for'}
+
+CachedReply = namedtuple('CachedReply', ['plan', 'text'])
+
+
+def normalize_message(message):
+    """
+    Reduce a message to its cache key: lowercased tokens, stop words removed.
+    Token order is kept: the first category keyword wins, so "laptops and
+    phones" and "phones and laptops" get different replies.
+    """
+    return " ".join(token for token in TOKEN_RE.findall(message.lower()) if token not in CACHE_STOP_WORDS)
+
+
+class ReplyCache:
+    """
+    LRU cache of chatbot replies keyed on the normalized user message.
+
+    Entries are bounded by count (REPLY_CACHE_MAX_ENTRIES) and by the total
+    size of the cached reply text (REPLY_CACHE_MAX_BYTES). Every entry belongs
+    to one catalog version; when a Product or Category write bumps the
+    version, the whole cache is dropped on the next access.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._bytes = 0
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def max_entries(self):
+        if self._max_entries is not None:
+            return self._max_entries
+        return getattr(settings, 'REPLY_CACHE_MAX_ENTRIES', 1024)
+
+    @property
+    def max_bytes(self):
+        if self._max_bytes is not None:
+            return self._max_bytes
+        return getattr(settings, 'REPLY_CACHE_MAX_BYTES', 1024 * 1024)
+
+    def _sync_version(self, version):
+        if version != self._version:
+            self._entries.clear()
+            self._bytes = 0
+            self._version = version
+
+    def get(self, message, version=None):
+        """
+        The cached reply to a message, or None. `version` is the current
+        catalog version, read here (a query) if not given.
+        """
+        key = normalize_message(message)
+        # Read the shared version before taking the lock
+        if version is None:
+            version = get_catalog_version()
+        with self._lock:
+            self._sync_version(version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, message, plan, text, version=None):
+        key = normalize_message(message)
+        size = len(text.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        # Read the shared version before taking the lock
+        if version is None:
+            version = get_catalog_version()
+        with self._lock:
+            self._sync_version(version)
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous.text.encode('utf-8'))
+            self._entries[key] = CachedReply(plan, text)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted.text.encode('utf-8'))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'catalog_version': self._version,
+            }
+
+
+reply_cache = ReplyCache()
@@ -15,8 +15,34 @@ class ChatSessionSerializer(serializers.ModelSerializer):
         model = ChatSession
         fields = ['id', 'session_id', 'user', 'created_at', 'updated_at', 'messages']
         read_only_fields = ['session_id', 'created_at', 'updated_at']
+
+class ChatSessionSummarySerializer(serializers.ModelSerializer):
+    user = serializers.PrimaryKeyRelatedField(read_only=True, required=False, allow_null=True)
+    
+    class Meta:
+        model = ChatSession
+        fields = ['id', 'session_id', 'user', 'created_at', 'updated_at']
+        read_only_fields = fields
+
+class ChatSessionHistorySerializer(ChatSessionSummarySerializer):
+    """
+    Session with its most recent messages, prefetched into `recent_messages` newest first
+    """
+    messages = serializers.SerializerMethodField()
+    
+    class Meta(ChatSessionSummarySerializer.Meta):
+        fields = ChatSessionSummarySerializer.Meta.fields + ['messages']
+    
+    def get_messages(self, session):
+        return ChatMessageSerializer(reversed(session.recent_messages), many=True).data
         
 class ChatMessageCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = ChatMessage
-        fields = ['role', 'content', 'session'] 
\ No newline at end of file
+        fields = ['role', 'content', 'session']
+
+class ChatMessageContentSerializer(serializers.Serializer):
+    """
+    Validates the text of an incoming user message; rows built by the server are not re-validated
+    """
+    content = serializers.CharField()
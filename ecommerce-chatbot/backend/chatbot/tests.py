@@ -1,3 +1,824 @@
-from django.test import TestCase
+import io
+import json
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+from urllib.parse import quote
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from ecommerce_backend.testing import QueryPlanAssertionsMixin, TemporarySemanticIndexMixin
+from products.cache import category_cache
+from products.models import Category, Product, ProductNeighbors
+from products.search import in_bulk_ordered, product_index, search_product_ids
+from users.models import UserProfile
+from .context import conversation_contexts, load_context, may_be_follow_up, parse_reply, rebuild_context, DETAIL
+from .intents import IntentMatcher, intent_matcher, BROWSE, CATEGORY, GREETING, HELP, SEARCH
+from .models import ChatSession, ChatMessage
+from .recommendations import build_recommendations
+from .replies import (
+    plan_reply, render_reply, format_product_details, iter_product_lines, DEFAULT, DEFAULT_REPLY, HELP_REPLY,
+    SEARCH_HEADER,
+)
+from .reply_cache import ReplyCache, normalize_message, reply_cache
+
+
+class ChatQueryPlanTests(QueryPlanAssertionsMixin, TestCase):
+    """
+    The hot chat queries must stay index lookups as the chat tables grow
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='shopper', password='password')
+        cls.session = ChatSession.objects.create(user=cls.user, session_id='session-1')
+        ChatSession.objects.create(session_id='session-2')
+        ChatMessage.objects.bulk_create([
+            ChatMessage(session=cls.session, role=role, content=f"Message {number}")
+            for number in range(10)
+            for role in ('user', 'assistant')
+        ])
+
+    def test_messages_by_session_in_order(self):
+        self.assertUsesIndex(ChatMessage.objects.filter(session=self.session))
+
+    def test_recent_assistant_messages_by_session(self):
+        self.assertUsesIndex(
+            ChatMessage.objects.filter(session=self.session, role='assistant').order_by('-timestamp', '-id')[:5]
+        )
+
+    def test_messages_after_cursor(self):
+        self.assertUsesIndex(ChatMessage.objects.filter(session=self.session, id__gt=5))
+
+    def test_messages_by_session_id(self):
+        self.assertUsesIndex(ChatMessage.objects.filter(session__session_id='session-1'))
+
+    def test_sessions_by_user(self):
+        self.assertUsesIndex(ChatSession.objects.filter(user=self.user).order_by('-updated_at'))
+
+
+class IntentMatcherTests(SimpleTestCase):
+    """
+    One regex pass finds whole keywords, with plurals, preferring the longest
+    """
+
+    def keywords(self, message):
+        return [(match.keyword, match.intent, match.value) for match in intent_matcher.scan(message)]
+
+    def test_word_boundaries(self):
+        self.assertEqual(self.keywords("I need homework help"), [('help', HELP, None)])
+        for message in ["shipment tracking", "a gamer chair", "hiking", "this"]:
+            with self.subTest(message=message):
+                self.assertEqual(self.keywords(message), [])
+
+    def test_plurals(self):
+        self.assertEqual(self.keywords("any watches?"), [('watch', CATEGORY, 'Electronics')])
+        self.assertEqual(self.keywords("Phones"), [('phone', CATEGORY, 'Electronics')])
+        self.assertEqual(self.keywords("dresses and toys"), [
+            ('dress', CATEGORY, 'Clothing'), ('toy', CATEGORY, 'Toys & Games'),
+        ])
+
+    def test_longest_keyword_wins(self):
+        self.assertEqual(self.keywords("smartphone deals"), [('smartphone', CATEGORY, 'Electronics')])
+        self.assertEqual(self.keywords("smartwatches"), [('smartwatch', CATEGORY, 'Electronics')])
+        matcher = IntentMatcher({'phone': (CATEGORY, 'Phones'), 'phone case': (SEARCH, None)})
+        self.assertEqual([match.keyword for match in matcher.scan("red phone cases")], ['phone case'])
+
+    def test_matches_in_message_order(self):
+        matches = intent_matcher.scan("Hi there, I am looking for books")
+        self.assertEqual(
+            [(match.keyword, match.start, match.end) for match in matches],
+            [('hi', 0, 2), ('looking for', 15, 26), ('book', 27, 32)],
+        )
+        intents = intent_matcher.intents("hi, show me the categories or help me browse books")
+        self.assertEqual(
+            {intent: [match.keyword for match in matches] for intent, matches in intents.items()},
+            {GREETING: ['hi'], SEARCH: ['show'], BROWSE: ['categories', 'browse'], HELP: ['help'], CATEGORY: ['book']},
+        )
+
+
+class ChatProductSearchTests(TestCase):
+    """
+    A chat search looks every keyword up with one query, best matches first, each product once
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Accessories')
+        cls.products = {
+            name: Product.objects.create(
+                name=name, description=description, price=Decimal('20.00'), category=category,
+                image_url='https://example.com/mouse.png', stock=4,
+            )
+            for name, description in [
+                ('Office Mouse', "A quiet mouse"),
+                ('Wireless Gaming Mouse', "A fast wireless mouse"),
+                ('Gaming Keyboard', "Mechanical keys"),
+                ('Wireless Charger', "Charges phones"),
+                ('Desk Lamp', "A lamp"),
+            ]
+        }
+
+    def setUp(self):
+        category_cache.all()
+        product_index.build()
+
+    def names(self, product_ids):
+        names = {product.id: name for name, product in self.products.items()}
+        return [names[product_id] for product_id in product_ids]
+
+    def test_one_query_for_every_keyword(self):
+        for backend in ('fulltext', 'keyword'):
+            with self.subTest(backend=backend), override_settings(PRODUCT_SEARCH_BACKEND=backend):
+                with self.assertNumQueries(1):
+                    product_ids = search_product_ids(['wireless', 'gaming', 'mouse'], limit=5)
+                self.assertEqual(self.names(product_ids)[0], 'Wireless Gaming Mouse')
+                self.assertEqual(len(product_ids), len(set(product_ids)))
+                self.assertNotIn(self.products['Desk Lamp'].id, product_ids)
+
+    def test_search_reply(self):
+        for backend in ('fulltext', 'keyword', 'memory'):
+            with self.subTest(backend=backend), override_settings(PRODUCT_SEARCH_BACKEND=backend):
+                plan = plan_reply("find a wireless gaming mouse")
+                self.assertEqual((plan.intent, plan.filters), (SEARCH, {'keywords': ['wireless', 'gaming', 'mouse']}))
+                names = self.names(plan.product_ids)
+                # Products matching more keywords rank first
+                self.assertEqual(names[0], 'Wireless Gaming Mouse')
+                self.assertEqual(set(names), {
+                    'Wireless Gaming Mouse', 'Office Mouse', 'Gaming Keyboard', 'Wireless Charger',
+                })
+
+    def test_no_results(self):
+        plan = plan_reply("find a zzzzqx")
+        self.assertEqual((plan.intent, plan.product_ids), (SEARCH, []))
+
+
+class MessageDeltaTests(TestCase):
+    """
+    send_message returns only the new turn; /messages/ returns what came after a cursor
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.session = ChatSession.objects.create(session_id='delta')
+        ChatSession.objects.create(session_id='other')
+
+    def url(self, action, query=''):
+        return f'/api/chat-sessions/{self.session.id}/{action}/?session_id=delta{query}'
+
+    def send(self, message):
+        response = self.client.post(self.url('send_message'), {'message': message}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_send_message_returns_the_new_turn(self):
+        self.send("hello")
+        data = self.send("help")
+        self.assertEqual([message['role'] for message in data['messages']], ['user', 'assistant'])
+        self.assertEqual(data['messages'][0]['content'], "help")
+        self.assertEqual(data['messages'][1]['content'], HELP_REPLY)
+        self.assertEqual(data['cursor'], data['messages'][1]['id'])
+        self.assertEqual(ChatMessage.objects.filter(session=self.session).count(), 4)
+
+    def test_messages_after_cursor(self):
+        cursor = self.send("hello")['cursor']
+        self.assertEqual(self.client.get(self.url('messages', f'&after={cursor}')).json(), {'messages': [], 'cursor': cursor})
+        latest = self.send("help")
+        data = self.client.get(self.url('messages', f'&after={cursor}')).json()
+        self.assertEqual(data, {'messages': latest['messages'], 'cursor': latest['cursor']})
+        self.assertEqual(len(self.client.get(self.url('messages')).json()['messages']), 4)
+
+    def test_messages_since(self):
+        first = self.send("hello")['messages'][1]
+        ChatMessage.objects.filter(session=self.session).update(timestamp=timezone.now() - timedelta(hours=1))
+        latest = self.send("help")
+        since = (timezone.now() - timedelta(minutes=30)).isoformat()
+        for query in [f'&since={quote(since)}', f'&since={quote(since[:19])}']:
+            with self.subTest(query=query):
+                data = self.client.get(self.url('messages', query)).json()
+                self.assertEqual(data, {'messages': latest['messages'], 'cursor': latest['cursor']})
+        self.assertNotIn(first, self.client.get(self.url('messages', f'&since={quote(since)}')).json()['messages'])
+
+    def test_invalid_cursor(self):
+        for query in ['&after=abc', '&since=yesterday']:
+            with self.subTest(query=query):
+                self.assertEqual(self.client.get(self.url('messages', query)).status_code, 400)
+
+    def test_other_sessions(self):
+        self.send("hello")
+        url = f'/api/chat-sessions/{self.session.id}/messages/?session_id=other'
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(f'/api/chat-sessions/{self.session.id}/messages/').status_code, 404)
+
+
+class ChatHistoryTests(TestCase):
+    """
+    /history/ pages through a user's sessions, each with its last messages, in a fixed number of queries
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='shopper', password='password')
+        other = User.objects.create_user(username='other', password='password')
+        ChatSession.objects.create(user=other, session_id='other')
+        cls.sessions = [ChatSession.objects.create(user=cls.user, session_id=f'session-{number}') for number in range(5)]
+        for number, session in enumerate(cls.sessions):
+            ChatMessage.objects.bulk_create([
+                ChatMessage(session=session, role='user', content=f"Message {message}") for message in range(number + 1)
+            ])
+        # Most recently updated first: session-2, then session-0, session-1, ...
+        now = timezone.now()
+        for number, session in enumerate(cls.sessions):
+            ChatSession.objects.filter(pk=session.pk).update(updated_at=now - timedelta(minutes=number))
+        ChatSession.objects.filter(pk=cls.sessions[2].pk).update(updated_at=now + timedelta(minutes=1))
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def history(self, query=''):
+        response = self.client.get(f'/api/chat-sessions/history/{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_requires_authentication(self):
+        self.client.logout()
+        self.assertEqual(self.client.get('/api/chat-sessions/history/').status_code, 401)
+
+    def test_sessions_with_their_last_messages(self):
+        data = self.history('?messages=2')
+        self.assertEqual(
+            [session['session_id'] for session in data['results']],
+            ['session-2', 'session-0', 'session-1', 'session-3', 'session-4'],
+        )
+        contents = {session['session_id']: [message['content'] for message in session['messages']] for session in data['results']}
+        # The last messages, oldest first
+        self.assertEqual(contents['session-4'], ["Message 3", "Message 4"])
+        self.assertEqual(contents['session-0'], ["Message 0"])
+        self.assertEqual(len(self.history()['results'][0]['messages']), 3)
+
+    def test_without_messages(self):
+        for query in ['?messages=0', '?messages=-1']:
+            with self.subTest(query=query):
+                self.assertTrue(all('messages' not in session for session in self.history(query)['results']))
+
+    def test_cursor_pagination(self):
+        first = self.history('?page_size=2&messages=1')
+        self.assertEqual([session['session_id'] for session in first['results']], ['session-2', 'session-0'])
+        self.assertIsNone(first['previous'])
+        second = self.client.get(first['next']).json()
+        self.assertEqual([session['session_id'] for session in second['results']], ['session-1', 'session-3'])
+        third = self.client.get(second['next']).json()
+        self.assertEqual([session['session_id'] for session in third['results']], ['session-4'])
+        self.assertIsNone(third['next'])
+        self.assertEqual(self.client.get(third['previous']).json()['results'], second['results'])
+
+    def test_query_count_does_not_grow_with_sessions(self):
+        for page_size in [1, 5]:
+            # The login's session and user, the page of sessions, their messages
+            with self.subTest(page_size=page_size), self.assertNumQueries(4):
+                self.history(f'?page_size={page_size}')
+
+
+class GenerateLoadDataTests(TestCase):
+    """
+    generate_load_data writes the same dataset for the same seed, however many workers generate it
+    """
+
+    options = {'products': 30, 'users': 20, 'sessions': 40, 'stdout': io.StringIO(), 'stderr': io.StringIO()}
+
+    def dataset(self):
+        return [
+            list(Product.objects.order_by('id').values_list(
+                'id', 'name', 'slug', 'description', 'price', 'category__name', 'stock', 'created_at', 'updated_at',
+            )),
+            list(User.objects.order_by('id').values_list('id', 'username', 'password', 'date_joined')),
+            list(UserProfile.objects.order_by('user_id').values_list('user_id', 'phone_number', 'created_at')),
+            list(ChatSession.objects.order_by('id').values_list('id', 'user_id', 'session_id', 'created_at')),
+            list(ChatMessage.objects.order_by('session_id', 'timestamp').values_list(
+                'session_id', 'role', 'content', 'timestamp', 'intent', 'product_ids',
+            )),
+        ]
+
+    def test_deterministic(self):
+        call_command('generate_load_data', workers=0, **self.options)
+        inline = self.dataset()
+        ChatSession.objects.all().delete()
+        User.objects.all().delete()
+        Product.objects.all().delete()
+
+        call_command('generate_load_data', workers=2, **self.options)
+        self.assertEqual(self.dataset(), inline)
+        ChatSession.objects.all().delete()
+        User.objects.all().delete()
+        Product.objects.all().delete()
+
+        call_command('generate_load_data', workers=0, seed=1, **self.options)
+        self.assertNotEqual(self.dataset(), inline)
+
+    def test_dataset(self):
+        call_command('generate_load_data', workers=0, **self.options)
+        self.assertEqual(UserProfile.objects.count(), 20)
+        self.assertTrue(User.objects.get(id=1).check_password('loadtest'))
+        for session in ChatSession.objects.select_related('user').prefetch_related('messages'):
+            messages = list(session.messages.all())
+            self.assertEqual([message.role for message in messages[:2]], ['user', 'assistant'])
+            self.assertEqual(session.updated_at, messages[-1].timestamp)
+            if session.user is not None:
+                self.assertGreaterEqual(session.created_at, session.user.date_joined)
+
+    def test_replies(self):
+        call_command('generate_load_data', workers=0, **self.options)
+        replies = ChatMessage.objects.filter(role='assistant')
+        self.assertEqual(
+            set(replies.values_list('intent', flat=True)), {CATEGORY, SEARCH, DETAIL, DEFAULT, GREETING, HELP},
+        )
+        # Replies are written in the chatbot's format, listing generated products
+        for reply in replies.filter(intent__in=[CATEGORY, SEARCH]):
+            products = in_bulk_ordered(Product.objects.all(), reply.product_ids)
+            self.assertEqual(len(products), len(reply.product_ids))
+            self.assertTrue(reply.content.endswith("".join(iter_product_lines(products))))
+            intent, names, _ = parse_reply(reply.content)
+            self.assertEqual((intent, names), (reply.intent, [product.name for product in products]))
+        for reply in replies.filter(intent=DETAIL):
+            self.assertEqual(reply.content, format_product_details(Product.objects.get(id=reply.product_ids[0])))
+        for reply in replies.exclude(intent__in=[CATEGORY, SEARCH, DETAIL]):
+            self.assertEqual(reply.product_ids, [])
+
+        # Sessions get back the products they listed last, and the recommendations have co-occurrences
+        for session in ChatSession.objects.all():
+            recent = session.messages.filter(role='assistant').order_by('-timestamp')[:5]
+            listed = next((reply.product_ids for reply in recent if reply.intent in (CATEGORY, SEARCH)), [])
+            self.assertEqual(rebuild_context(session).product_ids, listed)
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertGreater(build_recommendations(full=True, directory=Path(directory))[1], 0)
+        # Generated products are searchable like imported ones
+        product = Product.objects.first()
+        response = self.client.get('/api/products/search/', {'q': product.name})
+        self.assertIn(product.id, [result['id'] for result in response.json()])
+        # Explicit ids were inserted: new rows must not collide with them
+        late_product = Product.objects.create(
+            name='Late', price=Decimal('1.00'), category=product.category, image_url='https://example.com/late.png',
+        )
+        self.assertEqual(late_product.id, 31)
+        self.assertEqual(User.objects.create_user(username='late').id, 21)
+        self.assertEqual(ChatSession.objects.create(session_id='late').id, 41)
+
+
+class SemanticFallbackTests(TemporarySemanticIndexMixin, TestCase):
+    """
+    Searches that find nothing fall back to the semantic index; small talk never does
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Sports & Outdoors')
+        for name, description in [
+            ('Running Shoes', 'Lightweight shoes for runners and joggers'),
+            ('Air Fryer', 'Crispy food with little oil'),
+            ('Sun Hat', 'Wide brim hat for hiking'),
+        ]:
+            Product.objects.create(
+                name=name, description=description, price=Decimal('10.00'), category=category,
+                image_url='https://example.com/product.png', stock=1,
+            )
+
+    def setUp(self):
+        super().setUp()
+        call_command('build_semantic_index', stdout=io.StringIO())
+
+    def test_search(self):
+        # No keyword matches "joggingshoes"; its n-grams are close to the running shoes
+        plan = plan_reply("find joggingshoes")
+        self.assertEqual((plan.intent, plan.text, plan.filters), (SEARCH, SEARCH_HEADER, {'query': "find joggingshoes"}))
+        self.assertEqual(plan.product_ids[0], Product.objects.get(name='Running Shoes').id)
+
+    def test_small_talk(self):
+        for message in ["thanks", "what is this", "who are you", "ok cool"]:
+            with self.subTest(message=message):
+                plan = plan_reply(message)
+                self.assertEqual((plan.intent, plan.text, plan.product_ids), (DEFAULT, DEFAULT_REPLY, []))
+        self.assertEqual(plan_reply("help").text, HELP_REPLY)
+
+
+class ReplyCacheTests(TestCase):
+    """
+    Cached replies are the replies a fresh process would give, for the current catalog
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Electronics')
+        for name in ['Gaming Laptop', 'Budget Phone']:
+            Product.objects.create(
+                name=name, description="A device", price=Decimal('100.00'), category=cls.category,
+                image_url='https://example.com/device.png', stock=3,
+            )
+
+    def setUp(self):
+        reply_cache.clear()
+
+    def test_normalize_message(self):
+        self.assertEqual(normalize_message("Show me the Laptops!"), "show laptops")
+        self.assertEqual(normalize_message("show laptops"), "show laptops")
+        self.assertNotEqual(normalize_message("laptops and phones"), normalize_message("phones and laptops"))
+
+    def test_word_order(self):
+        first = render_reply("show me laptops and phones")
+        second = render_reply("show me phones and laptops")
+        self.assertIn("Gaming Laptop", first)
+        self.assertIn("Budget Phone", second)
+        reply_cache.clear()
+        self.assertEqual(render_reply("show me phones and laptops"), second)
+
+    def test_hit(self):
+        reply = render_reply("Show me the laptops!")
+        hits = reply_cache.hits
+        self.assertEqual(render_reply("show laptops"), reply)
+        self.assertEqual(reply_cache.hits, hits + 1)
+
+    def test_catalog_write_drops_entries(self):
+        render_reply("show me laptops")
+        Product.objects.filter(name='Gaming Laptop').update(stock=7)
+        self.assertIn("(7 in stock)", render_reply("show me laptops"))
+
+    def test_bounds(self):
+        cache = ReplyCache(max_entries=2, max_bytes=10)
+        plan = plan_reply("hello")
+        cache.set("one", plan, "12345")
+        cache.set("two", plan, "12345")
+        cache.set("three", plan, "123")
+        self.assertEqual([cache.get(key) is not None for key in ("one", "two", "three")], [False, True, True])
+        cache.set("four", plan, "12345678901")
+        self.assertIsNone(cache.get("four"))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+
+class ConversationContextTests(TestCase):
+    """
+    Follow-ups resolve against the product ids stored with each reply, not against its text
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Electronics')
+        cls.laptops = [
+            Product.objects.create(
+                name=name, description="A laptop", price=Decimal('500.00'), category=category,
+                image_url='https://example.com/laptop.png', stock=2,
+            )
+            for name in ('Gaming Laptop', 'Office Laptop')
+        ]
+        cls.session = ChatSession.objects.create(session_id='session-1')
+
+    def setUp(self):
+        conversation_contexts.clear()
+        reply_cache.clear()
+
+    def send(self, message):
+        response = self.client.post(
+            f'/api/chat-sessions/{self.session.id}/send_message/?session_id=session-1',
+            {'message': message}, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        return ChatMessage.objects.get(id=response.json()['cursor'])
+
+    def test_reply_records_products(self):
+        reply = self.send("show me laptops")
+        self.assertEqual(reply.intent, CATEGORY)
+        self.assertEqual(sorted(reply.product_ids), sorted(laptop.id for laptop in self.laptops))
+        self.assertEqual(self.send("hello").product_ids, [])
+
+    def test_follow_up_after_restart(self):
+        listed = self.send("show me laptops").product_ids
+        # A new process, and a product renamed since it was listed: the reply text is no help
+        conversation_contexts.clear()
+        Product.objects.filter(id=listed[1]).update(name='Workstation')
+        reply = self.send("tell me about the second one")
+        self.assertEqual((reply.intent, reply.product_ids), (DETAIL, [listed[1]]))
+        self.assertTrue(reply.content.startswith("Here are the details for Workstation:"))
+        # The detail reply keeps the listing in context
+        conversation_contexts.clear()
+        self.assertEqual(self.send("and the first one?").product_ids, [listed[0]])
+
+    def test_ordinals_in_new_requests(self):
+        self.send("show me laptops")
+        for message in ["show me the first edition books", "find a laptop bag that will last for years and years"]:
+            with self.subTest(message=message):
+                self.assertNotEqual(self.send(message).intent, DETAIL)
+
+    def test_may_be_follow_up(self):
+        for message in ["the second one", "tell me about the last", "Number 2 please", "first?"]:
+            with self.subTest(message=message):
+                self.assertTrue(may_be_follow_up(message))
+        for message in ["show me first aid kits", "I need a second monitor", "what lasts the longest"]:
+            with self.subTest(message=message):
+                self.assertFalse(may_be_follow_up(message))
+
+    def test_legacy_replies_are_parsed(self):
+        # Replies saved before their product ids were recorded
+        ChatMessage.objects.create(
+            session=self.session, role='assistant',
+            content="Here are some laptop products I found for you:\n- Office Laptop: $500.00 (2 in stock)",
+        )
+        context = load_context(self.session)
+        self.assertEqual((context.intent, context.product_ids), (CATEGORY, [self.laptops[1].id]))
+
+
+class ChatStreamTests(TestCase):
+    """
+    send_message_stream streams the reply as deltas, then saves the whole turn
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Electronics')
+        cls.phone = Product.objects.create(
+            name='Budget Phone', description="A phone", price=Decimal('100.00'), category=category,
+            image_url='https://example.com/phone.png', stock=4,
+        )
+        cls.session = ChatSession.objects.create(session_id='stream')
+
+    def setUp(self):
+        conversation_contexts.clear()
+        reply_cache.clear()
+
+    def stream(self, message, **headers):
+        return self.client.post(
+            f'/api/chat-sessions/{self.session.id}/send_message_stream/?session_id=stream',
+            {'message': message}, content_type='application/json', headers=headers,
+        )
+
+    def events(self, response):
+        body = b"".join(response.streaming_content).decode()
+        events = []
+        for block in body.strip().split("\n\n"):
+            event, data = block.split("\n")
+            events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+        return events
+
+    def test_events(self):
+        response = self.stream("show me phones")
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        self.assertEqual(response['X-Accel-Buffering'], 'no')
+        events = self.events(response)
+        self.assertEqual([event for event, _ in events], ['delta'] * 3 + ['user', 'assistant'])
+        deltas = [data['content'] for event, data in events if event == 'delta']
+        self.assertEqual(deltas[1], "- Budget Phone: $100.00 (4 in stock)")
+        user, assistant = events[-2][1], events[-1][1]
+        self.assertEqual(user['content'], "show me phones")
+        self.assertEqual(assistant['message']['content'], "".join(deltas))
+        self.assertEqual(assistant['cursor'], assistant['message']['id'])
+        saved = ChatMessage.objects.get(id=assistant['cursor'])
+        self.assertEqual((saved.content, saved.intent, saved.product_ids), ("".join(deltas), CATEGORY, [self.phone.id]))
+
+    def test_turn_is_saved_once_the_stream_completes(self):
+        response = self.stream("show me phones")
+        chunks = iter(response.streaming_content)
+        next(chunks)
+        self.assertFalse(ChatMessage.objects.filter(session=self.session).exists())
+        # A client that disconnects mid-reply leaves nothing behind
+        response.close()
+        self.assertFalse(ChatMessage.objects.filter(session=self.session).exists())
+        self.events(self.stream("show me phones"))
+        self.assertEqual(ChatMessage.objects.filter(session=self.session).count(), 2)
+
+    async def test_streams_under_asgi(self):
+        response = await self.async_client.post(
+            f'/api/chat-sessions/{self.session.id}/send_message_stream/?session_id=stream',
+            {'message': "show me phones"}, content_type='application/json',
+        )
+        # The first event goes out before the reply is finished and the turn saved
+        events = response.__aiter__()
+        self.assertTrue((await anext(events)).startswith(b"event: delta\n"))
+        self.assertEqual(await ChatMessage.objects.filter(session=self.session).acount(), 0)
+        self.assertTrue([chunk async for chunk in events][-1].startswith(b"event: assistant\n"))
+        self.assertEqual(await ChatMessage.objects.filter(session=self.session).acount(), 2)
+
+    def test_invalid_message(self):
+        response = self.stream("  ")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('content', response.json())
+        response = self.stream("  ", Accept='text/event-stream')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response.content.startswith(b"event: error\ndata: "))
+
+
+class AsyncChatTests(TestCase):
+    """
+    The native async chat endpoints save whole turns, like the sync ones
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Electronics')
+        cls.phone = Product.objects.create(
+            name='Budget Phone', description="A phone", price=Decimal('100.00'), category=category,
+            image_url='https://example.com/phone.png', stock=4,
+        )
+        cls.session = ChatSession.objects.create(session_id='session-1')
+
+    def setUp(self):
+        conversation_contexts.clear()
+        reply_cache.clear()
+
+    def url(self, action):
+        return f'/api/async/chat-sessions/{self.session.id}/{action}/?session_id=session-1'
+
+    async def test_send_message(self):
+        response = await self.async_client.post(
+            self.url('send_message'), {'message': "show me phones"}, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        user, assistant = response.json()['messages']
+        self.assertEqual(user['content'], "show me phones")
+        self.assertIn("- Budget Phone: $100.00 (4 in stock)", assistant['content'])
+        saved = await ChatMessage.objects.aget(id=assistant['id'])
+        self.assertEqual(saved.product_ids, [self.phone.id])
+
+    async def test_send_message_stream(self):
+        response = await self.async_client.post(
+            self.url('send_message_stream'), {'message': "show me phones"}, content_type='application/json',
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b"".join([chunk async for chunk in response.streaming_content]).decode()
+        events = [block.split("\n")[0] for block in body.strip().split("\n\n")]
+        self.assertEqual(events, ["event: delta"] * 3 + ["event: user", "event: assistant"])
+        self.assertEqual(await ChatMessage.objects.filter(session=self.session).acount(), 2)
+
+    async def test_stream_is_incremental(self):
+        response = await self.async_client.post(
+            self.url('send_message_stream'), {'message': "show me phones"}, content_type='application/json',
+        )
+        # The first event goes out before the reply is finished and the turn saved
+        events = response.__aiter__()
+        self.assertEqual(await anext(events), b'event: delta\ndata: {"content": "Here are some phone products I found for you:\\n"}\n\n')
+        self.assertEqual(await ChatMessage.objects.filter(session=self.session).acount(), 0)
+        self.assertEqual(len([chunk async for chunk in events]), 4)
+        self.assertEqual(await ChatMessage.objects.filter(session=self.session).acount(), 2)
+
+    async def test_follow_up(self):
+        await self.async_client.post(self.url('send_message'), {'message': "show me phones"}, content_type='application/json')
+        # Context rebuilt from the saved turn, as in a new worker process
+        conversation_contexts.clear()
+        response = await self.async_client.post(
+            self.url('send_message'), {'message': "tell me about the first one"}, content_type='application/json',
+        )
+        assistant = response.json()['messages'][1]
+        self.assertTrue(assistant['content'].startswith("Here are the details for Budget Phone:"))
+
+    async def test_authentication(self):
+        user = await User.objects.acreate_user(username='shopper', password='password')
+        session = await ChatSession.objects.acreate(user=user, session_id='session-2')
+        token = str(AccessToken.for_user(user))
+        url = f'/api/async/chat-sessions/{session.id}/send_message/'
+        response = await self.async_client.post(
+            url, {'message': "hi"}, content_type='application/json', headers={'Authorization': f'Bearer {token}'},
+        )
+        self.assertEqual(response.status_code, 200)
+        response = await self.async_client.post(
+            url, {'message': "hi"}, content_type='application/json', headers={'Authorization': 'Bearer nonsense'},
+        )
+        self.assertEqual(response.status_code, 401)
+        # Someone else's session, and an anonymous request without the session id
+        response = await self.async_client.post(
+            self.url('send_message'), {'message': "hi"}, content_type='application/json',
+            headers={'Authorization': f'Bearer {token}'},
+        )
+        self.assertEqual(response.status_code, 404)
+        response = await self.async_client.post(url, {'message': "hi"}, content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+
+    async def test_invalid_message(self):
+        for body in [b'{"message": "  "}', b'{"message": 3}', b'not json']:
+            with self.subTest(body=body):
+                response = await self.async_client.post(self.url('send_message'), body, content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+        response = await self.async_client.get(self.url('send_message'))
+        self.assertEqual(response.status_code, 405)
+        self.assertEqual(await ChatMessage.objects.filter(session=self.session).acount(), 0)
+
+    async def test_failed_turn_saves_nothing(self):
+        with mock.patch('chatbot.turns.touch_session', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                await self.async_client.post(
+                    self.url('send_message'), {'message': "show me phones"}, content_type='application/json',
+                )
+        with mock.patch('chatbot.async_views.aiter_reply', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                await self.async_client.post(
+                    self.url('send_message'), {'message': "find a phone"}, content_type='application/json',
+                )
+        self.assertEqual(await ChatMessage.objects.filter(session=self.session).acount(), 0)
+
+
+class BuildRecommendationsTests(TestCase):
+    """
+    build_recommendations reads only the chat messages written since its last run
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Kitchen')
+        cls.kettle, cls.mug, cls.teapot, cls.cup, cls.toaster, cls.grill = [
+            Product.objects.create(
+                name=name, description=name, price=Decimal('10.00'), category=category,
+                image_url='https://example.com/kitchen.png', stock=1,
+            )
+            for name in ('Kettle', 'Mug', 'Teapot', 'Cup', 'Toaster', 'Grill')
+        ]
+        cls.session = ChatSession.objects.create(session_id='kitchen')
+        cls.other_session = ChatSession.objects.create(session_id='other')
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        self.reply(self.session, SEARCH, [self.kettle, self.mug, self.teapot])
+        self.reply(self.session, DETAIL, [self.kettle])
+        self.reply(self.session, DETAIL, [self.cup])
+        # Saved before replies recorded their intent and product ids
+        ChatMessage.objects.create(
+            session=self.other_session, role='assistant',
+            content=SEARCH_HEADER + "- Toaster: $10.00 (1 in stock)\n- Grill: $10.00 (1 in stock)",
+        )
+
+    def reply(self, session, intent, products):
+        ChatMessage.objects.create(session=session, role='user', content="...")
+        return ChatMessage.objects.create(
+            session=session, role='assistant', content="...", intent=intent,
+            product_ids=[product.id for product in products],
+        )
+
+    def neighbors(self):
+        return {
+            product_id: (neighbor_ids, scores)
+            for product_id, neighbor_ids, scores in ProductNeighbors.objects.values_list(
+                'product_id', 'neighbor_ids', 'scores'
+            )
+        }
+
+    def test_build(self):
+        watermark, written = build_recommendations(directory=self.directory)
+        self.assertEqual(watermark, ChatMessage.objects.latest('id').id)
+        self.assertEqual(written, 6)
+        neighbors = {product_id: ids for product_id, (ids, _) in self.neighbors().items()}
+        # Follow-ups in one session weigh more than products listed together
+        self.assertEqual(neighbors[self.kettle.id], [self.cup.id, self.mug.id, self.teapot.id])
+        self.assertEqual(neighbors[self.cup.id], [self.kettle.id])
+        self.assertEqual(neighbors[self.toaster.id], [self.grill.id])
+
+    def test_incremental_build(self):
+        build_recommendations(directory=self.directory)
+        written_at = ProductNeighbors.objects.get(product=self.toaster).updated_at
+        self.assertEqual(build_recommendations(directory=self.directory)[1], 0)
+
+        # The follow-up is paired with the ones the session made before the last build
+        latest = self.reply(self.session, DETAIL, [self.grill])
+        watermark, written = build_recommendations(directory=self.directory)
+        self.assertEqual(watermark, latest.id)
+        neighbors = self.neighbors()
+        self.assertEqual(set(neighbors[self.grill.id][0]), {self.toaster.id, self.kettle.id, self.cup.id})
+        self.assertIn(self.grill.id, neighbors[self.cup.id][0])
+        # Only the products whose neighbors can change are rewritten
+        self.assertEqual(written, 6)
+        self.assertGreater(ProductNeighbors.objects.get(product=self.toaster).updated_at, written_at)
+        self.assertEqual(ProductNeighbors.objects.get(product=self.grill).neighbor_ids[-1], self.toaster.id)
+
+        # A full rebuild gives the same lists
+        build_recommendations(full=True, directory=self.directory)
+        self.assertEqual(self.neighbors(), neighbors)
+
+    def test_unaffected_products_are_not_rewritten(self):
+        build_recommendations(directory=self.directory)
+        untouched = ProductNeighbors.objects.get(product=self.toaster).updated_at
+        self.reply(self.session, SEARCH, [self.mug, self.cup])
+        build_recommendations(directory=self.directory)
+        self.assertEqual(ProductNeighbors.objects.get(product=self.toaster).updated_at, untouched)
+        self.assertIn(self.cup.id, self.neighbors()[self.mug.id][0])
+
+    def test_command(self):
+        stdout = io.StringIO()
+        with override_settings(RECOMMENDATIONS_DIR=self.directory):
+            call_command('build_recommendations', stdout=stdout)
+            call_command('build_recommendations', '--full', stdout=stdout)
+        latest = ChatMessage.objects.latest('id').id
+        self.assertEqual(
+            stdout.getvalue().splitlines(),
+            [f"Updated 6 neighbor lists (chat messages read up to id {latest})"] * 2,
+        )
+
+    def test_recommended_for_session(self):
+        build_recommendations(directory=self.directory)
+        # The session's context is its listing; the neighbors of those products come first
+        products = self.client.get('/api/products/recommended/?session_id=kitchen').json()
+        product_ids = [product['id'] for product in products]
+        self.assertEqual(product_ids[0], self.cup.id)
+        self.assertFalse({self.kettle.id, self.mug.id, self.teapot.id} & set(product_ids))
+        self.assertEqual(len(product_ids), 3)
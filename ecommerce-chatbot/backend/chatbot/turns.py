@@ -0,0 +1,38 @@
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ChatSession, ChatMessage
+
+
+def touch_session(session):
+    """
+    Bump the session's updated_at without rewriting the rest of the row
+    """
+    session.updated_at = timezone.now()
+    ChatSession.objects.filter(pk=session.pk).update(updated_at=session.updated_at)
+
+
+def build_reply(session, content, plan=None):
+    """
+    An unsaved assistant reply, recording what its plan (a replies.ReplyPlan) showed
+    """
+    message = ChatMessage(session=session, role='assistant', content=content)
+    if plan is not None:
+        message.intent = plan.intent or ''
+        message.product_ids = list(plan.product_ids)
+    return message
+
+
+def save_turn(session, user_content, assistant_content, plan=None):
+    """
+    Persist a user message and the assistant's reply as one transaction.
+    Returns the saved (user_message, assistant_message) pair.
+    """
+    with transaction.atomic():
+        user_message, reply = ChatMessage.objects.bulk_create([
+            ChatMessage(session=session, role='user', content=user_content),
+            build_reply(session, assistant_content, plan),
+        ])
+        touch_session(session)
+    return user_message, reply
+
@@ -3,16 +3,31 @@ import uuid
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Q
+from ecommerce_backend.renderers import FastJSONRenderer
+from django.db.models import Prefetch
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from .models import ChatSession, ChatMessage
-from .serializers import ChatSessionSerializer, ChatMessageSerializer, ChatMessageCreateSerializer
-from products.models import Product, Category
+from .serializers import (
+    ChatSessionSerializer, ChatSessionSummarySerializer, ChatSessionHistorySerializer,
+    ChatMessageSerializer, ChatMessageContentSerializer
+)
+from .pagination import ChatHistoryPagination
+from .renderers import EventStreamRenderer, format_event
+from .async_views import aevent_stream
+from .replies import start_reply
+from .reply_cache import reply_cache
+from .turns import save_turn
 
 # Create your views here.
 
 class ChatSessionViewSet(viewsets.ModelViewSet):
     serializer_class = ChatSessionSerializer
     permission_classes = [permissions.AllowAny]  # Allow any user to access the chatbot
+    history_message_limit = 50
+    max_history_message_limit = 200
     
     def get_queryset(self):
         user = self.request.user
@@ -60,7 +75,8 @@ class ChatSessionViewSet(viewsets.ModelViewSet):
     def history(self, request):
         """
         Retrieves chat history for authenticated users
-        Returns all chat sessions with their messages for the authenticated user
+        Returns a cursor-paginated page of the user's chat sessions, most recently updated first
+        Each session carries its last `messages` messages (default 50); pass messages=0 to omit them
         """
         if not request.user.is_authenticated:
             return Response(
@@ -68,13 +84,27 @@ class ChatSessionViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_401_UNAUTHORIZED
             )
         
+        try:
+            message_limit = min(int(request.query_params.get('messages', self.history_message_limit)),
+                                self.max_history_message_limit)
+        except ValueError:
+            message_limit = self.history_message_limit
+        
         # Get user's chat sessions ordered by most recently updated
         chat_sessions = self.get_queryset()
+        serializer_class = ChatSessionSummarySerializer
+        if message_limit > 0:
+            # Load the last messages of every session on the page with one extra query
+            recent_messages = ChatMessage.objects.order_by('-timestamp', '-id')[:message_limit]
+            chat_sessions = chat_sessions.prefetch_related(
+                Prefetch('messages', queryset=recent_messages, to_attr='recent_messages')
+            )
+            serializer_class = ChatSessionHistorySerializer
         
-        # Serialize the sessions including their messages
-        serializer = ChatSessionSerializer(chat_sessions, many=True)
-        
-        return Response(serializer.data)
+        paginator = ChatHistoryPagination()
+        page = paginator.paginate_queryset(chat_sessions, request, view=self)
+        serializer = serializer_class(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
         
     @action(detail=True, methods=['post'])
     def send_message(self, request, pk=None):
@@ -83,142 +113,117 @@ class ChatSessionViewSet(viewsets.ModelViewSet):
         """
         session = self.get_object()
         
-        # Save user message
-        user_message_data = {
-            'session': session.id,
-            'role': 'user',
-            'content': request.data.get('message', '')
-        }
+        content_serializer = ChatMessageContentSerializer(data={'content': request.data.get('message', '')})
+        if not content_serializer.is_valid():
+            return Response(content_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        content = content_serializer.validated_data['content']
         
-        user_message_serializer = ChatMessageCreateSerializer(data=user_message_data)
-        if user_message_serializer.is_valid():
-            user_message_serializer.save()
-            
-            # Process user message and generate response
-            response_content = self.process_message(user_message_data['content'])
-            
-            # Save assistant response
-            assistant_message_data = {
-                'session': session.id,
-                'role': 'assistant',
-                'content': response_content
-            }
+        # Process user message and generate response
+        response_content, plan = self.process_message(content, session)
+        
+        # Persist the whole turn at once: both messages, what the reply showed and the session's updated_at
+        user_message, assistant_message = save_turn(session, content, response_content, plan)
+        
+        # Return only the new messages, plus a cursor for fetching later ones
+        return Response({
+            'messages': ChatMessageSerializer([user_message, assistant_message], many=True).data,
+            'cursor': assistant_message.id,
+        })
+    
+    @action(detail=True, methods=['get'])
+    def messages(self, request, pk=None):
+        """
+        Return the messages of a chat session that come after a cursor
+        Pass `after` (a message id) or `since` (an ISO 8601 timestamp); without either, all messages are returned
+        """
+        session = self.get_object()
+        messages = ChatMessage.objects.filter(session=session)
+        
+        after = request.query_params.get('after')
+        since = request.query_params.get('since')
+        if after:
+            try:
+                messages = messages.filter(id__gt=int(after))
+            except ValueError:
+                return Response(
+                    {"detail": "'after' must be a message id."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        elif since:
+            timestamp = parse_datetime(since)
+            if timestamp is None:
+                return Response(
+                    {"detail": "'since' must be an ISO 8601 timestamp."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if timezone.is_naive(timestamp):
+                timestamp = timezone.make_aware(timestamp)
+            messages = messages.filter(timestamp__gt=timestamp)
+        
+        data = ChatMessageSerializer(messages, many=True).data
+        return Response({
+            'messages': data,
+            'cursor': data[-1]['id'] if data else (int(after) if after else None),
+        })
+    
+    @action(detail=True, methods=['post'], renderer_classes=[FastJSONRenderer, EventStreamRenderer])
+    def send_message_stream(self, request, pk=None):
+        """
+        Send a message in the chat session and stream the chatbot's reply as Server-Sent Events
+        Emits 'delta' events with reply text as it is produced; once the stream completes, the
+        whole turn is saved at once and a 'user' event with the saved user message and a final
+        'assistant' event with the saved reply follow
+        """
+        session = self.get_object()
+        
+        content_serializer = ChatMessageContentSerializer(data={'content': request.data.get('message', '')})
+        if not content_serializer.is_valid():
+            return Response(content_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        content = content_serializer.validated_data['content']
+        
+        def event_stream():
+            # The first delta goes out as soon as the intent is resolved; product lines follow
+            plan, reply = start_reply(content, session)
+            chunks = []
+            for chunk in reply:
+                chunks.append(chunk)
+                yield format_event('delta', {'content': chunk})
             
-            assistant_message_serializer = ChatMessageCreateSerializer(data=assistant_message_data)
-            if assistant_message_serializer.is_valid():
-                assistant_message_serializer.save()
-                
-                # Update the session's updated_at timestamp
-                session.save()
-                
-                # Return the updated messages
-                messages = ChatMessage.objects.filter(session=session)
-                return Response(ChatMessageSerializer(messages, many=True).data)
-            return Response(assistant_message_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-        return Response(user_message_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            # A stream cut short saves nothing rather than half a turn
+            user_message, assistant_message = save_turn(session, content, "".join(chunks), plan)
+            yield format_event('user', ChatMessageSerializer(user_message).data)
+            yield format_event('assistant', {
+                'message': ChatMessageSerializer(assistant_message).data,
+                'cursor': assistant_message.id,
+            })
+        
+        # Under ASGI a sync iterator is collected whole before anything is
+        # sent: serve the async event stream there
+        if isinstance(request._request, ASGIRequest):
+            stream = aevent_stream(session, content)
+        else:
+            stream = event_stream()
+        response = StreamingHttpResponse(stream, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # Stop proxies from buffering the stream
+        return response
     
-    def process_message(self, message):
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAdminUser])
+    def reply_cache_stats(self, request):
         """
-        Process user message and return a response
+        Hit/miss counters and size of the chatbot reply cache (staff only)
+        """
+        return Response(reply_cache.stats())
+    
+    def process_message(self, message, session=None):
+        """
+        Process user message and return the response text with the plan of what it shows
+        With a session, follow-ups about products listed earlier in it are resolved from its context
         This is a simple implementation for demo purposes
         In a real application, this would integrate with a more sophisticated NLP model
         """
-        message = message.lower()
-        
-        # Dictionary mapping common product categories and terms to their database equivalents
-        product_categories = {
-            'mobile': 'Electronics',
-            'phone': 'Electronics',
-            'smartphone': 'Electronics',
-            'laptop': 'Electronics',
-            'computer': 'Electronics',
-            'camera': 'Electronics',
-            'headphone': 'Electronics',
-            'speaker': 'Electronics',
-            'watch': 'Electronics',
-            'smartwatch': 'Electronics',
-            'clothing': 'Clothing',
-            'shirt': 'Clothing',
-            'pants': 'Clothing',
-            'dress': 'Clothing',
-            'shoes': 'Clothing',
-            'kitchen': 'Home & Kitchen',
-            'home': 'Home & Kitchen',
-            'furniture': 'Home & Kitchen',
-            'book': 'Books',
-            'sport': 'Sports & Outdoors',
-            'fitness': 'Sports & Outdoors',
-            'beauty': 'Beauty & Personal Care',
-            'cosmetic': 'Beauty & Personal Care',
-            'toy': 'Toys & Games',
-            'game': 'Toys & Games',
-            'health': 'Health & Wellness',
-            'wellness': 'Health & Wellness'
-        }
-        
-        # Check for direct product category requests (e.g., "show me phones" or "I want to see laptops")
-        for keyword, category_name in product_categories.items():
-            if keyword in message:
-                try:
-                    # Get the category
-                    category = Category.objects.get(name=category_name)
-                    
-                    # Get specific products that match the keyword
-                    products = Product.objects.filter(
-                        Q(category=category) & 
-                        (Q(name__icontains=keyword) | Q(description__icontains=keyword))
-                    )
-                    
-                    # If no specific products found, get all from that category
-                    if not products:
-                        products = Product.objects.filter(category=category)[:5]
-                    
-                    if products:
-                        product_list = "\n".join([f"- {product.name}: ${product.price} ({product.stock} in stock)" for product in products[:5]])
-                        return f"Here are some {keyword} products I found for you:\n{product_list}\n\nWould you like more details on any of these?"
-                    
-                except Category.DoesNotExist:
-                    pass  # Continue to next check if category doesn't exist
-        
-        # Check for product search intent
-        if any(keyword in message for keyword in ['search', 'find', 'looking for', 'show', 'display', 'get', 'want']):
-            # Extract potential product keywords
-            product_keywords = [word for word in message.split() 
-                               if word not in ['search', 'find', 'looking', 'for', 'show', 'me', 'a', 'the', 'and', 'or', 'in', 'display', 'get', 'want', 'to', 'see']]
-            
-            if product_keywords:
-                # Search for products matching keywords
-                products = []
-                for keyword in product_keywords:
-                    if len(keyword) > 2:  # Ignore very short words
-                        query_results = Product.objects.filter(
-                            Q(name__icontains=keyword) | Q(description__icontains=keyword)
-                        )[:3]  # Limit to 3 results per keyword
-                        products.extend(list(query_results))
-                
-                if products:
-                    product_list = "\n".join([f"- {product.name}: ${product.price} ({product.stock} in stock)" for product in products[:5]])
-                    return f"I found these products that might interest you:\n{product_list}\n\nWould you like more details on any of these?"
-                else:
-                    return "I couldn't find any products matching your search. Could you try different keywords or browse our categories?"
-        
-        # Check for greeting intent
-        elif any(greeting in message for greeting in ['hello', 'hi', 'hey', 'greetings']):
-            return "Hello! I'm your shopping assistant. How can I help you today? You can ask me to search for products, show categories, or help with your order."
-        
-        # Check for help intent
-        elif any(help_word in message for help_word in ['help', 'assist', 'support']):
-            return "I can help you with:\n- Searching for products\n- Exploring categories\n- Getting product recommendations\n- Checking product availability\n- Simulating purchases\n\nWhat would you like to do?"
-        
-        # Check for category browsing intent
-        elif any(category_word in message for category_word in ['category', 'categories', 'browse']):
-            categories = Category.objects.all()
-            category_list = "\n".join([f"- {category.name}" for category in categories])
-            return f"Here are our product categories:\n{category_list}\n\nWhich category would you like to explore?"
-        
-        # Default response
-        else:
-            return "I'm here to help you find products! You can ask me to show you specific items like 'show me phones', browse categories, or search for products by name."
+        plan, chunks = start_reply(message, session)
+        return "".join(chunks), plan
 
 class ChatMessageViewSet(viewsets.ModelViewSet):
     serializer_class = ChatMessageSerializer
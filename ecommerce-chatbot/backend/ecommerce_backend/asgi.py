@@ -14,3 +14,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecommerce_backend.settings')
 
 application = get_asgi_application()
+
+from products.warmup import warm_indexes  # noqa: E402
+
+warm_indexes()
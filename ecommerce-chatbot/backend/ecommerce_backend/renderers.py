@@ -0,0 +1,77 @@
+import io
+import re
+
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # Optional: fall back to the stdlib json module
+    orjson = None
+
+# orjson writes floats in exponent notation differently from json (1e16 rather than 1e+16,
+# 1e-7 rather than 1e-07); candidates are found by the literal 'e', then checked for a digit
+EXPONENT_RE = re.compile(rb'e[-0-9]')
+DIGITS = frozenset(b'0123456789')
+
+# orjson reads integers beyond 64 bits (20 digits or more) as floats
+DIGITS_ONLY = bytes(48 if byte in DIGITS else 32 for byte in range(256))  # Every digit as '0'
+LONG_INTEGER = b'0' * 20
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer encoding with orjson when it is installed.
+
+    The output is byte for byte the same as JSONRenderer's: Decimals,
+    aware datetimes, UUIDs and lazy strings are encoded the way DRF's
+    JSONEncoder does, and \\u2028/\\u2029 are escaped. Anything orjson does
+    not write identically (indented output, integers beyond 64 bits,
+    non-string keys, floats in exponent notation) is rendered by
+    JSONRenderer instead. The one difference: NaN and Infinity, which
+    JSONRenderer refuses, are rendered as null.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.ensure_ascii or not self.compact or not self.strict:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=_encoder.default, option=orjson.OPT_UTC_Z)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        for match in EXPONENT_RE.finditer(ret):
+            if ret[match.start() - 1] in DIGITS:
+                return super().render(data, accepted_media_type, renderer_context)
+        if b'\xe2\x80' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    """
+    JSONParser decoding UTF-8 bodies with orjson when it is installed. Bodies
+    orjson rejects, or may read differently (integers beyond 64 bits), are
+    parsed by JSONParser, for the same result or the same error
+    """
+
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('_', '-') not in ('utf-8', 'utf8'):
+            return super().parse(stream, media_type, parser_context)
+        body = stream.read()
+        if LONG_INTEGER not in body.translate(DIGITS_ONLY):
+            try:
+                return orjson.loads(body)
+            except orjson.JSONDecodeError:
+                pass
+        return super().parse(io.BytesIO(body), media_type, parser_context)
+
+
+_encoder = JSONEncoder()
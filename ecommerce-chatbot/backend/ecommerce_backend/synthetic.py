@@ -0,0 +1,376 @@
+import bisect
+import functools
+import math
+import random
+import uuid
+from collections import deque, namedtuple
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.utils.text import slugify
+
+from chatbot.context import DETAIL
+from chatbot.intents import PRODUCT_CATEGORIES, CATEGORY, SEARCH, GREETING, HELP
+from chatbot.models import ChatSession, ChatMessage
+from chatbot.replies import (
+    CATEGORY_HEADER, SEARCH_HEADER, MAX_PRODUCTS, DEFAULT, DEFAULT_REPLY, GREETING_REPLY, HELP_REPLY,
+    iter_product_lines, format_product_details,
+)
+from products.models import Product
+from users.models import UserProfile
+
+# Rows of the main model generated per chunk. Every chunk draws from its own
+# generator seeded by (seed, kind, chunk number), so the dataset depends on
+# the seed and the row counts only, not on the number of workers. Changing
+# this changes every dataset.
+CHUNK_SIZE = 5000
+
+# Generated timestamps fall in the year before END, not relative to now
+END = datetime(2025, 6, 1, tzinfo=timezone.utc)
+SPAN = timedelta(days=365)
+
+# Share of chat sessions without a user, and the skew of sessions towards
+# the earliest users (1 is uniform; higher values give a heavier head)
+ANONYMOUS_SESSIONS = 0.3
+USER_SKEW = 3
+
+# Skew of the products chat replies list towards the earliest products
+PRODUCT_SKEW = 2
+# Share of turns asking about a product of the previous listing (when there
+# is one), and of turns listing products; the rest get a reply without products
+DETAIL_TURNS = 0.2
+LISTING_TURNS = 0.65
+
+# name, median price, category weight (Zipf-like: a few categories hold most products)
+CATEGORIES = [
+    ("Electronics", 250, 1 / 1),
+    ("Clothing", 40, 1 / 2),
+    ("Home & Kitchen", 60, 1 / 3),
+    ("Books", 15, 1 / 4),
+    ("Sports & Outdoors", 50, 1 / 5),
+    ("Beauty & Personal Care", 20, 1 / 6),
+    ("Toys & Games", 25, 1 / 7),
+    ("Health & Wellness", 30, 1 / 8),
+]
+
+NOUNS = {
+    "Electronics": ["Smartphone", "Laptop", "Headphones", "Tablet", "Smartwatch", "Camera", "Speaker", "Monitor",
+                    "Keyboard", "Router", "Earbuds", "Charger"],
+    "Clothing": ["T-shirt", "Jeans", "Dress", "Jacket", "Sweater", "Shoes", "Hat", "Hoodie", "Skirt", "Sneakers",
+                 "Scarf", "Coat"],
+    "Home & Kitchen": ["Blender", "Coffee Maker", "Toaster", "Cookware Set", "Knife Set", "Bedding", "Lamp",
+                       "Kettle", "Rug", "Cutting Board", "Air Fryer", "Vase"],
+    "Books": ["Novel", "Biography", "Cookbook", "History", "Science Guide", "Self-help Book", "Thriller",
+              "Poetry Collection", "Atlas", "Memoir"],
+    "Sports & Outdoors": ["Yoga Mat", "Tent", "Backpack", "Dumbbells", "Bicycle Helmet", "Water Bottle",
+                          "Running Shoes", "Sleeping Bag", "Tennis Racket", "Jump Rope"],
+    "Beauty & Personal Care": ["Moisturizer", "Shampoo", "Lipstick", "Perfume", "Face Mask", "Hair Dryer",
+                               "Sunscreen", "Serum", "Razor", "Nail Polish"],
+    "Toys & Games": ["Puzzle", "Board Game", "Building Blocks", "Doll", "Action Figure", "Card Game", "Kite",
+                     "Plush Toy", "Remote Control Car", "Train Set"],
+    "Health & Wellness": ["Vitamins", "Protein Powder", "Massage Gun", "Thermometer", "Scale", "Pill Organizer",
+                          "Heating Pad", "Foam Roller", "Blood Pressure Monitor", "Essential Oils"],
+}
+ADJECTIVES = ["Classic", "Premium", "Compact", "Wireless", "Eco", "Ultra", "Portable", "Deluxe", "Smart", "Vintage",
+              "Lightweight", "Pro", "Essential", "Modern", "Organic", "Rugged", "Slim", "Cozy", "Bold", "Everyday"]
+BRANDS = ["Acme", "Nimbus", "Northwind", "Contoso", "Globex", "Initech", "Umbra", "Vertex", "Lumen", "Orbit",
+          "Aster", "Kestrel", "Solace", "Brightline", "Fable", "Harbor"]
+FEATURES = ["built to last", "easy to clean", "loved by our customers", "designed for everyday use",
+            "made from sustainable materials", "backed by a two-year warranty", "great as a gift",
+            "tested for quality", "available in several colours", "lighter than the previous model"]
+
+FIRST_NAMES = ["James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael", "Linda", "David", "Elizabeth",
+               "William", "Barbara", "Richard", "Susan", "Joseph", "Jessica", "Thomas", "Sarah", "Priya", "Wei",
+               "Aarav", "Fatima", "Mateo", "Sofia", "Yuki", "Olga", "Kwame", "Amara", "Liam", "Noor"]
+LAST_NAMES = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez",
+              "Martinez", "Hernandez", "Lopez", "Wilson", "Anderson", "Taylor", "Thomas", "Moore", "Martin", "Lee",
+              "Sharma", "Chen", "Khan", "Silva", "Tanaka", "Ivanova", "Mensah", "Okafor", "Murphy", "Ali", "Kim"]
+STREETS = ["Main St", "Oak Ave", "Maple Dr", "Park Rd", "Cedar Ln", "Elm St", "Lake View", "Hill Rd"]
+CITIES = ["Springfield", "Riverside", "Franklin", "Greenville", "Bristol", "Fairview", "Madison", "Georgetown"]
+
+CATEGORY_MESSAGES = [
+    "Show me {keyword} products",
+    "I want to see some {keyword} items",
+    "Any {keyword} deals this week?",
+]
+SEARCH_MESSAGES = [
+    "Do you have any {adjective} {noun}?",
+    "I'm looking for a {noun}",
+    "Find me a {noun} from {brand}",
+    "Is the {brand} {noun} in stock?",
+]
+DETAIL_MESSAGES = [
+    "Tell me about the {ordinal} one",
+    "More details on the {ordinal} one please",
+    "What about number {number}?",
+]
+ORDINALS = ["first", "second", "third", "fourth", "fifth"]
+# (message, intent, reply) of the turns that list no products
+OTHER_TURNS = [
+    ("What is your return policy?", DEFAULT, DEFAULT_REPLY),
+    ("How long does shipping take?", DEFAULT, DEFAULT_REPLY),
+    ("Hi there", GREETING, GREETING_REPLY),
+    ("Can you help me choose a gift?", HELP, HELP_REPLY),
+]
+
+# The chatbot keywords of each category, as users type them
+CATEGORY_KEYWORDS = {}
+for _keyword, _category in PRODUCT_CATEGORIES.items():
+    CATEGORY_KEYWORDS.setdefault(_category, []).append(_keyword)
+
+# A generated product with the category and noun its name was built from
+GeneratedProduct = namedtuple('GeneratedProduct', ['product', 'category', 'noun'])
+
+CATEGORY_WEIGHTS = [weight for _, _, weight in CATEGORIES]
+
+
+def category_names():
+    return [name for name, _, _ in CATEGORIES]
+
+
+def joined_at(index, total):
+    """
+    Join date of the index-th generated user: sign-ups grow linearly over the span, in id order
+    """
+    return END - SPAN + SPAN * math.sqrt((index + 0.5) / total)
+
+
+def chunk_products(seed, chunk, start, count, first_id):
+    """
+    The GeneratedProducts of one chunk; their Products have no category id
+    """
+    rng = random.Random(f'{seed}:products:{chunk}')
+    products = []
+    for index in range(start, start + count):
+        category, median_price, _ = rng.choices(CATEGORIES, weights=CATEGORY_WEIGHTS)[0]
+        noun = rng.choice(NOUNS[category])
+        name = f"{rng.choice(BRANDS)} {rng.choice(ADJECTIVES)} {noun}"
+        slug = f"{slugify(name)}-{index + 1}"
+        # Prices are log-normal around each category's median, ending in .99
+        price = Decimal(max(1, round(median_price * rng.lognormvariate(0, 0.6)))) - Decimal('0.01')
+        created_at = END - SPAN * rng.random()
+        products.append(GeneratedProduct(Product(
+            id=first_id + index,
+            name=name,
+            slug=slug,
+            description=(
+                f"The {name} is {rng.choice(FEATURES)} and {rng.choice(FEATURES)}. "
+                f"A {rng.choice(ADJECTIVES).lower()} choice from our {category} range."
+            ),
+            price=price,
+            image_url=f'https://picsum.photos/seed/{slug}/400/400',
+            # About one product in ten is out of stock
+            stock=0 if rng.random() < 0.1 else min(999, int(rng.lognormvariate(3, 1))),
+            created_at=created_at,
+            updated_at=created_at + (END - created_at) * rng.random(),
+        ), category, noun))
+    return products
+
+
+def generate_products(seed, chunk, start, count, first_id, category_ids):
+    products = []
+    for generated in chunk_products(seed, chunk, start, count, first_id):
+        generated.product.category_id = category_ids[generated.category]
+        products.append(generated.product)
+    return [table(products)]
+
+
+@functools.lru_cache(maxsize=32)
+def cached_chunk_products(seed, chunk, total, first_id):
+    """
+    chunk_products() of a chunk of `total` products, kept for the chat replies
+    listing them, with the positions of the products of each category and noun
+    """
+    start = chunk * CHUNK_SIZE
+    generated = chunk_products(seed, chunk, start, min(CHUNK_SIZE, total - start), first_id)
+    positions = {}
+    for position, product in enumerate(generated):
+        positions.setdefault(('category', product.category), []).append(position)
+        positions.setdefault(('noun', product.noun), []).append(position)
+    return generated, positions
+
+
+def generate_users(seed, chunk, start, count, total, first_id, password):
+    rng = random.Random(f'{seed}:users:{chunk}')
+    users = []
+    profiles = []
+    for index in range(start, start + count):
+        first_name = rng.choice(FIRST_NAMES)
+        last_name = rng.choice(LAST_NAMES)
+        username = f"{first_name}.{last_name}.{index + 1}".lower()
+        date_joined = joined_at(index, total)
+        users.append(User(
+            id=first_id + index,
+            username=username,
+            email=f"{username}@example.com",
+            first_name=first_name,
+            last_name=last_name,
+            password=password,
+            date_joined=date_joined,
+            last_login=date_joined + (END - date_joined) * rng.random() if rng.random() < 0.8 else None,
+        ))
+        profiles.append(UserProfile(
+            user_id=first_id + index,
+            phone_number=f"+1{rng.randrange(2000000000, 9999999999)}" if rng.random() < 0.6 else None,
+            address=(
+                f"{rng.randrange(1, 9999)} {rng.choice(STREETS)}, {rng.choice(CITIES)}"
+                if rng.random() < 0.4 else None
+            ),
+            created_at=date_joined,
+            updated_at=date_joined,
+        ))
+    return [table(users), table(profiles)]
+
+
+def listed_products(rng, seed, total, first_id):
+    """
+    (intent, user message, reply header, products) of a turn listing up to
+    MAX_PRODUCTS products. The first one is drawn by popularity; the others
+    share its category or its noun and come after it in its chunk.
+    """
+    index = int(total * rng.random() ** PRODUCT_SKEW)
+    chunk = index // CHUNK_SIZE
+    generated, positions = cached_chunk_products(seed, chunk, total, first_id)
+    position = index - chunk * CHUNK_SIZE
+    first = generated[position]
+    if rng.random() < 0.5:
+        # A keyword naming the product lists more of the same ("laptop"); one
+        # naming only its category lists the category ("sport")
+        keywords = [keyword for keyword in CATEGORY_KEYWORDS[first.category] if keyword in first.noun.lower()]
+        intent, key = CATEGORY, 'noun' if keywords else 'category'
+        keyword = rng.choice(keywords or CATEGORY_KEYWORDS[first.category])
+        message = rng.choice(CATEGORY_MESSAGES).format(keyword=keyword)
+        header = CATEGORY_HEADER.format(keyword)
+    else:
+        intent, key = SEARCH, 'noun'
+        brand, adjective, _ = first.product.name.split(' ', 2)
+        message = rng.choice(SEARCH_MESSAGES).format(adjective=adjective.lower(), noun=first.noun.lower(), brand=brand)
+        header = SEARCH_HEADER
+    same = positions[key, getattr(first, key)]
+    at = bisect.bisect_left(same, position)
+    count = min(rng.randint(1, MAX_PRODUCTS), len(same))
+    return intent, message, header, [generated[same[(at + offset) % len(same)]] for offset in range(count)]
+
+
+def chat_turn(rng, seed, products, first_product_id, listed):
+    """
+    (user message, intent, reply, listed GeneratedProducts) of one turn, with
+    the reply in the format the chatbot writes; `listed` are the products of
+    the previous listing
+    """
+    roll = rng.random()
+    if listed and roll < DETAIL_TURNS:
+        position = rng.randrange(len(listed))
+        message = rng.choice(DETAIL_MESSAGES).format(ordinal=ORDINALS[position], number=position + 1)
+        generated = listed[position]
+        return message, DETAIL, format_product_details(generated.product, generated.category), [generated]
+    if products and roll < DETAIL_TURNS + LISTING_TURNS:
+        intent, message, header, listed = listed_products(rng, seed, products, first_product_id)
+        reply = header + "".join(iter_product_lines([generated.product for generated in listed]))
+        return message, intent, reply, listed
+    message, intent, reply = rng.choice(OTHER_TURNS)
+    return message, intent, reply, []
+
+
+def generate_sessions(seed, chunk, start, count, first_id, users, first_user_id, products, first_product_id):
+    rng = random.Random(f'{seed}:sessions:{chunk}')
+    sessions = []
+    messages = []
+    for index in range(start, start + count):
+        if users and rng.random() >= ANONYMOUS_SESSIONS:
+            user_index = int(users * rng.random() ** USER_SKEW)
+            user_id = first_user_id + user_index
+            earliest = joined_at(user_index, users)
+        else:
+            user_id = None
+            earliest = END - SPAN
+        created_at = earliest + (END - earliest) * rng.random()
+
+        # Conversations are mostly short, with a long tail: 1 + log-normal turns, capped
+        turns = min(40, 1 + int(rng.lognormvariate(0.7, 0.9)))
+        timestamp = created_at
+        listed = []
+        for turn in range(turns):
+            if turn:
+                timestamp += timedelta(seconds=rng.lognormvariate(3.5, 1))
+            message, intent, reply, shown = chat_turn(rng, seed, products, first_product_id, listed)
+            messages.append(ChatMessage(
+                session_id=first_id + index, role='user', content=message, timestamp=timestamp,
+            ))
+            timestamp += timedelta(seconds=rng.uniform(0.5, 4))
+            messages.append(ChatMessage(
+                session_id=first_id + index, role='assistant', content=reply, timestamp=timestamp,
+                intent=intent, product_ids=[generated.product.id for generated in shown],
+            ))
+            # Replies listing no products keep the previous listing in context, as in the chatbot
+            if intent in (CATEGORY, SEARCH):
+                listed = shown
+        sessions.append(ChatSession(
+            id=first_id + index,
+            user_id=user_id,
+            session_id=str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            created_at=created_at,
+            updated_at=timestamp,
+        ))
+    return [table(sessions), table(messages)]
+
+
+def chunks(total):
+    """
+    (chunk number, first row, row count) for `total` rows
+    """
+    for chunk, start in enumerate(range(0, total, CHUNK_SIZE)):
+        yield chunk, start, min(CHUNK_SIZE, total - start)
+
+
+def ordered_results(executor, function, tasks, window):
+    """
+    Results of function(*task) for every task, in task order, with at most
+    `window` chunks generated ahead of the caller; inline without an executor
+    """
+    if executor is None:
+        for task in tasks:
+            yield function(*task)
+        return
+    pending = deque()
+    for task in tasks:
+        pending.append(executor.submit(function, *task))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def table(objects):
+    """
+    (model, columns, rows) of unsaved instances of one model, with every
+    value already converted for the database. This is the work bulk_create
+    would do in the writing process; here it runs in the worker. The
+    primary key is included when the instances have one.
+    """
+    model = type(objects[0])
+    fields = [
+        field for field in model._meta.concrete_fields
+        if not (field.primary_key and getattr(objects[0], field.attname) is None)
+    ]
+    rows = [
+        tuple(field.get_db_prep_save(getattr(obj, field.attname), connection) for field in fields)
+        for obj in objects
+    ]
+    return model, [field.column for field in fields], rows
+
+
+def insert(model, columns, rows):
+    """
+    INSERT the prepared rows of table() in one executemany(): auto_now
+    fields keep the generated values and no signals are sent
+    """
+    quote = connection.ops.quote_name
+    sql = (
+        f"INSERT INTO {quote(model._meta.db_table)} ({', '.join(quote(column) for column in columns)}) "
+        f"VALUES ({', '.join(['%s'] * len(columns))})"
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
@@ -0,0 +1,78 @@
+import re
+import tempfile
+
+from django.db import connection
+from django.test import override_settings
+
+# Query plan lines that mean the database reads a whole table or sorts rows itself
+SQLITE_TABLE_SCAN_RE = re.compile(r'\bSCAN (?!.*\bUSING (?:COVERING )?INDEX\b)')
+SQLITE_TEMP_SORT_RE = re.compile(r'\bUSE TEMP B-TREE\b')
+POSTGRESQL_TABLE_SCAN_RE = re.compile(r'\bSeq Scan\b')
+POSTGRESQL_SORT_RE = re.compile(r'\bSort\b')
+
+
+class QueryPlanAssertionsMixin:
+    """
+    TestCase mixin asserting that a queryset is answered from an index
+    """
+
+    def setUp(self):
+        super().setUp()
+        if connection.vendor == 'postgresql':
+            # Small test tables are cheaper to scan, so make the planner use
+            # an index whenever one can answer the query
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+                cursor.execute("SET LOCAL enable_sort = off")
+
+    def assertUsesIndex(self, queryset):
+        """
+        Fail if the plan of `queryset` falls back to a table scan or a temporary sort
+        """
+        if connection.vendor == 'sqlite':
+            patterns = [SQLITE_TABLE_SCAN_RE, SQLITE_TEMP_SORT_RE]
+        elif connection.vendor == 'postgresql':
+            patterns = [POSTGRESQL_TABLE_SCAN_RE, POSTGRESQL_SORT_RE]
+        else:
+            self.skipTest(f"No query plan checks for {connection.vendor}")
+
+        plan = queryset.explain()
+        for line in plan.splitlines():
+            for pattern in patterns:
+                if pattern.search(line):
+                    self.fail(f"Query does not use an index:\n{queryset.query}\n\nPlan:\n{plan}")
+
+
+class QueryCountAssertionsMixin:
+    """
+    TestCase mixin asserting that an endpoint's query count does not grow with the page size
+    """
+
+    def assertQueryCountConstant(self, url_for_size, sizes, expected):
+        """
+        GET url_for_size(size) for every size and fail unless each request runs
+        exactly `expected` queries. Every URL is requested once first to warm
+        process-wide caches (category cache, rendered product fragments).
+        """
+        for size in sizes:
+            self.client.get(url_for_size(size))
+        for size in sizes:
+            with self.subTest(size=size), self.assertNumQueries(expected):
+                response = self.client.get(url_for_size(size))
+                self.assertEqual(response.status_code, 200)
+
+
+class TemporarySemanticIndexMixin:
+    """
+    TestCase mixin pointing SEMANTIC_INDEX_DIR at an empty temporary directory
+    (a str, as settings files usually give it) for each test
+    """
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.semantic_index_dir = directory.name
+        overridden = override_settings(SEMANTIC_INDEX_DIR=directory.name)
+        overridden.enable()
+        self.addCleanup(overridden.disable)
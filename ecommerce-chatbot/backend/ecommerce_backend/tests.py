@@ -0,0 +1,71 @@
+import datetime
+import io
+import uuid
+from decimal import Decimal
+from zoneinfo import ZoneInfo
+
+from django.test import SimpleTestCase
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from .renderers import FastJSONParser, FastJSONRenderer
+
+
+class FastJSONTests(SimpleTestCase):
+    """
+    The fast renderer and parser must agree byte for byte with DRF's
+    """
+
+    samples = [
+        {'price': '19.99', 'name': 'Café \u2028 \u2029 "quoted" \\ / \x00 \x1f \x7f \U0001f600', 'stock': 3},
+        [Decimal('19.99'), Decimal('0.00001'), Decimal('1E+20'), 1e16, 1e-7, 0.1, -0.0, 2 ** 63 - 1, 2 ** 70],
+        {
+            'utc': datetime.datetime(2026, 5, 1, 12, 30, 15, 123456, tzinfo=datetime.timezone.utc),
+            'london': datetime.datetime(2026, 1, 1, 9, 0, tzinfo=ZoneInfo('Europe/London')),
+            'kolkata': datetime.datetime(2026, 1, 1, 9, 0, 0, 500, tzinfo=ZoneInfo('Asia/Kolkata')),
+            'naive': datetime.datetime(2026, 1, 1),
+            'date': datetime.date(2026, 1, 1),
+            'time': datetime.time(8, 15),
+            'duration': datetime.timedelta(minutes=5),
+            'uuid': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'lazy': gettext_lazy('Products'),
+            'tuple': (1, 2),
+            'bytes': b'raw',
+        },
+        {1: 'integer key', 'nested': {'empty': {}, 'list': []}},
+        [], {}, 'text', 0, None, True,
+    ]
+
+    def test_renderer(self):
+        for data in self.samples:
+            with self.subTest(data=data):
+                self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_renderer_indent(self):
+        data = {'results': [{'id': 1}]}
+        self.assertEqual(
+            FastJSONRenderer().render(data, 'application/json; indent=4'),
+            JSONRenderer().render(data, 'application/json; indent=4'),
+        )
+
+    def test_parser(self):
+        for body in [
+            b'{"price": "19.99", "ids": [1, 2, 3], "ok": true, "none": null}',
+            b'[123456789012345678901234567890, 1.5, 1e400, -0.0]',
+            '{"name": "Café \\ud83d\\ude00", "lone": "\\ud800"}'.encode('utf-8'),
+        ]:
+            with self.subTest(body=body):
+                self.assertEqual(
+                    FastJSONParser().parse(io.BytesIO(body)), JSONParser().parse(io.BytesIO(body))
+                )
+
+    def test_parse_error(self):
+        for body in [b'{"broken": ', b'[NaN]', b'\xef\xbb\xbf{}']:
+            with self.subTest(body=body):
+                with self.assertRaises(ParseError) as fast:
+                    FastJSONParser().parse(io.BytesIO(body))
+                with self.assertRaises(ParseError) as stdlib:
+                    JSONParser().parse(io.BytesIO(body))
+                self.assertEqual(str(fast.exception), str(stdlib.exception))
@@ -24,6 +24,7 @@ from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 from products.views import ProductViewSet, CategoryViewSet
 from chatbot.views import ChatSessionViewSet, ChatMessageViewSet
+from chatbot import async_views
 from users.views import RegisterView, UserProfileView, LogoutView
 
 def api_info(request):
@@ -35,6 +36,7 @@ def api_info(request):
             'products': '/api/products/',
             'categories': '/api/categories/',
             'chat_sessions': '/api/chat-sessions/',
+            'async_chat': '/api/async/chat-sessions/',
             'authentication': {
                 'register': '/api/register/',
                 'login': '/api/token/',
@@ -58,6 +60,10 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include(router.urls)),
     
+    # Native async chat endpoints (served without a thread per request under ASGI)
+    path('api/async/chat-sessions/<int:pk>/send_message/', async_views.send_message, name='async_send_message'),
+    path('api/async/chat-sessions/<int:pk>/send_message_stream/', async_views.send_message_stream, name='async_send_message_stream'),
+    
     # Authentication endpoints
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecommerce_backend.settings')
 
 application = get_wsgi_application()
+
+from products.warmup import warm_indexes  # noqa: E402
+
+warm_indexes()
@@ -0,0 +1,166 @@
+import contextvars
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+
+from .catalog import STATE_ID, create_state
+
+# What catalog_request() has read of the catalog state row, or None outside one
+_request_state = contextvars.ContextVar('catalog_request_state', default=None)
+
+CategorySnapshot = namedtuple('CategorySnapshot', ['by_id', 'by_name', 'by_slug', 'ordered'])
+
+
+class CategoryCache:
+    """
+    Process-wide cache of every Category, indexed by id, name and slug.
+
+    The cache is versioned: Category signals call invalidate(), which bumps
+    the version and drops the snapshot so the next read reloads it with one
+    query. Writes made by other worker processes are not signalled here, so
+    CATEGORY_CACHE_TTL (in seconds) can be set to reload periodically.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._loaded_at = None
+        self.version = 0
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+            self._snapshot = None
+
+    def _load(self):
+        from .models import Category
+
+        ordered = list(Category.objects.order_by('id').values('id', 'name', 'slug'))
+        by_name = {}
+        for category in ordered:
+            by_name.setdefault(category['name'], category['id'])
+        return CategorySnapshot(
+            by_id={category['id']: category for category in ordered},
+            by_name=by_name,
+            by_slug={category['slug']: category['id'] for category in ordered},
+            ordered=ordered,
+        )
+
+    def snapshot(self):
+        ttl = getattr(settings, 'CATEGORY_CACHE_TTL', None)
+        with self._lock:
+            expired = ttl is not None and self._loaded_at is not None and time.monotonic() - self._loaded_at > ttl
+            if self._snapshot is None or expired:
+                if expired:
+                    self.version += 1
+                self._snapshot = self._load()
+                self._loaded_at = time.monotonic()
+            return self._snapshot
+
+    def get(self, category_id):
+        """
+        Return the serialized category ({'id', 'name', 'slug'}) or None
+        """
+        category = self.snapshot().by_id.get(category_id)
+        if category is None and category_id is not None:
+            # Possibly created by another process since the last load
+            self.invalidate()
+            category = self.snapshot().by_id.get(category_id)
+        return dict(category) if category is not None else None
+
+    def id_for_name(self, name):
+        return self.snapshot().by_name.get(name)
+
+    def id_for_slug(self, slug):
+        return self.snapshot().by_slug.get(slug)
+
+    def all(self):
+        return [dict(category) for category in self.snapshot().ordered]
+
+
+category_cache = CategoryCache()
+
+
+def get_catalog_state():
+    """
+    Return the catalog state row as (version, modified, reindex, category_version),
+    with one query.
+
+    The version is bumped by database triggers on every Product or Category
+    write, so it is shared by every worker process and counts bulk writes
+    that send no signals; modified is the time (seconds since the epoch) of
+    the last write. The category version only counts Category writes.
+    """
+    from .models import CatalogState
+
+    states = CatalogState.objects.values_list('version', 'modified', 'reindex', 'category_version', named=True)
+    try:
+        return states.get(pk=STATE_ID)
+    except CatalogState.DoesNotExist:
+        # Only if the row was deleted: recreate it rather than fail every request
+        with connection.cursor() as cursor:
+            create_state(cursor)
+        return states.get(pk=STATE_ID)
+
+
+def get_catalog_version():
+    return get_catalog_state().version
+
+
+async def aget_catalog_version():
+    from .models import CatalogState
+
+    try:
+        return await CatalogState.objects.values_list('version', flat=True).aget(pk=STATE_ID)
+    except CatalogState.DoesNotExist:
+        return await sync_to_async(get_catalog_version)()
+
+
+def get_category_version():
+    return get_catalog_state().category_version
+
+
+def get_catalog_modified():
+    return get_catalog_state().modified
+
+
+@contextmanager
+def catalog_request():
+    """
+    Read the reindex generation at most once inside the block: a request (see
+    products/middleware.py) or a call making many index lookups. Nested
+    blocks share the outermost one.
+    """
+    if _request_state.get() is not None:
+        yield
+        return
+    token = _request_state.set({})
+    try:
+        yield
+    finally:
+        _request_state.reset(token)
+
+
+def get_reindex_generation():
+    """
+    Return the reindex generation, bumped by writes that bypass the Product
+    signals (bulk imports); in-process indexes rebuild when it changes
+    """
+    state = _request_state.get()
+    if state is None:
+        return get_catalog_state().reindex
+    if 'reindex' not in state:
+        state['reindex'] = get_catalog_state().reindex
+    return state['reindex']
+
+
+def request_reindex():
+    from .models import CatalogState
+
+    CatalogState.objects.filter(pk=STATE_ID).update(reindex=F('reindex') + 1)
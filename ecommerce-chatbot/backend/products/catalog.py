@@ -0,0 +1,156 @@
+import time
+
+# Database-side catalog versioning.
+#
+# Every write to products_product or products_category bumps the version of
+# the single products_catalogstate row and records the time of the write, so
+# the version is shared by every worker process and bulk writes that skip
+# model signals (bulk_create, QuerySet.update, raw SQL) are counted as well.
+# SQLite: row-level triggers. PostgreSQL: statement-level triggers, so a bulk
+# write bumps the version once.
+#
+# Category writes also bump category_version, which the product fragment
+# cache is keyed on together with each product's updated_at; updates that
+# leave updated_at as it was (QuerySet.update()) move it to the current time.
+
+STATE_TABLE = 'products_catalogstate'
+STATE_ID = 1
+WATCHED_TABLES = ('products_product', 'products_category')
+
+CATEGORY_TABLE = 'products_category'
+PRODUCT_TABLE = 'products_product'
+
+SQLITE_NOW = "(julianday('now') - 2440587.5) * 86400.0"
+# The format Django stores datetimes in
+SQLITE_NOW_DATETIME = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+
+def sqlite_triggers(category_version=True):
+    """
+    The SQLite triggers by name; without category_version, as created before that column existed
+    """
+    triggers = {}
+    for table in WATCHED_TABLES:
+        bumps = "version = version + 1"
+        if category_version and table == CATEGORY_TABLE:
+            bumps += ", category_version = category_version + 1"
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            name = f'{table}_catalog_{event.lower()}'
+            triggers[name] = f"""
+                CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON {table} BEGIN
+                    UPDATE {STATE_TABLE} SET {bumps}, modified = {SQLITE_NOW} WHERE id = {STATE_ID};
+                END
+            """
+    if category_version:
+        # Recursive triggers are off: the UPDATE below does not fire this trigger again
+        triggers[f'{PRODUCT_TABLE}_touch'] = f"""
+            CREATE TRIGGER IF NOT EXISTS {PRODUCT_TABLE}_touch AFTER UPDATE ON {PRODUCT_TABLE}
+            WHEN NEW.updated_at IS OLD.updated_at BEGIN
+                UPDATE {PRODUCT_TABLE} SET updated_at = {SQLITE_NOW_DATETIME} WHERE id = NEW.id;
+            END
+        """
+    return triggers
+
+
+SQLITE_TRIGGERS = sqlite_triggers()
+
+POSTGRESQL_FUNCTION = 'products_catalog_changed'
+POSTGRESQL_TRIGGERS = {f'{table}_catalog_changed': table for table in WATCHED_TABLES}
+POSTGRESQL_TOUCH_FUNCTION = 'products_product_touch'
+POSTGRESQL_TOUCH_TRIGGER = 'products_product_touch'
+
+
+def create_state(cursor):
+    """
+    Create the state row if it is missing. The version starts from the current
+    time in milliseconds, so ETags of a recreated database do not repeat old ones.
+    """
+    now = time.time()
+    cursor.execute(f"SELECT 1 FROM {STATE_TABLE} WHERE id = %s", [STATE_ID])
+    if cursor.fetchone() is None:
+        cursor.execute(
+            f"INSERT INTO {STATE_TABLE} (id, version, modified, reindex) VALUES (%s, %s, %s, 0)",
+            [STATE_ID, int(now * 1000), now],
+        )
+
+
+def bump_state(cursor):
+    cursor.execute(
+        f"UPDATE {STATE_TABLE} SET version = version + 1, modified = %s WHERE id = %s",
+        [time.time(), STATE_ID],
+    )
+
+
+def install_sqlite_catalog_triggers(cursor, category_version=True):
+    triggers = sqlite_triggers(category_version)
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+    existing = {row[0] for row in cursor.fetchall()}
+    for trigger in triggers.values():
+        cursor.execute(trigger)
+    # SQLite migrations that alter a watched table rebuild it, which drops its
+    # triggers; writes may have been missed, so move the version on
+    if not existing.issuperset(triggers):
+        bump_state(cursor)
+
+
+def uninstall_sqlite_catalog_triggers(cursor):
+    for trigger in SQLITE_TRIGGERS:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+
+
+def install_postgresql_catalog_triggers(cursor, category_version=True):
+    bumps = "version = version + 1"
+    if category_version:
+        bumps += f", category_version = category_version + (TG_TABLE_NAME = '{CATEGORY_TABLE}')::int"
+    cursor.execute(
+        f"CREATE OR REPLACE FUNCTION {POSTGRESQL_FUNCTION}() RETURNS trigger AS $$ BEGIN "
+        f"UPDATE {STATE_TABLE} SET {bumps}, modified = extract(epoch FROM clock_timestamp()) "
+        f"WHERE id = {STATE_ID}; RETURN NULL; END $$ LANGUAGE plpgsql"
+    )
+    for trigger, table in POSTGRESQL_TRIGGERS.items():
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger} ON {table}")
+        cursor.execute(
+            f"CREATE TRIGGER {trigger} AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table} "
+            f"FOR EACH STATEMENT EXECUTE FUNCTION {POSTGRESQL_FUNCTION}()"
+        )
+    if category_version:
+        cursor.execute(
+            f"CREATE OR REPLACE FUNCTION {POSTGRESQL_TOUCH_FUNCTION}() RETURNS trigger AS $$ BEGIN "
+            f"IF NEW.updated_at IS NOT DISTINCT FROM OLD.updated_at THEN NEW.updated_at := clock_timestamp(); "
+            f"END IF; RETURN NEW; END $$ LANGUAGE plpgsql"
+        )
+        cursor.execute(f"DROP TRIGGER IF EXISTS {POSTGRESQL_TOUCH_TRIGGER} ON {PRODUCT_TABLE}")
+        cursor.execute(
+            f"CREATE TRIGGER {POSTGRESQL_TOUCH_TRIGGER} BEFORE UPDATE ON {PRODUCT_TABLE} "
+            f"FOR EACH ROW EXECUTE FUNCTION {POSTGRESQL_TOUCH_FUNCTION}()"
+        )
+
+
+def uninstall_postgresql_catalog_triggers(cursor):
+    for trigger, table in POSTGRESQL_TRIGGERS.items():
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger} ON {table}")
+    cursor.execute(f"DROP TRIGGER IF EXISTS {POSTGRESQL_TOUCH_TRIGGER} ON {PRODUCT_TABLE}")
+    cursor.execute(f"DROP FUNCTION IF EXISTS {POSTGRESQL_FUNCTION}()")
+    cursor.execute(f"DROP FUNCTION IF EXISTS {POSTGRESQL_TOUCH_FUNCTION}()")
+
+
+def install_catalog_triggers(connection, category_version=True):
+    """
+    Create the state row and the triggers keeping it current, for the
+    connection's database. Safe to run repeatedly. Migrations applied before
+    category_version existed pass category_version=False.
+    """
+    with connection.cursor() as cursor:
+        create_state(cursor)
+        if connection.vendor == 'sqlite':
+            install_sqlite_catalog_triggers(cursor, category_version)
+        elif connection.vendor == 'postgresql':
+            install_postgresql_catalog_triggers(cursor, category_version)
+
+
+def uninstall_catalog_triggers(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            uninstall_sqlite_catalog_triggers(cursor)
+        elif connection.vendor == 'postgresql':
+            uninstall_postgresql_catalog_triggers(cursor)
@@ -0,0 +1,81 @@
+import hashlib
+import time
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .cache import get_catalog_state
+
+
+class NotModified(Exception):
+    def __init__(self, response):
+        super().__init__()
+        self.response = response
+
+
+class CatalogConditionalGetMixin:
+    """
+    Conditional GET for catalog viewsets, validated against the catalog version.
+
+    Every Product or Category write bumps the version (in the database, so
+    all worker processes agree), so a response for a given URL and format is
+    identical as long as the version is unchanged.
+    The ETag is derived from the version, the full path and the rendered
+    format; Last-Modified is the time of the last catalog write. A request
+    whose If-None-Match (or, without one, If-Modified-Since) still matches
+    gets a 304 Not Modified right after authentication, after a single read
+    of the catalog state row.
+
+    Last-Modified only has whole seconds: until the second of the last write
+    is over, a further write could leave it unchanged, so responses in that
+    second carry the ETag alone and If-Modified-Since is not answered.
+    """
+
+    conditional_actions = ('list', 'retrieve')
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.catalog_validators = None
+        self.catalog_state = None
+        if request.method not in ('GET', 'HEAD') or self.action not in self.conditional_actions:
+            return
+        # Read the version before the queries: a concurrent write then changes the next ETag
+        state = self.catalog_state = get_catalog_state()
+        etag = self.get_catalog_etag(request, state.version)
+        last_modified = int(state.modified) if int(time.time()) > int(state.modified) else None
+        self.catalog_validators = (etag, last_modified)
+        response = get_conditional_response(request._request, etag=etag, last_modified=last_modified)
+        if response is not None:
+            raise NotModified(response)
+
+    def get_category_version(self):
+        """
+        The category version for this request (see render_fragments()), read
+        with the rest of the catalog state at most once
+        """
+        if getattr(self, 'catalog_state', None) is None:
+            self.catalog_state = get_catalog_state()
+        return self.catalog_state.category_version
+
+    def get_catalog_etag(self, request, version):
+        variant = f"{request.get_full_path()}|{request.accepted_renderer.format}"
+        digest = hashlib.blake2b(variant.encode('utf-8'), digest_size=8).hexdigest()
+        return f'"{version}-{digest}"'
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            self.set_catalog_validators(exc.response)
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, 'catalog_validators', None) is not None and response.status_code == 200:
+            self.set_catalog_validators(response)
+        return response
+
+    def set_catalog_validators(self, response):
+        etag, last_modified = self.catalog_validators
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
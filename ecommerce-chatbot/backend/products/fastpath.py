@@ -0,0 +1,190 @@
+import decimal
+import threading
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+from .serializers import CachedCategoryField, CategorySerializer
+
+# Serializer fields that render the value loaded for these model fields unchanged
+PASSTHROUGH_FIELDS = {
+    serializers.IntegerField: (models.IntegerField, models.AutoField),
+    serializers.CharField: (models.CharField, models.TextField),
+    serializers.SlugField: models.SlugField,
+    serializers.URLField: models.URLField,
+    serializers.EmailField: models.EmailField,
+    serializers.BooleanField: models.BooleanField,
+}
+
+
+class UnsupportedField(Exception):
+    pass
+
+
+def decimal_converter(field):
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce_to_string or field.localize or field.normalize_output or field.decimal_places is None:
+        raise UnsupportedField(field.field_name)
+    quantum = decimal.Decimal('.1') ** field.decimal_places
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+    rounding = field.rounding
+
+    def convert(value):
+        if not isinstance(value, decimal.Decimal):
+            value = decimal.Decimal(str(value).strip())
+        return '{:f}'.format(value.quantize(quantum, rounding=rounding, context=context))
+    return convert
+
+
+def datetime_converter(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+    if output_format is None or output_format.lower() != ISO_8601 or field_timezone is None:
+        raise UnsupportedField(field.field_name)
+
+    def convert(value):
+        value = value.astimezone(field_timezone).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    return convert
+
+
+class ValuesSerializer:
+    """
+    Read-only fast path equivalent to a ModelSerializer's output.
+
+    The serializer's fields are compiled once into a column list and a
+    generated function that turns one values_list() row into the output
+    dict, with the same keys, order and representations (Decimal strings,
+    ISO 8601 datetimes) as the serializer. Related objects rendered by a
+    nested serializer (or CachedCategoryField) are joined into the same
+    query. compile() returns None for serializers using fields it does not
+    know, so callers can fall back to the regular serializer.
+    """
+
+    _cache = {}
+    _cache_lock = threading.Lock()
+
+    def __init__(self, model, columns, build):
+        self.model = model
+        self.columns = columns
+        self._build = build
+
+    @classmethod
+    def compile(cls, serializer):
+        """
+        Return the ValuesSerializer for a (bound) ModelSerializer instance, or None
+        """
+        fields = serializer.fields
+        key = (type(serializer), tuple(fields))
+        with cls._cache_lock:
+            if key not in cls._cache:
+                try:
+                    cls._cache[key] = cls._compile(serializer.Meta.model, fields)
+                except UnsupportedField:
+                    cls._cache[key] = None
+            return cls._cache[key]
+
+    @classmethod
+    def _compile(cls, model, fields):
+        columns = []
+        namespace = {}
+        expression = cls._dict_expression(model, fields, '', columns, namespace)
+        source = f"def build(row):\n    return {expression}\n"
+        exec(compile(source, f'<values serializer for {model.__name__}>', 'exec'), namespace)
+        return cls(model, columns, namespace['build'])
+
+    @classmethod
+    def _dict_expression(cls, model, fields, prefix, columns, namespace):
+        """
+        Python source for the output dict of `fields`, reading `row[i]` for each column
+        """
+        items = []
+        for field in fields.values():
+            if field.write_only:
+                continue
+            items.append(f"{field.field_name!r}: {cls._field_expression(model, field, prefix, columns, namespace)}")
+        return "{" + ", ".join(items) + "}"
+
+    @classmethod
+    def _field_expression(cls, model, field, prefix, columns, namespace):
+        if isinstance(field, CachedCategoryField):
+            # Same output as the cache lookup, joined into the query instead
+            field = CategorySerializer()
+            return cls._nested_expression(model, 'category', field, prefix, columns, namespace)
+        if field.source == '*' or len(field.source_attrs) != 1:
+            raise UnsupportedField(field.field_name)
+        source = field.source_attrs[0]
+        try:
+            model_field = model._meta.get_field(source)
+        except FieldDoesNotExist:
+            raise UnsupportedField(field.field_name)
+        if isinstance(field, serializers.ModelSerializer):
+            return cls._nested_expression(model, source, field, prefix, columns, namespace)
+        if not model_field.concrete or model_field.many_to_many or model_field.one_to_many:
+            raise UnsupportedField(field.field_name)
+        if model_field.is_relation and source != model_field.attname:
+            raise UnsupportedField(field.field_name)
+
+        column = prefix + source
+        index = len(columns)
+        columns.append(column)
+        value = f"row[{index}]"
+        if isinstance(field, serializers.DecimalField):
+            converter = decimal_converter(field)
+        elif isinstance(field, serializers.DateTimeField) and isinstance(model_field, models.DateTimeField):
+            converter = datetime_converter(field)
+        elif type(field) in PASSTHROUGH_FIELDS and isinstance(model_field, PASSTHROUGH_FIELDS[type(field)]):
+            return value
+        else:
+            raise UnsupportedField(field.field_name)
+        name = f"_convert_{index}"
+        namespace[name] = converter
+        return f"({name}({value}) if {value} is not None else None)"
+
+    @classmethod
+    def _nested_expression(cls, model, source, serializer, prefix, columns, namespace):
+        model_field = model._meta.get_field(source)
+        if not (model_field.many_to_one or model_field.one_to_one) or getattr(serializer, 'many', False):
+            raise UnsupportedField(source)
+        related_model = model_field.related_model
+        # Null foreign keys render as None, like the serializer
+        key_index = len(columns)
+        columns.append(prefix + model_field.attname)
+        nested = cls._dict_expression(related_model, serializer.fields, f"{prefix}{source}__", columns, namespace)
+        return f"({nested} if row[{key_index}] is not None else None)"
+
+    def rows(self, queryset, extra=()):
+        """
+        values_list() rows of the queryset, named so that pagination can read the
+        ordering fields; `extra` columns and the queryset's annotations are added
+        """
+        columns = list(dict.fromkeys([*self.columns, *extra, *queryset.query.annotations]))
+        return queryset.values_list(*columns, named=True)
+
+    def render(self, rows):
+        build = self._build
+        return [build(row) for row in rows]
+
+    def render_ordered(self, queryset, ids):
+        """
+        Render the rows with the given primary keys, in the order given
+        """
+        if not ids:
+            return []
+        rows = self.rows_by_pk(queryset, ids)
+        build = self._build
+        return [build(rows[pk]) for pk in ids if pk in rows]
+
+    def rows_by_pk(self, queryset, ids, extra=()):
+        pk_name = self.model._meta.pk.attname
+        rows = self.rows(queryset.filter(pk__in=ids), extra=(pk_name, *extra))
+        return {getattr(row, pk_name): row for row in rows}
+
+    def build(self, row):
+        return self._build(row)
@@ -0,0 +1,46 @@
+from rest_framework import filters
+from rest_framework.exceptions import ValidationError
+
+from .search import get_search_backend
+
+
+class ProductSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter answered by the product search backend. As with SearchFilter,
+    a product must match every search term; the results are ordered by
+    relevance, best match first. An explicit ?ordering= still takes precedence
+    (OrderingFilter runs after).
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        return get_search_backend().filter_queryset(
+            queryset, terms, match_all=True, window=self.get_window(request, view)
+        )
+
+    def get_window(self, request, view):
+        """
+        The (start, stop) positions in the relevance ranking the requested page
+        can come from, or None when the whole ranking may be needed
+        """
+        if request.query_params.get(filters.OrderingFilter.ordering_param):
+            return None
+        paginator = getattr(view, 'paginator', None)
+        if not hasattr(paginator, 'get_rank_window'):
+            return None
+        return paginator.get_rank_window(request)
+
+
+class ProductOrderingFilter(filters.OrderingFilter):
+    """
+    OrderingFilter that rejects unknown ?ordering= fields with a 400 instead of ignoring them
+    """
+
+    def remove_invalid_fields(self, queryset, fields, view, request):
+        valid = super().remove_invalid_fields(queryset, fields, view, request)
+        invalid = [field for field in fields if field and field not in valid]
+        if invalid:
+            raise ValidationError({self.ordering_param: [f"Unknown ordering field: {', '.join(invalid)}"]})
+        return valid
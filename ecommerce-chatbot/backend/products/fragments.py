@@ -0,0 +1,104 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .cache import get_category_version
+
+
+class FragmentCache:
+    """
+    Process-wide LRU cache of rendered products, keyed by
+    (values serializer, product id, updated_at, category version).
+
+    A product's output only changes when the product is written, which moves
+    its updated_at (the database does it for QuerySet.update(), see
+    products.catalog), or when a category is, which bumps the category
+    version shared by all worker processes. Writing one product leaves the
+    fragments of the others valid, and entries never need invalidating:
+    outdated keys are simply no longer asked for and fall off the end. PRODUCT_FRAGMENT_CACHE_SIZE
+    bounds the number of entries (0 disables the cache).
+    """
+
+    def __init__(self, max_size=None):
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._fragments = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def max_size(self):
+        if self._max_size is not None:
+            return self._max_size
+        return getattr(settings, 'PRODUCT_FRAGMENT_CACHE_SIZE', 10000)
+
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            for key in keys:
+                fragment = self._fragments.get(key)
+                if fragment is not None:
+                    self._fragments.move_to_end(key)
+                    found[key] = fragment
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def set_many(self, fragments):
+        max_size = self.max_size
+        if not max_size:
+            return
+        with self._lock:
+            for key, fragment in fragments.items():
+                self._fragments[key] = fragment
+                self._fragments.move_to_end(key)
+            while len(self._fragments) > max_size:
+                self._fragments.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._fragments.clear()
+
+    def __len__(self):
+        return len(self._fragments)
+
+
+product_fragments = FragmentCache()
+
+
+def key_rows(queryset, extra=()):
+    """
+    The narrow rows needed to look fragments up: primary key and updated_at,
+    plus the `extra` columns and annotations pagination orders by
+    """
+    pk_name = queryset.model._meta.pk.attname
+    columns = dict.fromkeys([pk_name, 'updated_at', *extra, *queryset.query.annotations])
+    return queryset.values_list(*columns, named=True)
+
+
+def render_fragments(values_serializer, queryset, rows, version=None):
+    """
+    Render the products of `rows` (from key_rows(), in output order) from the
+    fragment cache; the misses are rendered together with one query.
+    `version` is the category version read before `rows` (read here if not given).
+    """
+    pk_name = values_serializer.model._meta.pk.attname
+    if version is None:
+        version = get_category_version()
+    keys = [(values_serializer, getattr(row, pk_name), row.updated_at, version) for row in rows]
+    fragments = product_fragments.get_many(keys)
+    missing = [key[1] for key in keys if key not in fragments]
+    # Rows saved since the key query are rendered as they are now
+    fresh = {}
+    if missing:
+        rendered = {}
+        for pk, row in values_serializer.rows_by_pk(queryset, missing, extra=('updated_at',)).items():
+            fresh[pk] = rendered[(values_serializer, pk, row.updated_at, version)] = values_serializer.build(row)
+        product_fragments.set_many(rendered)
+    results = []
+    for key in keys:
+        fragment = fragments.get(key) or fresh.get(key[1])
+        if fragment is not None:
+            results.append(fragment)
+    return results
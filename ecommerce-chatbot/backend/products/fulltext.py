@@ -0,0 +1,151 @@
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+
+# Database-side full-text search over Product.name and Product.description.
+#
+# SQLite: an external-content FTS5 table kept in sync with products_product by
+# triggers, ranked with bm25(). PostgreSQL: a stored, generated tsvector column
+# (name weighted 'A', description 'B') with a GIN index, ranked with ts_rank().
+# Because the database maintains both, bulk writes that skip model signals
+# (bulk_create, QuerySet.update, raw SQL) are indexed as well.
+
+PRODUCT_TABLE = 'products_product'
+SQLITE_FTS_TABLE = 'products_product_fts'
+POSTGRESQL_SEARCH_COLUMN = 'search_vector'
+POSTGRESQL_SEARCH_INDEX = 'product_search_vector_idx'
+POSTGRESQL_SEARCH_CONFIG = 'english'
+
+# Per-column bm25() weights, matching ProductIndex.FIELD_WEIGHTS
+SQLITE_BM25_WEIGHTS = '3.0, 1.0'
+
+SQLITE_TRIGGERS = {
+    f'{SQLITE_FTS_TABLE}_insert': f"""
+        CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_insert AFTER INSERT ON {PRODUCT_TABLE} BEGIN
+            INSERT INTO {SQLITE_FTS_TABLE}(rowid, name, description) VALUES (new.id, new.name, new.description);
+        END
+    """,
+    f'{SQLITE_FTS_TABLE}_delete': f"""
+        CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_delete AFTER DELETE ON {PRODUCT_TABLE} BEGIN
+            INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, name, description)
+            VALUES ('delete', old.id, old.name, old.description);
+        END
+    """,
+    f'{SQLITE_FTS_TABLE}_update': f"""
+        CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_update AFTER UPDATE OF id, name, description ON {PRODUCT_TABLE} BEGIN
+            INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, name, description)
+            VALUES ('delete', old.id, old.name, old.description);
+            INSERT INTO {SQLITE_FTS_TABLE}(rowid, name, description) VALUES (new.id, new.name, new.description);
+        END
+    """,
+}
+
+
+def install_sqlite_fulltext(cursor):
+    cursor.execute(
+        "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger') AND name LIKE %s",
+        [f'{SQLITE_FTS_TABLE}%'],
+    )
+    existing = {row[0] for row in cursor.fetchall()}
+    cursor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_FTS_TABLE} USING fts5("
+        f"name, description, content='{PRODUCT_TABLE}', content_rowid='id', tokenize='porter unicode61')"
+    )
+    for trigger in SQLITE_TRIGGERS.values():
+        cursor.execute(trigger)
+    # SQLite migrations that alter products_product rebuild the table, which drops
+    # its triggers; in that case writes may have been missed, so reindex everything
+    if not existing.issuperset([SQLITE_FTS_TABLE, *SQLITE_TRIGGERS]):
+        cursor.execute(f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}) VALUES ('rebuild')")
+
+
+def uninstall_sqlite_fulltext(cursor):
+    for trigger in SQLITE_TRIGGERS:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    cursor.execute(f"DROP TABLE IF EXISTS {SQLITE_FTS_TABLE}")
+
+
+def install_postgresql_fulltext(cursor):
+    cursor.execute(
+        f"ALTER TABLE {PRODUCT_TABLE} ADD COLUMN IF NOT EXISTS {POSTGRESQL_SEARCH_COLUMN} tsvector "
+        f"GENERATED ALWAYS AS ("
+        f"setweight(to_tsvector('{POSTGRESQL_SEARCH_CONFIG}'::regconfig, coalesce(name, '')), 'A') || "
+        f"setweight(to_tsvector('{POSTGRESQL_SEARCH_CONFIG}'::regconfig, coalesce(description, '')), 'B')"
+        f") STORED"
+    )
+    cursor.execute(
+        f"CREATE INDEX IF NOT EXISTS {POSTGRESQL_SEARCH_INDEX} ON {PRODUCT_TABLE} "
+        f"USING GIN ({POSTGRESQL_SEARCH_COLUMN})"
+    )
+
+
+def uninstall_postgresql_fulltext(cursor):
+    cursor.execute(f"DROP INDEX IF EXISTS {POSTGRESQL_SEARCH_INDEX}")
+    cursor.execute(f"ALTER TABLE {PRODUCT_TABLE} DROP COLUMN IF EXISTS {POSTGRESQL_SEARCH_COLUMN}")
+
+
+def install_fulltext(connection):
+    """
+    Create the full-text index for the connection's database, if it has one.
+    Safe to run repeatedly.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            install_sqlite_fulltext(cursor)
+        elif connection.vendor == 'postgresql':
+            install_postgresql_fulltext(cursor)
+
+
+def uninstall_fulltext(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            uninstall_sqlite_fulltext(cursor)
+        elif connection.vendor == 'postgresql':
+            uninstall_postgresql_fulltext(cursor)
+
+
+def sqlite_match(terms, match_all=False):
+    """
+    FTS5 query matching any (or, with match_all, every) of the terms (terms are already [a-z0-9]+ tokens)
+    """
+    return (" AND " if match_all else " OR ").join(f'"{term}"' for term in terms)
+
+
+def sqlite_matches(terms, match_all=False):
+    return RawSQL(
+        f'"{PRODUCT_TABLE}"."id" IN (SELECT rowid FROM {SQLITE_FTS_TABLE} WHERE {SQLITE_FTS_TABLE} MATCH %s)',
+        [sqlite_match(terms, match_all)],
+        output_field=BooleanField(),
+    )
+
+
+def sqlite_rank(terms):
+    # bm25() is lower for better matches, so negate it
+    return RawSQL(
+        f'(SELECT -bm25({SQLITE_FTS_TABLE}, {SQLITE_BM25_WEIGHTS}) FROM {SQLITE_FTS_TABLE} '
+        f'WHERE {SQLITE_FTS_TABLE} MATCH %s AND {SQLITE_FTS_TABLE}.rowid = "{PRODUCT_TABLE}"."id")',
+        [sqlite_match(terms)],
+        output_field=FloatField(),
+    )
+
+
+def postgresql_query(terms, match_all=False):
+    """
+    tsquery text matching any (or, with match_all, every) of the terms (terms are already [a-z0-9]+ tokens)
+    """
+    return (" & " if match_all else " | ").join(terms)
+
+
+def postgresql_matches(terms, match_all=False):
+    return RawSQL(
+        f'"{PRODUCT_TABLE}"."{POSTGRESQL_SEARCH_COLUMN}" @@ to_tsquery(%s::regconfig, %s)',
+        [POSTGRESQL_SEARCH_CONFIG, postgresql_query(terms, match_all)],
+        output_field=BooleanField(),
+    )
+
+
+def postgresql_rank(terms):
+    return RawSQL(
+        f'ts_rank("{PRODUCT_TABLE}"."{POSTGRESQL_SEARCH_COLUMN}", to_tsquery(%s::regconfig, %s))',
+        [POSTGRESQL_SEARCH_CONFIG, postgresql_query(terms)],
+        output_field=FloatField(),
+    )
@@ -0,0 +1,280 @@
+import re
+import threading
+import time
+from collections import Counter, namedtuple
+
+from django.conf import settings
+
+from .cache import catalog_request, get_reindex_generation
+
+WORD_RE = re.compile(r'[a-z0-9]+')
+
+# Words shorter than this are never corrected: too many real words are one edit apart
+MIN_CORRECTION_LENGTH = 4
+
+# A vocabulary term close to a misspelled word, with how often the term occurs
+Suggestion = namedtuple('Suggestion', ['term', 'distance', 'count'])
+
+
+def trigrams(word):
+    """
+    The character trigrams of a word padded with two spaces on each side, with
+    how often each occurs: "cat" gives {"  c": 1, " ca": 1, "cat": 1, "at ": 1, "t  ": 1}
+    and "aaaa" counts "aaa" twice
+    """
+    padded = f"  {word}  "
+    return Counter(padded[position:position + 3] for position in range(len(padded) - 2))
+
+
+def max_edit_distance(word):
+    return 1 if len(word) < 7 else 2
+
+
+def bounded_levenshtein(source, target, max_distance):
+    """
+    Levenshtein distance between two words, or None as soon as it must exceed max_distance
+    """
+    if abs(len(source) - len(target)) > max_distance:
+        return None
+    previous = list(range(len(target) + 1))
+    for row, source_char in enumerate(source, 1):
+        current = [row]
+        for column, target_char in enumerate(target, 1):
+            current.append(min(
+                previous[column] + 1,
+                current[column - 1] + 1,
+                previous[column - 1] + (source_char != target_char),
+            ))
+        if min(current) > max_distance:
+            return None
+        previous = current
+    return previous[-1] if previous[-1] <= max_distance else None
+
+
+class TrigramIndex:
+    """
+    Character-trigram index over a vocabulary of words, for typo-tolerant lookup.
+
+    Posting lists are kept per (word length, trigram), so a lookup only reads
+    the lengths that are within the edit distance bound. Candidates come from
+    the q-gram lemma: a word of length m within k edits of a query of length n
+    shares at least max(n, m) + 2 - 3k trigrams with it, counting repeated
+    trigrams as often as both words have them. A candidate must therefore
+    appear in one of the shortest posting lists: enough of them that the
+    others hold fewer trigrams of the query than that. Only the surviving
+    candidates are checked with a bounded Levenshtein distance.
+    """
+
+    def __init__(self, words=()):
+        self._lock = threading.RLock()
+        self._reset()
+        for word in words:
+            self.add(word)
+
+    def _reset(self):
+        # word -> number of times it has been added
+        self._counts = {}
+        # (word length, trigram) -> {word: occurrences of the trigram in the word}
+        self._postings = {}
+        # word length -> set of words, for lookups too short for the lemma to rule anything out
+        self._lengths = {}
+
+    def __contains__(self, word):
+        return word in self._counts
+
+    def __len__(self):
+        return len(self._counts)
+
+    def add(self, word, count=1):
+        with self._lock:
+            if word in self._counts:
+                self._counts[word] += count
+                return
+            self._counts[word] = count
+            self._lengths.setdefault(len(word), set()).add(word)
+            for trigram, occurrences in trigrams(word).items():
+                self._postings.setdefault((len(word), trigram), {})[word] = occurrences
+
+    def discard(self, word, count=1):
+        with self._lock:
+            remaining = self._counts.get(word, 0) - count
+            if remaining > 0:
+                self._counts[word] = remaining
+                return
+            if self._counts.pop(word, None) is None:
+                return
+            words = self._lengths[len(word)]
+            words.discard(word)
+            if not words:
+                del self._lengths[len(word)]
+            for trigram in trigrams(word):
+                key = (len(word), trigram)
+                postings = self._postings.get(key)
+                if postings is not None:
+                    postings.pop(word, None)
+                    if not postings:
+                        del self._postings[key]
+
+    def suggest(self, word, max_distance=None):
+        """
+        Return the closest vocabulary word within max_distance edits (fewest
+        edits first, then the most frequent), or None
+        """
+        if max_distance is None:
+            max_distance = max_edit_distance(word)
+        query_trigrams = trigrams(word)
+        best = None
+        with self._lock:
+            for length in range(max(len(word) - max_distance, 1), len(word) + max_distance + 1):
+                threshold = max(len(word), length) + 2 - 3 * max_distance
+                postings = sorted(
+                    ((self._postings.get((length, trigram), {}), occurrences)
+                     for trigram, occurrences in query_trigrams.items()),
+                    key=lambda item: len(item[0]),
+                )
+                if threshold <= 0:
+                    # Words sharing no trigram at all can still be close enough
+                    candidates = self._lengths.get(length, ())
+                else:
+                    # Every candidate occurs in at least one of the shortest lists:
+                    # the rest hold fewer than `threshold` of the query's trigrams
+                    shortest, remaining = 0, sum(query_trigrams.values())
+                    while remaining >= threshold:
+                        remaining -= postings[shortest][1]
+                        shortest += 1
+                    candidates = set().union(*(posting for posting, _ in postings[:shortest]))
+                for candidate in candidates:
+                    shared = sum(min(posting.get(candidate, 0), occurrences) for posting, occurrences in postings)
+                    if shared < threshold:
+                        continue
+                    distance = bounded_levenshtein(word, candidate, max_distance)
+                    if distance is None:
+                        continue
+                    suggestion = Suggestion(candidate, distance, self._counts[candidate])
+                    if best is None or (distance, -suggestion.count, candidate) < (best.distance, -best.count, best.term):
+                        best = suggestion
+        return best
+
+
+class ProductVocabulary(TrigramIndex):
+    """
+    TrigramIndex over the words of every Product.name.
+
+    Built at startup (see products/warmup.py), or from the database on first
+    use, kept current by the Product signals and rebuilt when a bulk import
+    requests a reindex;
+    PRODUCT_VOCABULARY_TTL (in seconds) rebuilds it
+    periodically, like PRODUCT_SEARCH_INDEX_TTL does for the search index.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._built_at = None
+        self._generation = None
+
+    def _reset(self):
+        super()._reset()
+        # product_id -> words of its name
+        self._product_words = {}
+
+    @staticmethod
+    def words(name):
+        return [word for word in WORD_RE.findall((name or '').lower()) if not word.isdigit()]
+
+    def build(self):
+        from .models import Product
+
+        with self._lock:
+            self._reset()
+            self._generation = get_reindex_generation()
+            for product_id, name in Product.objects.values_list('id', 'name').iterator(chunk_size=2000):
+                self._add_product(product_id, name)
+            self._built_at = time.monotonic()
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+            self._built_at = None
+
+    def _ensure_built(self):
+        ttl = getattr(settings, 'PRODUCT_VOCABULARY_TTL', None)
+        if self._built_at is None or (ttl is not None and time.monotonic() - self._built_at > ttl):
+            self.build()
+        elif get_reindex_generation() != self._generation:
+            self.build()
+
+    def _add_product(self, product_id, name):
+        words = self.words(name)
+        self._product_words[product_id] = words
+        for word in words:
+            self.add(word)
+
+    def _remove_product(self, product_id):
+        for word in self._product_words.pop(product_id, ()):
+            self.discard(word)
+
+    def update(self, product):
+        """
+        Re-index the name of a single product; a no-op until the vocabulary has been built
+        """
+        with self._lock:
+            if self._built_at is None:
+                return
+            self._remove_product(product.pk)
+            self._add_product(product.pk, product.name)
+
+    def remove(self, product_id):
+        with self._lock:
+            if self._built_at is not None:
+                self._remove_product(product_id)
+
+    def __contains__(self, word):
+        with self._lock:
+            self._ensure_built()
+            return super().__contains__(word)
+
+    def suggest(self, word, max_distance=None):
+        with self._lock:
+            self._ensure_built()
+            return super().suggest(word, max_distance)
+
+
+product_vocabulary = ProductVocabulary()
+
+
+def word_forms(word):
+    """
+    The word and its singular forms, so "phones" counts as known when "phone" is
+    """
+    forms = [word]
+    if word.endswith('es'):
+        forms.append(word[:-2])
+    if word.endswith('s'):
+        forms.append(word[:-1])
+    return forms
+
+
+def correct_words(text, vocabularies, ignore=()):
+    """
+    Replace the words of `text` that no vocabulary knows with their closest
+    suggestion. Returns (corrected text, {word: correction}); the text is
+    lowercased. The reindex generation is read once for all the lookups.
+    """
+    corrections = {}
+
+    def correct(match):
+        word = match.group(0)
+        if len(word) < MIN_CORRECTION_LENGTH or word.isdigit() or word in ignore:
+            return word
+        if any(form in vocabulary for form in word_forms(word) for vocabulary in vocabularies):
+            return word
+        suggestions = [vocabulary.suggest(word) for vocabulary in vocabularies]
+        suggestions = [suggestion for suggestion in suggestions if suggestion is not None]
+        if not suggestions:
+            return word
+        best = min(suggestions, key=lambda suggestion: (suggestion.distance, -suggestion.count, suggestion.term))
+        corrections[word] = best.term
+        return best.term
+
+    with catalog_request():
+        return WORD_RE.sub(correct, text.lower()), corrections
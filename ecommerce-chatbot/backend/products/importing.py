@@ -0,0 +1,276 @@
+import csv
+import json
+from collections import OrderedDict
+from decimal import Decimal, InvalidOperation
+from functools import reduce
+from itertools import islice
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.core.validators import URLValidator
+from django.db import transaction
+from django.db.models import Q
+from django.utils.text import slugify
+
+from .cache import category_cache, request_reindex
+from .models import Category, Product
+
+# Columns of an import row; `slug` is optional and derived from the name when missing
+FIELDS = ('name', 'slug', 'description', 'price', 'category', 'image_url', 'stock')
+UPDATE_FIELDS = ['name', 'description', 'price', 'category', 'image_url', 'stock', 'updated_at']
+
+# Slug prefixes checked per query when making slugs unique (SQLite limits expression depth)
+SLUG_QUERY_CHUNK = 200
+# Slugs whose highest suffix is remembered during an import
+SLUG_SUFFIX_CACHE_SIZE = 100000
+
+validate_url = URLValidator()
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_csv(stream):
+    """
+    Yield (line number, row dict) from a CSV stream with a header row
+    """
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def read_jsonl(stream):
+    """
+    Yield (line number, row dict) from a stream of JSON objects, one per line
+    """
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield line_number, RowError(f"Invalid JSON: {exc}")
+            continue
+        if not isinstance(row, dict):
+            yield line_number, RowError("Expected a JSON object")
+            continue
+        yield line_number, row
+
+
+READERS = {'csv': read_csv, 'jsonl': read_jsonl}
+
+
+def clean_row(row):
+    """
+    Return the validated field values of one import row, or raise RowError
+    """
+    if isinstance(row, RowError):
+        raise row
+    values = {field: '' if row.get(field) is None else str(row[field]).strip() for field in FIELDS}
+    if not values['name']:
+        raise RowError("Missing name")
+    if len(values['name']) > Product._meta.get_field('name').max_length:
+        raise RowError("Name is too long")
+    if not values['category']:
+        raise RowError("Missing category")
+    try:
+        price = Decimal(values['price']).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise RowError(f"Invalid price {values['price']!r}")
+    if not price.is_finite() or price < 0 or len(price.as_tuple().digits) > Product._meta.get_field('price').max_digits:
+        raise RowError(f"Invalid price {values['price']!r}")
+    values['price'] = price
+    try:
+        values['stock'] = int(values['stock'] or 0)
+    except ValueError:
+        raise RowError(f"Invalid stock {values['stock']!r}")
+    if values['stock'] < 0:
+        raise RowError(f"Invalid stock {values['stock']!r}")
+    try:
+        validate_url(values['image_url'])
+    except ValidationError:
+        raise RowError(f"Invalid image_url {values['image_url']!r}")
+    values['slug'] = slugify(values['slug'] or values['name'])[:Product._meta.get_field('slug').max_length]
+    if not values['slug']:
+        raise RowError("Name gives an empty slug")
+    return values
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class ProductImporter:
+    """
+    Streams rows into the Product table with bulk writes.
+
+    Rows are cleaned one at a time and written in batches of `batch_size`,
+    each batch in its own transaction, so memory stays bounded whatever the
+    size of the feed. Categories are resolved by name from one in-memory
+    map; missing ones are created. Without `upsert`, slugs are made unique
+    with a numeric suffix ("shirt", "shirt-2", ...), checked against the
+    database once per batch; with `upsert`, a row whose slug already exists
+    updates that product instead.
+
+    Bulk writes bypass the Product signals, so finish() refreshes what they
+    would have: the search and vocabulary indexes, the semantic index and the
+    category cache. The full-text index and the catalog version are kept
+    current by the database itself.
+    """
+
+    def __init__(self, batch_size=1000, upsert=False):
+        self.batch_size = batch_size
+        self.upsert = upsert
+        self.categories = {category['name'].lower(): category['id'] for category in category_cache.all()}
+        self.slug_suffixes = OrderedDict()
+        self.created = 0
+        self.updated = 0
+        self.errors = []
+        self.error_count = 0
+
+    def clean(self, rows, max_errors=None):
+        """
+        Yield the cleaned values of valid rows; invalid ones are counted and the first few kept
+        """
+        for line_number, row in rows:
+            try:
+                yield clean_row(row)
+            except RowError as exc:
+                self.error_count += 1
+                if len(self.errors) < 20:
+                    self.errors.append((line_number, str(exc)))
+                if max_errors is not None and self.error_count > max_errors:
+                    raise
+
+    def run(self, rows, max_errors=None, progress=None):
+        try:
+            for batch in batched(self.clean(rows, max_errors), self.batch_size):
+                with transaction.atomic():
+                    self.write(batch)
+                if progress is not None:
+                    progress(self)
+        finally:
+            # Batches already committed stay imported, even if a later one fails
+            if self.created or self.updated:
+                self.finish()
+
+    def category_id(self, name):
+        key = name.lower()
+        if key not in self.categories:
+            slug = slugify(name)[:Category._meta.get_field('slug').max_length]
+            category = Category.objects.filter(slug=slug).first()
+            if category is None:
+                category = Category.objects.create(name=name, slug=slug)
+            self.categories[key] = category.id
+        return self.categories[key]
+
+    def write(self, batch):
+        products = [
+            Product(
+                name=values['name'],
+                slug=values['slug'],
+                description=values['description'],
+                price=values['price'],
+                category_id=self.category_id(values['category']),
+                image_url=values['image_url'],
+                stock=values['stock'],
+            )
+            for values in batch
+        ]
+        if self.upsert:
+            # One row per slug: the last one in the feed wins
+            products = list({product.slug: product for product in products}.values())
+            existing = set(
+                Product.objects.filter(slug__in=[product.slug for product in products]).values_list('slug', flat=True)
+            )
+            Product.objects.bulk_create(
+                products, update_conflicts=True, unique_fields=['slug'], update_fields=UPDATE_FIELDS,
+            )
+            self.updated += len(existing)
+            self.created += len(products) - len(existing)
+        else:
+            self.assign_unique_slugs(products)
+            Product.objects.bulk_create(products)
+            self.created += len(products)
+
+    def assign_unique_slugs(self, products):
+        """
+        Give each product a slug not used in the database or earlier in the batch
+        """
+        max_length = Product._meta.get_field('slug').max_length
+        slugs = {product.slug for product in products}
+        taken = set(Product.objects.filter(slug__in=slugs).values_list('slug', flat=True))
+        seen = set()
+        clashing = set()
+        for product in products:
+            if product.slug in taken or product.slug in seen:
+                clashing.add(product.slug)
+            seen.add(product.slug)
+        if not clashing:
+            return
+
+        # Highest numeric suffix already used for each clashing slug, from the
+        # database unless this import has already suffixed that slug
+        suffixes = {}
+        unknown = []
+        for slug in sorted(clashing):
+            if slug in self.slug_suffixes:
+                suffixes[slug] = self.slug_suffixes[slug]
+            else:
+                suffixes[slug] = 1
+                unknown.append(slug)
+        for start in range(0, len(unknown), SLUG_QUERY_CHUNK):
+            # Ranges rather than startswith (LIKE), so that the unique slug index answers them
+            prefixes = reduce(or_, [
+                Q(slug__gt=f'{slug}-', slug__lt=f'{slug}.') for slug in unknown[start:start + SLUG_QUERY_CHUNK]
+            ])
+            for slug in Product.objects.filter(prefixes).values_list('slug', flat=True):
+                base, _, suffix = slug.rpartition('-')
+                if base in suffixes and suffix.isdigit():
+                    suffixes[base] = max(suffixes[base], int(suffix))
+
+        # (product, base slug) of the products to rename
+        pending = []
+        seen = set()
+        for product in products:
+            if product.slug in suffixes and (product.slug in taken or product.slug in seen):
+                pending.append((product, product.slug))
+            else:
+                seen.add(product.slug)
+        while pending:
+            for product, base in pending:
+                while product.slug in slugs or product.slug in seen:
+                    suffixes[base] += 1
+                    suffix = f'-{suffixes[base]}'
+                    product.slug = base[:max_length - len(suffix)] + suffix
+                seen.add(product.slug)
+            # A cached suffix can be behind the database: an earlier batch may
+            # have written a name ending in the next number ("Zed Shirt 3")
+            taken = set(
+                Product.objects.filter(slug__in=[product.slug for product, _ in pending]).values_list('slug', flat=True)
+            )
+            pending = [(product, base) for product, base in pending if product.slug in taken]
+
+        for slug, suffix in suffixes.items():
+            self.slug_suffixes[slug] = suffix
+            self.slug_suffixes.move_to_end(slug)
+        while len(self.slug_suffixes) > SLUG_SUFFIX_CACHE_SIZE:
+            self.slug_suffixes.popitem(last=False)
+
+    def finish(self):
+        refresh_catalog()
+
+
+def refresh_catalog():
+    """
+    Refresh what the Product signals would have after products were written in bulk
+    """
+    from .semantic import semantic_index
+
+    category_cache.invalidate()
+    request_reindex()
+    if semantic_index.exists():
+        semantic_index.build()
@@ -0,0 +1,77 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from products.fastpath import ValuesSerializer
+from products.models import Category, Product
+from products.serializers import ProductSerializer
+from products.planning import plan_queryset
+
+
+class Command(BaseCommand):
+    help = "Time rendering a product listing with ProductSerializer and with the values() fast path"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=100, help="Products per listing (default 100)")
+        parser.add_argument('--repeat', type=int, default=50, help="Timed runs of each path (default 50)")
+        parser.add_argument(
+            '--create', type=int, default=0,
+            help="Insert this many throwaway products first; they are rolled back afterwards",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['create']:
+                self.create_products(options['create'])
+            self.benchmark(options['limit'], options['repeat'])
+            transaction.set_rollback(True)
+
+    def create_products(self, count):
+        # bulk_create sends no signals, so the search indexes are left alone
+        category, _ = Category.objects.get_or_create(slug='benchmark', defaults={'name': 'Benchmark'})
+        Product.objects.bulk_create([
+            Product(
+                name=f"Benchmark product {number}",
+                slug=f"benchmark-product-{number}",
+                description="A product created by benchmark_serializers",
+                price=Decimal(number % 1000) + Decimal('0.99'),
+                category=category,
+                image_url='https://example.com/benchmark.png',
+                stock=number % 50,
+            )
+            for number in range(count)
+        ], batch_size=1000)
+
+    def benchmark(self, limit, repeat):
+        serializer = ProductSerializer()
+        values_serializer = ValuesSerializer.compile(serializer)
+        if values_serializer is None:
+            raise CommandError("ProductSerializer has fields the fast path does not support")
+        queryset = plan_queryset(Product.objects.order_by('-created_at', '-id'), serializer.fields)
+        renderer = JSONRenderer()
+
+        def serialize():
+            return renderer.render(ProductSerializer(queryset[:limit], many=True).data)
+
+        def fast():
+            return renderer.render(values_serializer.render(values_serializer.rows(queryset)[:limit]))
+
+        expected, output = serialize(), fast()
+        if output != expected:
+            raise CommandError("The fast path output differs from ProductSerializer")
+        count = len(values_serializer.rows(queryset)[:limit])
+        self.stdout.write(f"{count} products per listing, {len(output)} bytes, {repeat} runs each")
+
+        timings = {}
+        for name, render in (('ProductSerializer', serialize), ('ValuesSerializer', fast)):
+            started = time.perf_counter()
+            for _ in range(repeat):
+                render()
+            timings[name] = (time.perf_counter() - started) / repeat
+            self.stdout.write(f"{name:<18} {timings[name] * 1000:8.2f} ms per listing")
+        self.stdout.write(self.style.SUCCESS(
+            f"Speedup: {timings['ProductSerializer'] / timings['ValuesSerializer']:.1f}x"
+        ))
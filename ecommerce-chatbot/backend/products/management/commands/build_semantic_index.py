@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from products.semantic import semantic_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the semantic product index used by the chatbot's search fallback. "
+        "Requests never build it; run this at deploy time and whenever the log "
+        "reports that the index is full."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--if-missing', action='store_true',
+            help="Only build the index if it has not been built yet",
+        )
+        parser.add_argument(
+            '--spare-rows', type=int, default=None,
+            help="Rows reserved for products created later (default: a quarter of the products, at least 64)",
+        )
+
+    def handle(self, *args, **options):
+        if options['spare_rows'] is not None and options['spare_rows'] < 0:
+            raise CommandError("--spare-rows must not be negative")
+        if options['if_missing'] and semantic_index.exists():
+            self.stdout.write(f"The semantic index in {semantic_index.directory} already exists")
+            return
+        semantic_index.build(spare_rows=options['spare_rows'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Built the semantic index of {int((semantic_index.product_ids != 0).sum())} products "
+            f"in {semantic_index.directory}"
+        ))
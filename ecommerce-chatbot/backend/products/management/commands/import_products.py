@@ -0,0 +1,74 @@
+import io
+import sys
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.importing import READERS, ProductImporter, RowError
+
+
+class Command(BaseCommand):
+    help = (
+        "Import products from a CSV (with a header row) or JSONL file, or from stdin. "
+        "Columns: name, slug (optional), description, price, category (name), image_url, stock"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or - for stdin")
+        parser.add_argument(
+            '--format', choices=sorted(READERS),
+            help="Input format (default: from the file extension; required for stdin)",
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows per bulk write and transaction (default 1000)")
+        parser.add_argument(
+            '--upsert', action='store_true',
+            help="Update the product with the same slug instead of adding a product with a suffixed slug",
+        )
+        parser.add_argument(
+            '--max-errors', type=int, default=None,
+            help="Stop after this many invalid rows (default: skip and report them all)",
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        input_format = options['format'] or Path(path).suffix.lstrip('.').lower()
+        if input_format not in READERS:
+            raise CommandError("Cannot tell the input format: pass --format csv or --format jsonl")
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1")
+
+        importer = ProductImporter(batch_size=options['batch_size'], upsert=options['upsert'])
+        started = time.monotonic()
+
+        def progress(importer):
+            self.stderr.write(
+                f"{importer.created + importer.updated} rows written "
+                f"({time.monotonic() - started:.1f}s)", ending='\r'
+            )
+
+        if path == '-':
+            stream = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8-sig', newline='')
+        else:
+            try:
+                stream = open(path, encoding='utf-8-sig', newline='')
+            except OSError as exc:
+                raise CommandError(f"Cannot open {path}: {exc}")
+        try:
+            with stream:
+                importer.run(READERS[input_format](stream), options['max_errors'], progress)
+        except RowError as exc:
+            raise CommandError(f"Too many invalid rows; stopped at: {exc}")
+        finally:
+            self.stderr.write('')
+            for line_number, message in importer.errors:
+                self.stderr.write(self.style.WARNING(f"Line {line_number}: {message}"))
+            if importer.error_count > len(importer.errors):
+                self.stderr.write(self.style.WARNING(
+                    f"... and {importer.error_count - len(importer.errors)} more invalid rows"
+                ))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {importer.created} new and {importer.updated} updated products, "
+            f"skipped {importer.error_count} invalid rows in {time.monotonic() - started:.1f}s"
+        ))
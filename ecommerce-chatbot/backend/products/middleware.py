@@ -0,0 +1,21 @@
+from asgiref.sync import iscoroutinefunction
+from django.utils.decorators import sync_and_async_middleware
+
+from .cache import catalog_request
+
+
+@sync_and_async_middleware
+def catalog_request_middleware(get_response):
+    """
+    Read the reindex generation at most once per request, however many
+    in-process index lookups the request makes
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            with catalog_request():
+                return await get_response(request)
+    else:
+        def middleware(request):
+            with catalog_request():
+                return get_response(request)
+    return middleware
@@ -0,0 +1,23 @@
+from django.db import migrations
+
+from products.fulltext import install_fulltext, uninstall_fulltext
+
+
+def create_fulltext_index(apps, schema_editor):
+    install_fulltext(schema_editor.connection)
+
+
+def drop_fulltext_index(apps, schema_editor):
+    uninstall_fulltext(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_hot_query_indexes'),
+    ]
+
+    operations = [
+        # SQLite: FTS5 table plus sync triggers; PostgreSQL: generated tsvector column plus GIN index
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.2 on 2026-10-18 19:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_product_fulltext'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductNeighbors',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='neighbors', serialize=False, to='products.product')),
+                ('neighbor_ids', models.JSONField(default=list)),
+                ('scores', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Product neighbors',
+            },
+        ),
+    ]
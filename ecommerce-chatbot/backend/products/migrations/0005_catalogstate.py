@@ -0,0 +1,34 @@
+# Generated by Django 5.2.2 on 2026-10-18 20:00
+
+from django.db import migrations, models
+
+from products.catalog import install_catalog_triggers, uninstall_catalog_triggers
+
+
+def create_catalog_triggers(apps, schema_editor):
+    install_catalog_triggers(schema_editor.connection, category_version=False)
+
+
+def drop_catalog_triggers(apps, schema_editor):
+    uninstall_catalog_triggers(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_productneighbors'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0)),
+                ('modified', models.FloatField(default=0)),
+                ('reindex', models.BigIntegerField(default=0)),
+            ],
+        ),
+        # The state row plus triggers bumping it on every Product or Category write
+        migrations.RunPython(create_catalog_triggers, drop_catalog_triggers),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.2 on 2026-10-18 21:00
+
+from django.db import migrations, models
+
+from products.catalog import install_catalog_triggers, uninstall_catalog_triggers
+
+
+def create_catalog_triggers(apps, schema_editor):
+    install_catalog_triggers(schema_editor.connection)
+
+
+def create_previous_catalog_triggers(apps, schema_editor):
+    install_catalog_triggers(schema_editor.connection, category_version=False)
+
+
+def drop_catalog_triggers(apps, schema_editor):
+    uninstall_catalog_triggers(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_catalogstate'),
+    ]
+
+    # SQLite rebuilds products_catalogstate to add the column, which the
+    # triggers refer to: they are dropped first and created again after
+    operations = [
+        migrations.RunPython(drop_catalog_triggers, create_previous_catalog_triggers),
+        migrations.AddField(
+            model_name='catalogstate',
+            name='category_version',
+            field=models.BigIntegerField(db_default=0, default=0),
+        ),
+        # Category writes bump the new column, and product updates always move updated_at
+        migrations.RunPython(create_catalog_triggers, drop_catalog_triggers),
+    ]
@@ -21,7 +21,8 @@ class Product(models.Model):
     slug = models.SlugField(max_length=200, unique=True, blank=True)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
-    category = models.ForeignKey(Category, related_name='products', on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, related_name='products', on_delete=models.CASCADE,
+                                 db_index=False)  # Covered by product_category_created_idx
     image_url = models.URLField(max_length=500)
     stock = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -34,3 +35,44 @@ class Product(models.Model):
     
     def __str__(self):
         return self.name
+    
+    class Meta:
+        indexes = [
+            # Newest products overall and within a category
+            models.Index(fields=['-created_at'], name='product_created_idx'),
+            models.Index(fields=['category', '-created_at'], name='product_category_created_idx'),
+            # Price filters and price ordering
+            models.Index(fields=['price'], name='product_price_idx'),
+        ]
+
+class ProductNeighbors(models.Model):
+    """
+    Precomputed top-K most similar products of a product, best first.
+    Written by the build_recommendations command; one row per product.
+    """
+    product = models.OneToOneField(Product, related_name='neighbors', on_delete=models.CASCADE, primary_key=True)
+    neighbor_ids = models.JSONField(default=list)
+    scores = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Neighbors of product {self.product_id}"
+    
+    class Meta:
+        verbose_name_plural = 'Product neighbors'
+
+class CatalogState(models.Model):
+    """
+    The single row recording catalog writes, shared by every worker process.
+    Database triggers (products.catalog) bump `version` and set `modified` on
+    every Product or Category write, including bulk_create, QuerySet.update()
+    and raw SQL, and `category_version` on Category writes only; `reindex` is
+    bumped by request_reindex() after bulk imports.
+    """
+    version = models.BigIntegerField(default=0)
+    modified = models.FloatField(default=0)  # Seconds since the epoch
+    reindex = models.BigIntegerField(default=0)
+    category_version = models.BigIntegerField(default=0, db_default=0)
+    
+    def __str__(self):
+        return f"Catalog version {self.version}"
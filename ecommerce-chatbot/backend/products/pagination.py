@@ -0,0 +1,201 @@
+import json
+from base64 import b64decode, b64encode
+from collections import namedtuple
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework import exceptions
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param, remove_query_param
+
+Cursor = namedtuple('Cursor', ['position', 'reverse'])
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination keyed on the active ordering, with the primary key as a
+    tie-breaker, so every page is an index range scan however deep it is.
+
+    The ordering comes from ?ordering= (OrderingFilter), else from the
+    queryset (e.g. search relevance), else `default_ordering`. The cursor
+    holds the ordering values of the last (or, for `previous`, the first)
+    row of a page; the next page is the rows strictly after it.
+
+    `page_size` is capped at `max_page_size`. ?page_size=all explicitly opts
+    out of pagination and returns the plain, unbounded list, in the same order.
+    A malformed cursor is a 400.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    unpaginated_value = 'all'
+    default_ordering = ('-created_at',)
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.unpaginated = request.query_params.get(self.page_size_query_param) == self.unpaginated_value
+        if self.unpaginated:
+            return list(queryset.order_by(*[
+                f"{'-' if descending else ''}{name}" for name, descending in self.ordering
+            ]))
+
+        self.page_size = self.get_page_size(request)
+        self.fields = [self.resolve_field(queryset, name) for name, _ in self.ordering]
+        cursor = self.decode_cursor(request)
+
+        if cursor is not None:
+            queryset = queryset.filter(self.after(cursor))
+        queryset = queryset.order_by(*[
+            f"{'-' if descending != (cursor is not None and cursor.reverse) else ''}{name}"
+            for name, descending in self.ordering
+        ])
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if cursor is not None and cursor.reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+        self.page = results
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_ordering(self, request, queryset, view):
+        """
+        Return the ordering as [(field name, descending)], ending with the primary key
+        """
+        ordering = None
+        for backend in getattr(view, 'filter_backends', []):
+            if hasattr(backend, 'get_ordering'):
+                ordering = backend().get_ordering(request, queryset, view)
+                if ordering:
+                    break
+        if not ordering:
+            ordering = queryset.query.order_by or self.default_ordering
+
+        parsed = []
+        for field in ordering:
+            name = field.lstrip('-')
+            if name == 'pk':
+                name = queryset.model._meta.pk.name
+            parsed.append((name, field.startswith('-')))
+        pk_name = queryset.model._meta.pk.name
+        if pk_name not in [name for name, _ in parsed]:
+            parsed.append((pk_name, parsed[0][1]))
+        return parsed
+
+    def resolve_field(self, queryset, name):
+        try:
+            return queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return queryset.query.annotations[name].output_field
+
+    def after(self, cursor):
+        """
+        Rows strictly after the cursor position in the (possibly reversed) ordering
+        """
+        condition = Q()
+        for index, (name, descending) in enumerate(self.ordering):
+            lookup = 'lt' if descending != cursor.reverse else 'gt'
+            equal = {self.ordering[earlier][0]: cursor.position[earlier] for earlier in range(index)}
+            condition |= Q(**equal, **{f'{name}__{lookup}': cursor.position[index]})
+        return condition
+
+    def get_rank_window(self, request):
+        """
+        For a queryset ordered by a rank of minus the position (search_rank,
+        see products/search.py): the (start, stop) positions the requested
+        page, in either direction, can come from; None when unpaginated
+        """
+        if request.query_params.get(self.page_size_query_param) == self.unpaginated_value:
+            return None
+        page_size = self.get_page_size(request)
+        position = 0
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded:
+            try:
+                position = -int(json.loads(b64decode(encoded.encode('ascii')).decode('utf-8'))['p'][0])
+            except (TypeError, ValueError, KeyError, IndexError, UnicodeError):
+                return None  # Rejected by decode_cursor()
+        return max(position - page_size - 1, 0), position + page_size + 2
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            data = json.loads(b64decode(encoded.encode('ascii')).decode('utf-8'))
+            values = data['p']
+            if len(values) != len(self.fields):
+                raise ValueError
+            position = [field.to_python(value) for field, value in zip(self.fields, values)]
+            return Cursor(position, bool(data.get('r')))
+        except (TypeError, ValueError, KeyError, UnicodeError, ValidationError):
+            raise exceptions.ValidationError({self.cursor_query_param: [self.invalid_cursor_message]})
+
+    def encode_cursor(self, row, reverse):
+        values = []
+        for name, _ in self.ordering:
+            value = getattr(row, name)
+            if isinstance(value, (datetime, date)):
+                value = value.isoformat()  # Full precision: a truncated timestamp would skip or repeat rows
+            elif isinstance(value, Decimal):
+                value = str(value)
+            values.append(value)
+        data = {'p': values, 'r': 1} if reverse else {'p': values}
+        encoded = b64encode(json.dumps(data, separators=(',', ':')).encode('utf-8')).decode('ascii')
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        if self.unpaginated:
+            return Response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class CategoryPagination(KeysetPagination):
+    default_ordering = ('id',)
+
@@ -0,0 +1,66 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+
+def plan_queryset(queryset, fields):
+    """
+    Restrict a queryset to what the given (bound) serializer fields will read:
+    only() the columns they render and select_related() the relations they
+    render through, so serializing N rows never issues more queries.
+
+    Returns the queryset unchanged if any field reads something that cannot
+    be planned (a method, a property or the whole object).
+    """
+    model = queryset.model
+    columns = {model._meta.pk.name}
+    related = set()
+    for field in fields.values():
+        if field.write_only:
+            continue
+        if field.source == '*':
+            return queryset
+        planned = plan_field(model, field.source_attrs, field)
+        if planned is None:
+            return queryset
+        field_columns, field_related = planned
+        columns.update(field_columns)
+        related.update(field_related)
+    if related:
+        queryset = queryset.select_related(*related)
+    return queryset.only(*columns)
+
+
+def plan_field(model, source_attrs, field):
+    """
+    Return (columns, relations) read by one field, or None if it cannot be planned
+    """
+    try:
+        model_field = model._meta.get_field(source_attrs[0])
+    except FieldDoesNotExist:
+        return None
+    if not model_field.concrete:
+        return None
+    name = source_attrs[0]
+    if not model_field.is_relation:
+        return ({name}, set()) if len(source_attrs) == 1 else None
+    if model_field.many_to_many or model_field.one_to_many:
+        return None
+    if source_attrs[0] == model_field.attname and model_field.attname != model_field.name:
+        # The raw foreign key value (e.g. category_id) needs no join
+        return {model_field.attname}, set()
+
+    related_model = model_field.related_model
+    if isinstance(field, serializers.BaseSerializer):
+        nested_fields = getattr(field, 'child', field).fields
+        nested = [plan_field(related_model, nested.source_attrs, nested)
+                  for nested in nested_fields.values() if not nested.write_only]
+    elif len(source_attrs) > 1:
+        nested = [plan_field(related_model, source_attrs[1:], field)]
+    else:
+        # The related object itself (e.g. rendered by its __str__)
+        return None
+    if any(item is None for item in nested):
+        return None
+    columns = {name} | {f'{name}__{column}' for item in nested for column in item[0]}
+    relations = {name} | {f'{name}__{relation}' for item in nested for relation in item[1]}
+    return columns, relations
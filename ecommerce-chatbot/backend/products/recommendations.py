@@ -0,0 +1,168 @@
+import json
+from itertools import combinations
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from scipy import sparse
+
+MATRIX_FILE = 'cooccurrence.npz'
+STATE_FILE = 'state.json'
+
+
+def get_recommendations_dir():
+    return getattr(settings, 'RECOMMENDATIONS_DIR', settings.BASE_DIR / 'data' / 'recommendations')
+
+
+def get_neighbor_count():
+    return getattr(settings, 'RECOMMENDATION_NEIGHBORS', 20)
+
+
+class CooccurrenceMatrix:
+    """
+    Symmetric sparse matrix of how often two products were seen together,
+    indexed by product id. The diagonal holds how often each product was seen.
+
+    Similarity is the cosine of the co-occurrence counts,
+    counts[i, j] / sqrt(counts[i, i] * counts[j, j]).
+
+    `watermark` records how far the event source has been consumed (the id
+    of the last chat message read), so rebuilds only add new events.
+    """
+
+    def __init__(self, counts=None, watermark=0):
+        self.counts = counts if counts is not None else sparse.csr_matrix((0, 0), dtype=np.float32)
+        self.watermark = watermark
+
+    @classmethod
+    def load(cls, directory=None):
+        """
+        Load the saved matrix, or return an empty one if none was saved yet
+        """
+        directory = directory or get_recommendations_dir()
+        try:
+            with open(directory / STATE_FILE) as state_file:
+                state = json.load(state_file)
+            counts = sparse.load_npz(directory / MATRIX_FILE).tocsr()
+        except FileNotFoundError:
+            return cls()
+        return cls(counts, state['watermark'])
+
+    def save(self, directory=None):
+        directory = directory or get_recommendations_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        sparse.save_npz(directory / MATRIX_FILE, self.counts)
+        # The state file is written last: a crash in between re-reads the same events
+        # on top of the previous matrix instead of skipping any
+        with open(directory / STATE_FILE, 'w') as state_file:
+            json.dump({'watermark': self.watermark}, state_file)
+
+    def add(self, groups):
+        """
+        Add events: each group is (product_ids, weight) and counts every pair of
+        its products, plus each product on the diagonal. Returns the touched ids.
+        """
+        rows, columns, weights = [], [], []
+        for product_ids, weight in groups:
+            product_ids = sorted(set(product_ids))
+            for product_id in product_ids:
+                rows.append(product_id)
+                columns.append(product_id)
+                weights.append(weight)
+            for first, second in combinations(product_ids, 2):
+                rows += [first, second]
+                columns += [second, first]
+                weights += [weight, weight]
+        if not rows:
+            return np.empty(0, dtype=np.int64)
+
+        size = max(self.counts.shape[0], max(rows) + 1)
+        if size > self.counts.shape[0]:
+            self.counts.resize((size, size))
+        delta = sparse.csr_matrix(
+            (np.asarray(weights, dtype=np.float32), (np.asarray(rows), np.asarray(columns))), shape=(size, size)
+        )
+        self.counts = (self.counts + delta).tocsr()
+        return np.unique(rows)
+
+    def affected_rows(self, touched):
+        """
+        Products whose neighbor lists can change when `touched` products changed:
+        the touched products and every product that co-occurs with one of them
+        """
+        if not len(touched):
+            return touched
+        return np.union1d(touched, self.counts[touched].indices)
+
+    def neighbors(self, rows, k):
+        """
+        Yield (product_id, neighbor_ids, scores) with the top-k most similar
+        products of each row, best first
+        """
+        diagonal = self.counts.diagonal()
+        for row in rows:
+            start, end = self.counts.indptr[row], self.counts.indptr[row + 1]
+            columns = self.counts.indices[start:end]
+            values = self.counts.data[start:end]
+            keep = (columns != row) & (values > 0)
+            columns, values = columns[keep], values[keep]
+            if not len(columns):
+                yield int(row), [], []
+                continue
+            scores = values / np.sqrt(diagonal[row] * diagonal[columns])
+            if len(scores) > k:
+                top = np.argpartition(-scores, k - 1)[:k]
+                columns, scores = columns[top], scores[top]
+            order = np.lexsort((columns, -scores))
+            # Rounded as float64: float32 scores would round to values like 0.707099974
+            yield int(row), columns[order].tolist(), np.round(scores[order].astype(np.float64), 4).tolist()
+
+
+def save_neighbors(matrix, rows, k=None):
+    """
+    Write the top-k neighbor lists of the given products to ProductNeighbors,
+    skipping products that no longer exist
+    """
+    from .models import Product, ProductNeighbors
+
+    k = k or get_neighbor_count()
+    rows = [int(row) for row in rows]
+    existing = set()
+    for start in range(0, len(rows), 2000):
+        existing.update(Product.objects.filter(id__in=rows[start:start + 2000]).values_list('id', flat=True))
+
+    updated, emptied = [], []
+    for product_id, neighbor_ids, scores in matrix.neighbors([row for row in rows if row in existing], k):
+        if neighbor_ids:
+            updated.append(ProductNeighbors(product_id=product_id, neighbor_ids=neighbor_ids, scores=scores))
+        else:
+            emptied.append(product_id)
+
+    with transaction.atomic():
+        ProductNeighbors.objects.bulk_create(
+            updated, batch_size=1000,
+            update_conflicts=True, unique_fields=['product'], update_fields=['neighbor_ids', 'scores', 'updated_at'],
+        )
+        ProductNeighbors.objects.filter(product_id__in=emptied).delete()
+    return len(updated)
+
+
+def recommend_product_ids(seed_ids, limit):
+    """
+    Combine the precomputed neighbors of the seed products (one primary key
+    lookup each) into at most `limit` product ids, best first.
+    Products earlier in `seed_ids` count for more.
+    """
+    from .models import ProductNeighbors
+
+    if not seed_ids:
+        return []
+    seeds = list(dict.fromkeys(seed_ids))
+    weights = {product_id: 1.0 / (position + 1) for position, product_id in enumerate(seeds)}
+    totals = {}
+    rows = ProductNeighbors.objects.filter(product_id__in=seeds).values_list('product_id', 'neighbor_ids', 'scores')
+    for product_id, neighbor_ids, scores in rows:
+        for neighbor_id, score in zip(neighbor_ids, scores):
+            if neighbor_id not in weights:
+                totals[neighbor_id] = totals.get(neighbor_id, 0.0) + weights[product_id] * score
+    return sorted(totals, key=lambda product_id: (-totals[product_id], product_id))[:limit]
@@ -0,0 +1,350 @@
+import math
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from . import fulltext
+from .cache import get_reindex_generation
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Ranked ids checked against the other ?search= filters per query
+FILTER_CHUNK_SIZE = 500
+
+
+def normalize_token(token):
+    """
+    Fold simple English plurals so "phones" and "phone" share a posting list
+    """
+    if len(token) > 4 and token.endswith('ies'):
+        return token[:-3] + 'y'
+    if len(token) > 4 and token.endswith(('sses', 'xes', 'ches', 'shes')):
+        return token[:-2]
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    return [normalize_token(token) for token in TOKEN_RE.findall(text.lower())]
+
+
+def in_bulk_ordered(queryset, ids):
+    """
+    Fetch the given ids with a single query and return them in the order given
+    """
+    objects = queryset.in_bulk(ids)
+    return [objects[pk] for pk in ids if pk in objects]
+
+
+class ProductIndex:
+    """
+    In-process inverted index over Product.name and Product.description.
+
+    Queries are ranked with BM25F: term frequencies from each field are
+    weighted and length-normalised before a single saturation step. The index
+    is built at startup when it is the search backend (see products/warmup.py),
+    or from the database on first use, kept current by the Product signals in
+    products/signals.py, and rebuilt when a bulk import requests a reindex. Set PRODUCT_SEARCH_INDEX_TTL (in seconds) to rebuild
+    periodically, so workers that did not see a write eventually catch up.
+    """
+
+    FIELDS = ('name', 'description')
+    FIELD_WEIGHTS = (3.0, 1.0)
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built_at = None
+        self._generation = None
+        self._reset()
+
+    def _reset(self):
+        # term -> {product_id: (name_tf, description_tf)}
+        self._postings = {}
+        # product_id -> (category_id, (name_length, description_length), terms)
+        self._documents = {}
+        self._total_lengths = [0] * len(self.FIELDS)
+
+    @property
+    def is_built(self):
+        return self._built_at is not None
+
+    def build(self):
+        """
+        (Re)build the whole index from the database
+        """
+        from .models import Product
+
+        with self._lock:
+            self._reset()
+            self._generation = get_reindex_generation()
+            rows = Product.objects.values_list('id', 'category_id', *self.FIELDS)
+            for product_id, category_id, *values in rows.iterator(chunk_size=2000):
+                self._add(product_id, category_id, values)
+            self._built_at = time.monotonic()
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+            self._built_at = None
+
+    def _ensure_built(self):
+        ttl = getattr(settings, 'PRODUCT_SEARCH_INDEX_TTL', None)
+        if self._built_at is None or (ttl is not None and time.monotonic() - self._built_at > ttl):
+            self.build()
+        elif get_reindex_generation() != self._generation:
+            self.build()
+
+    def _add(self, product_id, category_id, values):
+        field_terms = [tokenize(value or '') for value in values]
+        frequencies = {}
+        for position, terms in enumerate(field_terms):
+            for term in terms:
+                counts = frequencies.setdefault(term, [0] * len(self.FIELDS))
+                counts[position] += 1
+        for term, counts in frequencies.items():
+            self._postings.setdefault(term, {})[product_id] = tuple(counts)
+        lengths = tuple(len(terms) for terms in field_terms)
+        for position, length in enumerate(lengths):
+            self._total_lengths[position] += length
+        self._documents[product_id] = (category_id, lengths, tuple(frequencies))
+
+    def _remove(self, product_id):
+        document = self._documents.pop(product_id, None)
+        if document is None:
+            return
+        _, lengths, terms = document
+        for position, length in enumerate(lengths):
+            self._total_lengths[position] -= length
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(product_id, None)
+                if not postings:
+                    del self._postings[term]
+
+    def update(self, product):
+        """
+        Re-index a single product; a no-op until the index has been built
+        """
+        with self._lock:
+            if not self.is_built:
+                return
+            self._remove(product.pk)
+            self._add(product.pk, product.category_id, [getattr(product, field) for field in self.FIELDS])
+
+    def remove(self, product_id):
+        with self._lock:
+            if self.is_built:
+                self._remove(product_id)
+
+    def search(self, query, limit=None, offset=0, category_id=None, match_all=False):
+        """
+        Return the ids of the products matching any (or, with match_all, every)
+        term of the query, best match first
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        with self._lock:
+            self._ensure_built()
+            document_count = len(self._documents)
+            if not document_count:
+                return []
+            average_lengths = [max(total / document_count, 1.0) for total in self._total_lengths]
+
+            scores = {}
+            matched_terms = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (document_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for product_id, counts in postings.items():
+                    document_category, lengths, _ = self._documents[product_id]
+                    if category_id is not None and document_category != category_id:
+                        continue
+                    weighted_tf = 0.0
+                    for position, count in enumerate(counts):
+                        if count:
+                            normalization = 1 - self.B + self.B * lengths[position] / average_lengths[position]
+                            weighted_tf += self.FIELD_WEIGHTS[position] * count / normalization
+                    score = idf * weighted_tf / (self.K1 + weighted_tf)
+                    scores[product_id] = scores.get(product_id, 0.0) + score
+                    matched_terms[product_id] = matched_terms.get(product_id, 0) + 1
+
+        if match_all:
+            scores = {product_id: scores[product_id] for product_id in scores if matched_terms[product_id] == len(terms)}
+        # Products matching more of the query terms always rank first
+        ranked = sorted(scores, key=lambda product_id: (-matched_terms[product_id], -scores[product_id], product_id))
+        return ranked[offset:offset + limit] if limit is not None else ranked[offset:]
+
+
+product_index = ProductIndex()
+
+
+def keyword_search(keywords, queryset=None, limit=None, offset=0, category_id=None, match_all=False):
+    """
+    Rank products against several keywords with a single database query;
+    with match_all, products must match every keyword.
+
+    Products are ordered by how many distinct keywords they match, then by
+    where they matched (a name hit outweighs a description hit).
+    """
+    from .models import Product
+
+    keywords = list(dict.fromkeys(keyword.lower() for keyword in keywords if keyword))
+    if queryset is None:
+        queryset = Product.objects.all()
+    if not keywords:
+        return queryset.none()
+    if category_id is not None:
+        queryset = queryset.filter(category_id=category_id)
+
+    any_match = Q()
+    all_match = Q()
+    matched = Value(0)
+    relevance = Value(0)
+    for keyword in keywords:
+        keyword_match = Q(name__icontains=keyword) | Q(description__icontains=keyword)
+        any_match |= keyword_match
+        all_match &= keyword_match
+        matched += Case(When(keyword_match, then=Value(1)), default=Value(0), output_field=IntegerField())
+        relevance += Case(
+            When(name__icontains=keyword, then=Value(2)),
+            When(description__icontains=keyword, then=Value(1)),
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+
+    results = queryset.filter(all_match if match_all else any_match).annotate(
+        matched_keywords=matched, relevance=relevance
+    ).order_by('-matched_keywords', '-relevance', 'id')
+    return results[offset:offset + limit] if limit is not None else results[offset:]
+
+
+class MemorySearchBackend:
+    """
+    Search the in-process ProductIndex (BM25F)
+    """
+
+    def search(self, terms, limit=None, offset=0, category_id=None, match_all=False):
+        return product_index.search(
+            " ".join(terms), limit=limit, offset=offset, category_id=category_id, match_all=match_all
+        )
+
+    def filter_queryset(self, queryset, terms, match_all=False, window=None):
+        """
+        Rank the matches in memory and only hand the database the slice of them
+        a page can come from: window=(start, stop) positions in the ranking.
+        Without a window, the best PRODUCT_SEARCH_MAX_RESULTS matches (default 1000).
+        The products are annotated with search_rank, minus their position.
+        """
+        start, stop = window or (0, getattr(settings, 'PRODUCT_SEARCH_MAX_RESULTS', 1000))
+        product_ids = self.search(terms, match_all=match_all)
+        if product_ids and queryset.query.has_filters():
+            # Rank among the products the other filters (?category__slug=, ?price=) leave:
+            # the database checks the ranking a chunk at a time until the window is filled
+            allowed = []
+            for offset in range(0, len(product_ids), FILTER_CHUNK_SIZE):
+                chunk = product_ids[offset:offset + FILTER_CHUNK_SIZE]
+                kept = set(queryset.filter(id__in=chunk).order_by().values_list('id', flat=True))
+                allowed.extend(product_id for product_id in chunk if product_id in kept)
+                if len(allowed) >= stop:
+                    break
+            product_ids = allowed
+        product_ids = product_ids[start:stop]
+        if not product_ids:
+            return queryset.none()
+        positions = [
+            When(id=product_id, then=Value(-position)) for position, product_id in enumerate(product_ids, start)
+        ]
+        return queryset.filter(id__in=product_ids).annotate(
+            search_rank=Case(*positions, output_field=IntegerField())
+        ).order_by('-search_rank', 'id')
+
+
+class KeywordSearchBackend:
+    """
+    Ranked substring (icontains) matching; works on any database but scans the table
+    """
+
+    def search(self, terms, limit=None, offset=0, category_id=None, match_all=False):
+        results = keyword_search(terms, limit=limit, offset=offset, category_id=category_id, match_all=match_all)
+        return list(results.values_list('id', flat=True))
+
+    def filter_queryset(self, queryset, terms, match_all=False, window=None):
+        return keyword_search(terms, queryset=queryset, match_all=match_all)
+
+
+class FullTextSearchBackend:
+    """
+    Search the database's full-text index (see products/fulltext.py), ranked by relevance
+    """
+
+    def __init__(self, matches, rank):
+        self.matches = matches
+        self.rank = rank
+
+    def filter_queryset(self, queryset, terms, match_all=False, window=None):
+        terms = list(dict.fromkeys(TOKEN_RE.findall(" ".join(terms).lower())))
+        if not terms:
+            return queryset.none()
+        return queryset.filter(self.matches(terms, match_all)).annotate(
+            search_rank=self.rank(terms)
+        ).order_by('-search_rank', 'id')
+
+    def search(self, terms, limit=None, offset=0, category_id=None, match_all=False):
+        from .models import Product
+
+        results = self.filter_queryset(Product.objects.all(), terms, match_all)
+        if category_id is not None:
+            results = results.filter(category_id=category_id)
+        results = results.values_list('id', flat=True)
+        return list(results[offset:offset + limit] if limit is not None else results[offset:])
+
+
+memory_search_backend = MemorySearchBackend()
+keyword_search_backend = KeywordSearchBackend()
+FULLTEXT_BACKENDS = {
+    'sqlite': FullTextSearchBackend(fulltext.sqlite_matches, fulltext.sqlite_rank),
+    'postgresql': FullTextSearchBackend(fulltext.postgresql_matches, fulltext.postgresql_rank),
+}
+
+
+def get_search_backend():
+    """
+    Return the product search backend selected by PRODUCT_SEARCH_BACKEND:
+    'fulltext' (the default: SQLite FTS5 or PostgreSQL tsvector, falling back
+    to 'keyword' on other databases), 'memory' or 'keyword'
+    """
+    name = getattr(settings, 'PRODUCT_SEARCH_BACKEND', 'fulltext')
+    if name == 'memory':
+        return memory_search_backend
+    if name == 'keyword':
+        return keyword_search_backend
+    return FULLTEXT_BACKENDS.get(connection.vendor, keyword_search_backend)
+
+
+def search_product_ids(keywords, limit=None, offset=0, category_id=None):
+    """
+    Return the ids of the products matching any of the keywords, best match first
+    """
+    return get_search_backend().search(keywords, limit=limit, offset=offset, category_id=category_id)
+
+
+def search_products(keywords, limit=None, offset=0, category_id=None):
+    """
+    Return the products matching any of the keywords, best match first
+    """
+    from .models import Product
+
+    product_ids = search_product_ids(keywords, limit=limit, offset=offset, category_id=category_id)
+    return in_bulk_ordered(Product.objects.all(), product_ids)
@@ -0,0 +1,303 @@
+import json
+import logging
+import math
+import os
+import re
+import threading
+import zlib
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to the in-process lock only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+WORD_RE = re.compile(r'[a-z0-9]+')
+
+# Common words that say nothing about a product
+STOP_WORDS = frozenset([
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'can', 'do', 'for', 'from', 'get', 'have', 'i',
+    'in', 'is', 'it', 'me', 'my', 'need', 'of', 'on', 'or', 'some', 'something', 'that', 'the', 'this',
+    'to', 'want', 'with', 'you', 'your',
+])
+
+# Character n-grams catch word variants ("runner" and "running"); whole words weigh more
+NGRAM_SIZES = (3, 4)
+WORD_WEIGHT = 2.0
+NAME_WEIGHT = 2.0
+
+MANIFEST_FILE = 'manifest.json'
+LOCK_FILE = 'lock'
+
+
+def get_semantic_index_dir():
+    return Path(getattr(settings, 'SEMANTIC_INDEX_DIR', settings.BASE_DIR / 'data' / 'semantic'))
+
+
+def text_features(text, weight=1.0):
+    """
+    Yield (feature, weight) for the words and character n-grams of a text
+    """
+    for word in WORD_RE.findall((text or '').lower()):
+        if word in STOP_WORDS:
+            continue
+        yield 'w:' + word, weight * WORD_WEIGHT
+        marked = f'<{word}>'
+        for size in NGRAM_SIZES:
+            for start in range(len(marked) - size + 1):
+                yield 'c:' + marked[start:start + size], weight
+
+
+def hashed_counts(features, dimensions):
+    """
+    Sum feature weights into hashed buckets (with a sign bit to offset collisions)
+    """
+    counts = {}
+    for feature, weight in features:
+        hashed = zlib.crc32(feature.encode('utf-8'))
+        bucket = hashed % dimensions
+        counts[bucket] = counts.get(bucket, 0.0) + (weight if hashed & 0x80000000 else -weight)
+    return counts
+
+
+def product_features(name, description):
+    yield from text_features(name, NAME_WEIGHT)
+    yield from text_features(description)
+
+
+class SemanticIndex:
+    """
+    Hashed n-gram TF-IDF vectors of every product, for retrieval by meaning
+    rather than exact keywords ("gift for a runner" finds running shoes).
+
+    Each product is a row of an L2-normalized float32 matrix with
+    SEMANTIC_INDEX_DIMENSIONS columns; a query is one matrix-vector product
+    followed by an argpartition top-k. The matrix, the row -> product id
+    array and the IDF weights are saved as .npy files in SEMANTIC_INDEX_DIR
+    and memory-mapped, so all worker processes share the same pages.
+
+    The index is only ever built by the build_semantic_index command (and
+    after bulk imports), never while serving a request: until it exists,
+    search() finds nothing. Rows are updated in place by the Product signals
+    (a file lock serializes writers); once the spare rows run out, new
+    products are left out until the command rebuilds the files under a new
+    generation number. IDF weights are fixed at build time.
+    """
+
+    def __init__(self, directory=None):
+        self._directory = directory
+        self._lock = threading.RLock()
+        self._manifest_mtime = None
+        self._generation = None
+        self.vectors = None
+        self.product_ids = None
+        self.idf = None
+
+    @property
+    def directory(self):
+        return self._directory or get_semantic_index_dir()
+
+    @property
+    def dimensions(self):
+        return getattr(settings, 'SEMANTIC_INDEX_DIMENSIONS', 1024)
+
+    def _path(self, name, generation):
+        return self.directory / f'{name}-{generation}.npy'
+
+    def _file_lock(self):
+        return _FileLock(self.directory / LOCK_FILE)
+
+    def _read_manifest(self):
+        try:
+            with open(self.directory / MANIFEST_FILE) as manifest_file:
+                return json.load(manifest_file), os.stat(self.directory / MANIFEST_FILE).st_mtime_ns
+        except FileNotFoundError:
+            return None, None
+
+    def exists(self):
+        return (self.directory / MANIFEST_FILE).exists()
+
+    def _open(self):
+        """
+        Map the current generation of the index files, if they changed since last time
+        """
+        manifest, mtime = self._read_manifest()
+        if manifest is None:
+            return False
+        if mtime != self._manifest_mtime or manifest['generation'] != self._generation:
+            generation = manifest['generation']
+            self.vectors = np.load(self._path('vectors', generation), mmap_mode='r+')
+            self.product_ids = np.load(self._path('ids', generation), mmap_mode='r+')
+            self.idf = np.load(self._path('idf', generation))
+            self._generation = generation
+            self._manifest_mtime = mtime
+        return True
+
+    def build(self, spare_rows=None):
+        """
+        (Re)build the index from the database and write a new generation of files.
+        Products are read twice (document frequencies, then vectors) rather
+        than held in memory; the vectors are written straight to the mapped file.
+        """
+        from .models import Product
+
+        def documents():
+            products = Product.objects.order_by('id').values_list('id', 'name', 'description')
+            for product_id, name, description in products.iterator(chunk_size=2000):
+                yield product_id, hashed_counts(product_features(name, description), dimensions)
+
+        dimensions = self.dimensions
+        document_frequencies = np.zeros(dimensions, dtype=np.float32)
+        count = 0
+        for _, counts in documents():
+            document_frequencies[list(counts)] += 1
+            count += 1
+        idf = np.log((1 + count) / (1 + document_frequencies)).astype(np.float32) + 1
+
+        if spare_rows is None:
+            spare_rows = max(64, count // 4)
+        capacity = count + spare_rows
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with self._lock, self._file_lock():
+            previous, _ = self._read_manifest()
+            generation = previous['generation'] + 1 if previous else 1
+            vectors = np.lib.format.open_memmap(
+                self._path('vectors', generation), mode='w+', dtype=np.float32, shape=(capacity, dimensions)
+            )
+            product_ids = np.lib.format.open_memmap(
+                self._path('ids', generation), mode='w+', dtype=np.int64, shape=(capacity,)
+            )
+            for row, (product_id, counts) in enumerate(documents()):
+                if row == capacity:
+                    break  # Created since the first pass; picked up by the next build
+                vectors[row] = self._weigh(counts, idf)
+                product_ids[row] = product_id
+            vectors.flush()
+            product_ids.flush()
+            del vectors, product_ids
+            np.save(self._path('idf', generation), idf)
+
+            manifest_path = self.directory / MANIFEST_FILE
+            with open(f'{manifest_path}.tmp', 'w') as manifest_file:
+                json.dump({'generation': generation, 'dimensions': dimensions, 'capacity': capacity}, manifest_file)
+            os.replace(f'{manifest_path}.tmp', manifest_path)
+
+            if previous:
+                for name in ('vectors', 'ids', 'idf'):
+                    # Workers that still map the old files keep them alive until they reopen
+                    self._path(name, previous['generation']).unlink(missing_ok=True)
+            self._open()
+
+    def _weigh(self, counts, idf):
+        """
+        Dense TF-IDF vector, L2-normalized, from hashed term counts
+        """
+        vector = np.zeros(len(idf), dtype=np.float32)
+        for bucket, count in counts.items():
+            vector[bucket] = math.copysign(1 + math.log(abs(count)), count) * idf[bucket] if count else 0.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def vectorize(self, text):
+        """
+        The query vector of a text, or None until the index has been built
+        """
+        with self._lock:
+            if not self._open():
+                return None
+            return self._weigh(hashed_counts(text_features(text), len(self.idf)), self.idf)
+
+    def update(self, product):
+        """
+        Re-index a single product in place; a no-op until the index has been
+        built. Runs inside the caller's save, so it never rebuilds the index:
+        without a spare row, the product waits for the next build.
+        """
+        with self._lock:
+            if not self.exists():
+                return
+            with self._file_lock():
+                self._open()
+                vector = self._weigh(
+                    hashed_counts(product_features(product.name, product.description), len(self.idf)), self.idf
+                )
+                rows = np.flatnonzero(self.product_ids == product.pk)
+                if not len(rows):
+                    rows = np.flatnonzero(self.product_ids == 0)[:1]
+                if not len(rows):
+                    logger.warning(
+                        "The semantic index is full; product %s is left out until "
+                        "`manage.py build_semantic_index` rebuilds it", product.pk,
+                    )
+                    return
+                self.vectors[rows[0]] = vector
+                self.product_ids[rows[0]] = product.pk
+                self.vectors.flush()
+                self.product_ids.flush()
+
+    def remove(self, product_id):
+        with self._lock:
+            if not self.exists():
+                return
+            with self._file_lock():
+                self._open()
+                for row in np.flatnonzero(self.product_ids == product_id):
+                    self.vectors[row] = 0
+                    self.product_ids[row] = 0
+                self.vectors.flush()
+                self.product_ids.flush()
+
+    def search(self, query, limit=5, min_score=None):
+        """
+        Return the ids of the products closest in meaning to the query, best
+        first; nothing until the index has been built
+        """
+        if min_score is None:
+            min_score = getattr(settings, 'SEMANTIC_SEARCH_MIN_SCORE', 0.15)
+        with self._lock:
+            if not self._open():
+                return []
+            query_vector = self._weigh(hashed_counts(text_features(query), len(self.idf)), self.idf)
+            if not query_vector.any():
+                return []
+            scores = self.vectors @ query_vector
+            if len(scores) > limit:
+                top = np.argpartition(-scores, limit - 1)[:limit]
+            else:
+                top = np.arange(len(scores))
+            top = top[np.argsort(-scores[top], kind='stable')]
+            return [
+                int(self.product_ids[row]) for row in top
+                if scores[row] >= min_score and self.product_ids[row]
+            ]
+
+
+class _FileLock:
+    """
+    Exclusive lock on a file, shared by every process using the index directory
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'a')
+        if fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        if fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
+
+
+semantic_index = SemanticIndex()
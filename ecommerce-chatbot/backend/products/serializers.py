@@ -1,15 +1,49 @@
 from rest_framework import serializers
 from .models import Product, Category
+from .cache import category_cache
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ['id', 'name', 'slug']
 
+class CachedCategoryField(serializers.Field):
+    """
+    Renders a product's category from the category cache instead of loading
+    the related row; the output matches CategorySerializer
+    """
+    def __init__(self, **kwargs):
+        kwargs.setdefault('source', 'category_id')
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return category_cache.get(value)
+
 class ProductSerializer(serializers.ModelSerializer):
-    category = CategorySerializer(read_only=True)
+    """
+    Pass `fields` and/or `omit` (lists of field names) to render a subset of
+    the readable fields; write-only fields are always kept
+    """
+    category = CachedCategoryField()
     category_id = serializers.IntegerField(write_only=True)
     
+    # The fields product grids and chat cards render
+    COMPACT_FIELDS = ['id', 'name', 'slug', 'price', 'image_url', 'stock']
+    
+    def __init__(self, *args, fields=None, omit=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is None and not omit:
+            return
+        readable = [name for name, field in self.fields.items() if not field.write_only]
+        unknown = [name for name in [*(fields or []), *(omit or [])] if name not in readable]
+        if unknown:
+            raise serializers.ValidationError({'fields': f"Unknown field(s): {', '.join(unknown)}"})
+        keep = set(readable if fields is None else fields) - set(omit or [])
+        for name in readable:
+            if name not in keep:
+                self.fields.pop(name)
+    
     class Meta:
         model = Product
         fields = ['id', 'name', 'slug', 'description', 'price', 'category', 
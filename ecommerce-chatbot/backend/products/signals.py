@@ -0,0 +1,60 @@
+from django.db import connections
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Product, Category
+from .search import product_index
+from .fuzzy import product_vocabulary
+from .semantic import semantic_index
+from .cache import category_cache
+from .fulltext import install_fulltext
+from .catalog import install_catalog_triggers
+
+# The migration that creates the full-text index
+FULLTEXT_MIGRATION = '0003_product_fulltext'
+# The migration that creates the catalog state row and its triggers
+CATALOG_MIGRATION = '0005_catalogstate'
+# The migration that adds the category version to them
+CATEGORY_VERSION_MIGRATION = '0006_catalogstate_category_version'
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    product_index.update(instance)
+    product_vocabulary.update(instance)
+    semantic_index.update(instance)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    product_index.remove(instance.pk)
+    product_vocabulary.remove(instance.pk)
+    semantic_index.remove(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_cache(sender, **kwargs):
+    category_cache.invalidate()
+
+
+def restore_fulltext_index(sender, using, **kwargs):
+    """
+    Recreate the full-text index after migrations: SQLite rebuilds products_product
+    when a migration alters it, which drops the FTS triggers
+    """
+    connection = connections[using]
+    if ('products', FULLTEXT_MIGRATION) in MigrationRecorder(connection).applied_migrations():
+        install_fulltext(connection)
+
+
+def restore_catalog_triggers(sender, using, **kwargs):
+    """
+    Recreate the catalog version triggers after migrations, which drop them
+    the same way as the FTS triggers
+    """
+    connection = connections[using]
+    applied = MigrationRecorder(connection).applied_migrations()
+    if ('products', CATALOG_MIGRATION) in applied:
+        install_catalog_triggers(connection, ('products', CATEGORY_VERSION_MIGRATION) in applied)
@@ -1,3 +1,1060 @@
-from django.test import TestCase
+import io
+import itertools
+import os
+import random
+import tempfile
+from decimal import Decimal
+from pathlib import Path
 
-# Create your tests here.
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.http import http_date
+
+from ecommerce_backend.testing import QueryPlanAssertionsMixin, QueryCountAssertionsMixin, TemporarySemanticIndexMixin
+from .cache import catalog_request, category_cache, get_catalog_version, get_catalog_modified
+from .fragments import FragmentCache, product_fragments
+from .fuzzy import TrigramIndex, bounded_levenshtein, correct_words, product_vocabulary
+from .models import CatalogState, Category, Product, ProductNeighbors
+from .recommendations import CooccurrenceMatrix, recommend_product_ids, save_neighbors
+from .search import in_bulk_ordered, product_index
+from .semantic import semantic_index
+from .serializers import ProductSerializer
+from .views import ProductViewSet
+from .warmup import warm_indexes
+
+
+class ProductQueryPlanTests(QueryPlanAssertionsMixin, TestCase):
+    """
+    The hot product queries must stay index lookups as the catalog grows
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Phones')
+        other = Category.objects.create(name='Laptops')
+        Product.objects.bulk_create([
+            Product(
+                name=f"Product {number}",
+                slug=f"product-{number}",
+                description="A product",
+                price=Decimal(number * 10),
+                category=cls.category if number % 2 else other,
+                image_url='https://example.com/product.png',
+                stock=number,
+            )
+            for number in range(20)
+        ])
+
+    def test_newest_products(self):
+        self.assertUsesIndex(Product.objects.order_by('-created_at')[:5])
+
+    def test_newest_products_in_category(self):
+        self.assertUsesIndex(Product.objects.filter(category=self.category).order_by('-created_at')[:5])
+
+    def test_products_in_price_range(self):
+        self.assertUsesIndex(Product.objects.filter(price__gte=50, price__lte=150))
+
+    def test_products_by_price(self):
+        self.assertUsesIndex(Product.objects.order_by('price'))
+
+
+class ProductEndpointQueryCountTests(QueryCountAssertionsMixin, TestCase):
+    """
+    Serializing more products must not cost more queries
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        categories = [Category.objects.create(name=name) for name in ('Phones', 'Laptops', 'Books')]
+        Product.objects.bulk_create([
+            Product(
+                name=f"Gadget {number}",
+                slug=f"gadget-{number}",
+                description="A gadget",
+                price=Decimal(number),
+                category=categories[number % len(categories)],
+                image_url='https://example.com/gadget.png',
+                stock=number,
+            )
+            for number in range(30)
+        ])
+
+    # Listings read the catalog state row (for the ETag), then the page
+
+    def test_list(self):
+        self.assertQueryCountConstant(lambda size: f'/api/products/?page_size={size}', [1, 10, 25], 2)
+
+    def test_list_ordered_next_page(self):
+        first_page = self.client.get('/api/products/?page_size=5&ordering=price').json()
+        self.assertQueryCountConstant(lambda size: f"{first_page['next']}&page_size={size}", [1, 10, 25], 2)
+
+    def test_search(self):
+        self.assertQueryCountConstant(lambda size: f'/api/products/search/?q=gadget&limit={size}', [1, 10, 25], 3)
+
+    def test_recommended(self):
+        self.client.get('/api/products/recommended/')
+        with self.assertNumQueries(2):
+            self.client.get('/api/products/recommended/')
+
+
+class ProductValuesSerializerTests(TestCase):
+    """
+    The values() fast path must render exactly the bytes ProductSerializer does
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        categories = [Category.objects.create(name=name) for name in ('Phones', 'Laptops')]
+        Product.objects.bulk_create([
+            Product(
+                name=f"Widget {number} \u00e9t\u00e9",
+                slug=f"widget-{number}",
+                description="A widget\nwith \"quotes\"",
+                price=Decimal(number) / 3 if number % 2 else Decimal(number * 100),
+                category=categories[number % len(categories)],
+                image_url='https://example.com/widget.png',
+                stock=number,
+            )
+            for number in range(12)
+        ])
+
+    def assertSameAsSerializer(self, url):
+        fast = self.client.get(url)
+        with mock.patch.object(ProductViewSet, 'use_values_serializer', False):
+            slow = self.client.get(url)
+        self.assertEqual(fast.status_code, 200)
+        self.assertEqual(fast.content, slow.content)
+
+    def test_list(self):
+        for url in [
+            '/api/products/',
+            '/api/products/?page_size=all',
+            '/api/products/?page_size=5&ordering=-price',
+            '/api/products/?category__slug=phones&ordering=name',
+            '/api/products/?search=widget',
+        ]:
+            with self.subTest(url=url):
+                self.assertSameAsSerializer(url)
+
+    def test_next_page(self):
+        next_page = self.client.get('/api/products/?page_size=5&ordering=price').json()['next']
+        self.assertSameAsSerializer(next_page)
+
+    def test_search(self):
+        self.assertSameAsSerializer('/api/products/search/?q=widget&limit=7')
+
+    def test_recommended(self):
+        self.assertSameAsSerializer('/api/products/recommended/')
+
+
+class CatalogConditionalGetTests(TestCase):
+    """
+    Unchanged catalog responses are answered with 304 after reading only the catalog state
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Phones')
+        Product.objects.create(
+            name='Phone', description='A phone', price=Decimal('10.00'), category=cls.category,
+            image_url='https://example.com/phone.png', stock=1,
+        )
+
+    def test_not_modified(self):
+        for url in ['/api/products/', '/api/products/phone/', '/api/products/?page_size=all', '/api/categories/?page_size=all']:
+            with self.subTest(url=url), self.after_last_write():
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                with self.assertNumQueries(1):
+                    not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(not_modified.status_code, 304)
+                self.assertEqual(not_modified['ETag'], response['ETag'])
+                not_modified = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+                self.assertEqual(not_modified.status_code, 304)
+
+    def after_last_write(self, seconds=1):
+        return mock.patch('products.conditional.time.time', return_value=get_catalog_modified() + seconds)
+
+    def test_no_last_modified_within_the_second_of_the_last_write(self):
+        # A second write in that second would keep the same Last-Modified
+        with self.after_last_write(0):
+            response = self.client.get('/api/products/')
+            self.assertNotIn('Last-Modified', response)
+            stale = self.client.get('/api/products/', HTTP_IF_MODIFIED_SINCE=http_date(get_catalog_modified() + 1))
+            self.assertEqual(stale.status_code, 200)
+            self.assertEqual(self.client.get('/api/products/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_etag_decides_over_if_modified_since(self):
+        with self.after_last_write():
+            etag = self.client.get('/api/products/')['ETag']
+            Product.objects.get(slug='phone').save()
+            response = self.client.get(
+                '/api/products/', HTTP_IF_NONE_MATCH=etag, HTTP_IF_MODIFIED_SINCE=http_date(get_catalog_modified() + 60),
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_varies_by_url(self):
+        etag = self.client.get('/api/products/')['ETag']
+        self.assertEqual(self.client.get('/api/products/?ordering=price', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_write_changes_etag(self):
+        for url, write in [
+            ('/api/products/', lambda: Product.objects.get(slug='phone').save()),
+            ('/api/categories/', lambda: Category.objects.create(name='Laptops')),
+        ]:
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                write()
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+
+    def test_bulk_write_changes_etag(self):
+        # Bulk writes send no signals; the database triggers still bump the version
+        for write in [
+            lambda: Product.objects.update(stock=5),
+            lambda: Category.objects.update(name='Mobiles'),
+            lambda: Product.objects.bulk_create([Product(
+                name='Tablet', slug='tablet', description='A tablet', price=Decimal('20.00'),
+                category=self.category, image_url='https://example.com/tablet.png',
+            )]),
+            lambda: connection.cursor().execute("DELETE FROM products_product WHERE slug = 'tablet'"),
+        ]:
+            etag = self.client.get('/api/products/')['ETag']
+            modified = get_catalog_modified()
+            write()
+            response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+            self.assertGreaterEqual(get_catalog_modified(), modified)
+
+    def test_version_is_stored_in_the_database(self):
+        # What another worker process sees: nothing but the database
+        state = CatalogState.objects.get()
+        Product.objects.get(slug='phone').save()
+        self.assertGreater(CatalogState.objects.get().version, state.version)
+        self.assertEqual(get_catalog_version(), CatalogState.objects.get().version)
+        # Only category writes bump the category version
+        self.assertEqual(CatalogState.objects.get().category_version, state.category_version)
+        Category.objects.update(name='Mobiles')
+        self.assertGreater(CatalogState.objects.get().category_version, state.category_version)
+
+
+class KeysetPaginationTests(TestCase):
+    """
+    Cursor pages cover every product exactly once, in both directions, for
+    every ordering, and ?page_size=all returns the same order unpaginated
+    """
+
+    ORDERINGS = ['', 'price', '-price', 'name', 'created_at', '-created_at,name']
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Phones')
+        Product.objects.bulk_create([
+            Product(
+                name=f"Phone {number % 5}",
+                slug=f"phone-{number}",
+                description="A phone",
+                price=Decimal(number % 3),
+                category=category,
+                image_url='https://example.com/phone.png',
+                stock=number,
+            )
+            for number in range(13)
+        ])
+        # Ties on every ordering field: only the id tie-break orders them
+        Product.objects.update(created_at=Product.objects.first().created_at)
+
+    def url(self, ordering, page_size):
+        return f'/api/products/?page_size={page_size}' + (f'&ordering={ordering}' if ordering else '')
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def slugs(self, page):
+        return [product['slug'] for product in page['results']]
+
+    def test_pages_cover_every_product_once(self):
+        for ordering in self.ORDERINGS:
+            with self.subTest(ordering=ordering):
+                slugs, page = [], self.get(self.url(ordering, 4))
+                self.assertIsNone(page['previous'])
+                while True:
+                    slugs += self.slugs(page)
+                    if not page['next']:
+                        break
+                    page = self.get(page['next'])
+                self.assertEqual(len(slugs), 13)
+                self.assertEqual(set(slugs), set(Product.objects.values_list('slug', flat=True)))
+                unpaginated = self.get(self.url(ordering, 'all'))
+                self.assertEqual([product['slug'] for product in unpaginated], slugs)
+
+    def test_previous_links(self):
+        for ordering in self.ORDERINGS:
+            with self.subTest(ordering=ordering):
+                pages = [self.get(self.url(ordering, 5))]
+                while pages[-1]['next']:
+                    pages.append(self.get(pages[-1]['next']))
+                self.assertEqual([len(page['results']) for page in pages], [5, 5, 3])
+                for earlier, later in zip(pages, pages[1:]):
+                    self.assertEqual(self.slugs(self.get(later['previous'])), self.slugs(earlier))
+                self.assertIsNotNone(self.get(pages[1]['previous'])['next'])
+                self.assertIsNone(self.get(pages[1]['previous'])['previous'])
+
+    def test_invalid_cursor(self):
+        for cursor in ['garbage', 'bm90IGpzb24=', 'eyJwIjpbMV19', 'eyJwIjpbIngiLCAxXX0=', 'eyJwIjogMX0=']:
+            with self.subTest(cursor=cursor):
+                response = self.client.get(f'/api/products/?ordering=price&cursor={cursor}')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('cursor', response.json())
+
+    def test_unknown_ordering(self):
+        for ordering in ['secret', 'price,secret', '-description']:
+            with self.subTest(ordering=ordering):
+                response = self.client.get(f'/api/products/?ordering={ordering}')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('ordering', response.json())
+        self.assertEqual(self.client.get('/api/products/?ordering=-price,name').status_code, 200)
+
+    def test_categories(self):
+        Category.objects.create(name='Laptops')
+        # Paginated by default, in id order
+        first = self.get('/api/categories/?page_size=1')
+        self.assertEqual([category['name'] for category in first['results']], ['Phones'])
+        second = self.get(first['next'])
+        self.assertEqual([category['name'] for category in second['results']], ['Laptops'])
+        self.assertIsNone(second['next'])
+        self.assertEqual([category['name'] for category in self.get('/api/categories/')['results']], ['Phones', 'Laptops'])
+        # The whole list is an explicit opt-in
+        for url, names in [
+            ('/api/categories/?page_size=all', ['Phones', 'Laptops']),
+            ('/api/categories/?ordering=name&page_size=all', ['Laptops', 'Phones']),
+        ]:
+            with self.subTest(url=url):
+                self.assertEqual([category['name'] for category in self.get(url)], names)
+
+
+class CategoryCacheTests(TestCase):
+    """
+    Categories are read from the database once per change, not once per request
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.phones = Category.objects.create(name='Phones')
+        cls.laptops = Category.objects.create(name='Laptops')
+
+    def setUp(self):
+        category_cache.invalidate()
+
+    def test_loaded_once(self):
+        with self.assertNumQueries(1):
+            category_cache.all()
+        with self.assertNumQueries(0):
+            self.assertEqual(category_cache.get(self.phones.id), {'id': self.phones.id, 'name': 'Phones', 'slug': 'phones'})
+            self.assertEqual(category_cache.id_for_name('Phones'), self.phones.id)
+            self.assertEqual(category_cache.id_for_slug('laptops'), self.laptops.id)
+            self.assertIsNone(category_cache.id_for_name('Books'))
+            self.assertEqual([category['name'] for category in category_cache.all()], ['Phones', 'Laptops'])
+
+    def test_copies_are_returned(self):
+        category_cache.get(self.phones.id)['name'] = 'Changed'
+        category_cache.all()[0]['name'] = 'Changed'
+        self.assertEqual(category_cache.get(self.phones.id)['name'], 'Phones')
+
+    def test_writes_invalidate(self):
+        version = category_cache.version
+        category_cache.all()
+        books = Category.objects.create(name='Books')
+        self.assertEqual(category_cache.id_for_name('Books'), books.id)
+        self.phones.name = 'Mobiles'
+        self.phones.save()
+        self.assertEqual(category_cache.get(self.phones.id)['name'], 'Mobiles')
+        books.delete()
+        self.assertIsNone(category_cache.id_for_slug('books'))
+        self.assertGreater(category_cache.version, version)
+
+    def test_unknown_id_reloads(self):
+        category_cache.all()
+        # Created without signals, as by another process
+        Category.objects.bulk_create([Category(name='Garden', slug='garden')])
+        garden = Category.objects.get(slug='garden')
+        self.assertEqual(category_cache.get(garden.id)['name'], 'Garden')
+        with self.assertNumQueries(1):
+            self.assertIsNone(category_cache.get(999))
+
+    @override_settings(CATEGORY_CACHE_TTL=0)
+    def test_ttl(self):
+        category_cache.all()
+        Category.objects.filter(pk=self.phones.pk).update(name='Mobiles')
+        self.assertEqual(category_cache.get(self.phones.id)['name'], 'Mobiles')
+
+    def test_category_list(self):
+        self.client.get('/api/categories/?page_size=all')
+        # Only the catalog state is read, for the ETag
+        with self.assertNumQueries(1):
+            categories = self.client.get('/api/categories/?page_size=all').json()
+        self.assertEqual([category['slug'] for category in categories], ['phones', 'laptops'])
+
+
+class ProductFragmentCacheTests(TestCase):
+    """
+    Warm listings are one narrow id query; a product write renders that
+    product again, a category write every product
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Phones')
+        Product.objects.bulk_create([
+            Product(
+                name=f"Phone {number}", slug=f"phone-{number}", description="A phone", price=Decimal(number),
+                category=category, image_url='https://example.com/phone.png', stock=number,
+            )
+            for number in range(10)
+        ])
+
+    def setUp(self):
+        product_fragments.clear()
+
+    def test_warm_list_is_one_query(self):
+        # Plus the catalog state read of the conditional GET
+        with self.assertNumQueries(3):
+            cold = self.client.get('/api/products/?page_size=5')
+        with self.assertNumQueries(2):
+            warm = self.client.get('/api/products/?page_size=5')
+        self.assertEqual(cold.content, warm.content)
+
+    def test_changed_product_is_rendered_again(self):
+        self.client.get('/api/products/?page_size=all')
+        product = Product.objects.get(slug='phone-3')
+        product.stock = 99
+        product.save()
+        misses = product_fragments.misses
+        products = self.client.get('/api/products/?page_size=all').json()
+        # The other products' fragments stay cached
+        self.assertEqual(product_fragments.misses, misses + 1)
+        self.assertEqual({item['slug']: item['stock'] for item in products}['phone-3'], 99)
+        self.assertEqual(self.client.get('/api/products/?page_size=all').json(), products)
+        self.assertEqual(product_fragments.misses, misses + 1)
+
+    def test_bulk_update_is_rendered(self):
+        # QuerySet.update() sends no signals; the database moves updated_at
+        self.client.get('/api/products/?page_size=all')
+        updated_at = Product.objects.get(slug='phone-3').updated_at
+        Product.objects.filter(slug='phone-3').update(stock=99)
+        self.assertGreater(Product.objects.get(slug='phone-3').updated_at, updated_at)
+        misses = product_fragments.misses
+        products = self.client.get('/api/products/?page_size=all').json()
+        self.assertEqual({item['slug']: item['stock'] for item in products}['phone-3'], 99)
+        self.assertEqual(product_fragments.misses, misses + 1)
+
+    def test_category_renamed_by_another_process_is_rendered(self):
+        self.client.get('/api/products/?page_size=all')
+        # No signal reaches this process's category cache
+        Category.objects.update(name='Mobiles')
+        products = self.client.get('/api/products/?page_size=all').json()
+        self.assertEqual({item['category']['name'] for item in products}, {'Mobiles'})
+
+    def test_category_change_is_rendered(self):
+        self.client.get('/api/products/?page_size=all')
+        category = Category.objects.get()
+        category.name = 'Mobiles'
+        category.save()
+        products = self.client.get('/api/products/?page_size=all').json()
+        self.assertEqual({item['category']['name'] for item in products}, {'Mobiles'})
+
+    def test_lru_eviction(self):
+        cache = FragmentCache(max_size=2)
+        cache.set_many({'a': {}, 'b': {}})
+        cache.get_many(['a'])
+        cache.set_many({'c': {}})
+        self.assertEqual(set(cache.get_many(['a', 'b', 'c'])), {'a', 'c'})
+
+
+class ProductSparseFieldsetTests(TestCase):
+    """
+    ?fields=, ?omit= and ?view=compact trim both the output and the columns read
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Phones')
+        Product.objects.create(
+            name='Phone', description='A very long description ' * 20, price=Decimal('10.00'),
+            category=category, image_url='https://example.com/phone.png', stock=1,
+        )
+
+    def test_compact(self):
+        with CaptureQueriesContext(connection) as queries:
+            products = self.client.get('/api/products/?view=compact').json()['results']
+        self.assertEqual(list(products[0]), ProductSerializer.COMPACT_FIELDS)
+        self.assertTrue(all('description' not in query['sql'] for query in queries))
+        self.assertEqual(list(self.client.get('/api/products/phone/?view=compact').json()), ProductSerializer.COMPACT_FIELDS)
+
+    def test_fields_and_omit(self):
+        product = self.client.get('/api/products/?fields=name,price,stock&omit=stock').json()['results'][0]
+        self.assertEqual(product, {'name': 'Phone', 'price': '10.00'})
+        product = self.client.get('/api/products/search/?q=phone&omit=description,category').json()[0]
+        self.assertNotIn('description', product)
+        self.assertIn('updated_at', product)
+
+    def test_unknown_field(self):
+        self.assertEqual(self.client.get('/api/products/?fields=name,secret').status_code, 400)
+        self.assertEqual(self.client.get('/api/products/?omit=category_id').status_code, 400)
+
+    def test_same_as_serializer(self):
+        for url in ['/api/products/?view=compact', '/api/products/?omit=description&ordering=price']:
+            with self.subTest(url=url):
+                fast = self.client.get(url)
+                with mock.patch.object(ProductViewSet, 'use_values_serializer', False):
+                    slow = self.client.get(url)
+                self.assertEqual(fast.content, slow.content)
+
+
+class ProductSearchFilterTests(TestCase):
+    """
+    ?search= keeps SearchFilter's semantics (every term must match) on each
+    backend; the memory backend pages through its ranking without gaps
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        phones = Category.objects.create(name='Phones')
+        lamps = Category.objects.create(name='Lamps')
+        Product.objects.bulk_create([
+            Product(
+                name=f"{'Red' if number % 3 else 'Blue'} Phone {number}",
+                slug=f"phone-{number}",
+                description="phone " * (number % 4 + 1),
+                price=Decimal(number),
+                category=phones if number % 2 else lamps,
+                image_url='https://example.com/phone.png',
+                stock=number,
+            )
+            for number in range(15)
+        ])
+        Product.objects.create(
+            name='Red Lamp', slug='red-lamp', description='A lamp', price=Decimal('5.00'), category=lamps,
+            image_url='https://example.com/lamp.png', stock=1,
+        )
+
+    def setUp(self):
+        product_index.build()
+
+    def names(self, url):
+        data = self.client.get(url).json()
+        products = data if isinstance(data, list) else data['results']
+        return [product['name'] for product in products]
+
+    def ranked(self, query):
+        return in_bulk_ordered(Product.objects.all(), product_index.search(query))
+
+    def pages(self, url):
+        """
+        The names on each page, following the next links
+        """
+        pages = []
+        while url:
+            data = self.client.get(url).json()
+            pages.append([product['name'] for product in data['results']])
+            url = data['next']
+        return pages
+
+    def test_every_term_must_match(self):
+        red_phones = sorted(Product.objects.filter(name__startswith='Red Phone').values_list('name', flat=True))
+        for backend in ('memory', 'keyword', 'fulltext'):
+            with self.subTest(backend=backend), override_settings(PRODUCT_SEARCH_BACKEND=backend):
+                self.assertEqual(sorted(self.names('/api/products/?search=red phone&page_size=all')), red_phones)
+                self.assertEqual(self.names('/api/products/?search=red lamp'), ['Red Lamp'])
+                self.assertEqual(self.names('/api/products/?search=red kettle'), [])
+
+    @override_settings(PRODUCT_SEARCH_BACKEND='memory')
+    def test_memory_pages_follow_the_ranking(self):
+        ranked_names = [product.name for product in self.ranked('phone')]
+        self.assertEqual(len(ranked_names), 15)
+        pages = self.pages('/api/products/?search=phone&page_size=4')
+        self.assertEqual([len(page) for page in pages], [4, 4, 4, 3])
+        self.assertEqual(sum(pages, []), ranked_names)
+        self.assertEqual(self.names('/api/products/?search=phone&page_size=all'), ranked_names)
+
+    @override_settings(PRODUCT_SEARCH_BACKEND='memory')
+    def test_memory_previous_page(self):
+        first = self.client.get('/api/products/?search=phone&page_size=4').json()
+        second = self.client.get(first['next']).json()
+        third = self.client.get(second['next']).json()
+        self.assertEqual(self.client.get(third['previous']).json()['results'], second['results'])
+        self.assertEqual(self.client.get(second['previous']).json()['results'], first['results'])
+
+    @override_settings(PRODUCT_SEARCH_BACKEND='memory')
+    def test_memory_ranks_among_filtered_products(self):
+        ranked_names = [product.name for product in self.ranked('phone') if product.category.slug == 'phones']
+        pages = self.pages('/api/products/?search=phone&category__slug=phones&page_size=3')
+        self.assertEqual(sum(pages, []), ranked_names)
+
+    @override_settings(PRODUCT_SEARCH_BACKEND='memory')
+    def test_memory_filters_check_the_ranking_in_chunks(self):
+        ranked_ids = [product.id for product in self.ranked('phone') if product.category.slug == 'phones']
+        with mock.patch('products.search.FILTER_CHUNK_SIZE', 2), CaptureQueriesContext(connection) as queries:
+            data = self.client.get('/api/products/?search=phone&category__slug=phones&page_size=2').json()
+        self.assertEqual([product['id'] for product in data['results']], ranked_ids[:2])
+        # The ranking is checked a chunk at a time, no further than the page needs;
+        # the ids of every filtered product are never loaded
+        checks = [query['sql'] for query in queries if query['sql'].startswith('SELECT "products_product"."id" AS "id" FROM')]
+        self.assertTrue(0 < len(checks) < len(ranked_ids))
+        self.assertTrue(all('"products_product"."id" IN (' in sql for sql in checks))
+
+    @override_settings(PRODUCT_SEARCH_BACKEND='memory')
+    def test_memory_query_only_ranks_one_page(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/products/?search=phone&page_size=2')
+        self.assertEqual(len(response.json()['results']), 2)
+        # The page query ranks the page, the row after it and the page before it, not all 15 matches
+        self.assertLessEqual(max(query['sql'].count(' WHEN ') for query in queries), 2 * 2 + 2)
+
+    @override_settings(PRODUCT_SEARCH_BACKEND='memory')
+    def test_memory_explicit_ordering(self):
+        prices = [product['price'] for product in self.client.get(
+            '/api/products/?search=red phone&ordering=-price&page_size=all'
+        ).json()]
+        self.assertEqual(prices, sorted(prices, key=Decimal, reverse=True))
+        self.assertEqual(len(prices), 10)
+
+
+def levenshtein(source, target):
+    previous = list(range(len(target) + 1))
+    for row, source_char in enumerate(source, 1):
+        current = [row]
+        for column, target_char in enumerate(target, 1):
+            current.append(min(previous[column] + 1, current[-1] + 1, previous[column - 1] + (source_char != target_char)))
+        previous = current
+    return previous[-1]
+
+
+class WarmIndexesTests(TestCase):
+    """
+    The in-process indexes are built at startup, not by the first request
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        Product.objects.create(
+            name='Desk Lamp', description='A lamp', price=Decimal('10.00'),
+            category=Category.objects.create(name='Home'), image_url='https://example.com/lamp.png', stock=1,
+        )
+
+    def setUp(self):
+        product_index.clear()
+        product_vocabulary.clear()
+
+    @override_settings(PRODUCT_SEARCH_BACKEND='memory')
+    def test_memory_backend(self):
+        warm_indexes()
+        self.assertTrue(product_index.is_built)
+        self.assertIn('lamp', product_vocabulary)
+        lamp_id = Product.objects.get().id
+        # Searches only check the reindex generation
+        with self.assertNumQueries(1):
+            self.assertEqual(product_index.search('lamp'), [lamp_id])
+
+    @override_settings(PRODUCT_SEARCH_BACKEND='keyword')
+    def test_other_backends(self):
+        warm_indexes()
+        self.assertFalse(product_index.is_built)
+
+    @override_settings(PRODUCT_SEARCH_BACKEND='memory', WARM_INDEXES_AT_STARTUP=False)
+    def test_disabled(self):
+        warm_indexes()
+        self.assertFalse(product_index.is_built)
+
+
+class TrigramIndexTests(SimpleTestCase):
+    """
+    The trigram filter must never lose a word a full scan would suggest
+    """
+
+    def test_bounded_levenshtein(self):
+        self.assertEqual(bounded_levenshtein('kitten', 'sitting', 3), 3)
+        self.assertIsNone(bounded_levenshtein('kitten', 'sitting', 2))
+        self.assertEqual(bounded_levenshtein('phone', 'phone', 0), 0)
+        self.assertEqual(bounded_levenshtein('', 'ab', 2), 2)
+        self.assertIsNone(bounded_levenshtein('a', 'abcd', 2))
+        words = random.Random(0)
+        for _ in range(300):
+            source = ''.join(words.choices('abc', k=words.randint(0, 7)))
+            target = ''.join(words.choices('abc', k=words.randint(0, 7)))
+            max_distance = words.randint(0, 3)
+            distance = levenshtein(source, target)
+            with self.subTest(source=source, target=target, max_distance=max_distance):
+                self.assertEqual(
+                    bounded_levenshtein(source, target, max_distance), distance if distance <= max_distance else None
+                )
+
+    def test_suggest_matches_a_full_scan(self):
+        # Words over two letters repeat their trigrams, which a set-based count undercounts
+        vocabulary = [''.join(letters) for length in range(1, 9) for letters in itertools.product('ab', repeat=length)]
+        index = TrigramIndex(vocabulary)
+        words = random.Random(0)
+        for _ in range(200):
+            word = ''.join(words.choices('abc', k=words.randint(2, 9)))
+            max_distance = 1 if len(word) < 7 else 2
+            expected = min(
+                ((distance, term) for term in vocabulary
+                 if (distance := levenshtein(word, term)) <= max_distance),
+                default=None,
+            )
+            with self.subTest(word=word):
+                suggestion = index.suggest(word)
+                self.assertEqual(suggestion and (suggestion.distance, suggestion.term), expected)
+
+    def test_repeated_trigrams(self):
+        # "bbb" occurs twice in both words: they share 4 trigrams, not 3
+        index = TrigramIndex(['abbbb', 'aaaaaaa'])
+        self.assertEqual(index.suggest('cbbbb'), ('abbbb', 1, 1))
+        self.assertEqual(index.suggest('aacaaaaca').term, 'aaaaaaa')
+
+    def test_fewest_edits_then_most_frequent(self):
+        index = TrigramIndex(['phony', 'phone', 'phase'])
+        index.add('phone', 3)
+        self.assertEqual(index.suggest('phonr'), ('phone', 1, 4))
+        self.assertEqual(index.suggest('phoni').term, 'phone')
+        self.assertEqual(index.suggest('phony'), ('phony', 0, 1))
+        self.assertIsNone(index.suggest('camera'))
+
+    def test_discard(self):
+        index = TrigramIndex(['phone', 'phone', 'phony'])
+        index.discard('phone')
+        self.assertIn('phone', index)
+        index.discard('phone')
+        self.assertNotIn('phone', index)
+        self.assertEqual(index.suggest('phone').term, 'phony')
+
+    def test_correct_words(self):
+        vocabulary = TrigramIndex(['wireless', 'headphones', 'laptop', 'case'])
+        self.assertEqual(
+            correct_words("Wireles headphnes for my laptops", [vocabulary]),
+            ("wireless headphones for my laptops", {'wireles': 'wireless', 'headphnes': 'headphones'}),
+        )
+        # Short words, numbers, ignored and unknown words are left alone
+        self.assertEqual(correct_words("cse 1234 wireles zzzzzz", [vocabulary], ignore={'wireles'}),
+                         ("cse 1234 wireles zzzzzz", {}))
+
+    def test_correct_words_across_vocabularies(self):
+        products = TrigramIndex(['laptop'])
+        keywords = TrigramIndex(['show', 'laptops'])
+        keywords.add('laptops', 5)
+        # Both are one edit away: the more frequent term wins
+        self.assertEqual(correct_words("laptopz", [products, keywords]), ("laptops", {'laptopz': 'laptops'}))
+
+
+class ProductVocabularyTests(TestCase):
+    """
+    /api/products/search/ corrects misspelled words against the product names
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Audio')
+        cls.headphones = Product.objects.create(
+            name='Wireless Headphones', description='Over-ear', price=Decimal('99.00'), category=category,
+            image_url='https://example.com/headphones.png', stock=3,
+        )
+
+    def setUp(self):
+        product_vocabulary.clear()
+
+    def test_did_you_mean(self):
+        response = self.client.get('/api/products/search/?q=wireles headphnes')
+        self.assertEqual(response['X-Did-You-Mean'], 'wireless headphones')
+        self.assertEqual([product['id'] for product in response.json()], [self.headphones.id])
+        self.assertNotIn('X-Did-You-Mean', self.client.get('/api/products/search/?q=headphones'))
+
+    def test_generation_is_read_once_per_correction(self):
+        product_vocabulary.build()
+        message = "wireles headphnes wireles headphnes and more wireles headphnes please"
+        with self.assertNumQueries(1):
+            corrected, _ = correct_words(message, [product_vocabulary])
+        self.assertEqual(corrected, message.replace("wireles", "wireless").replace("headphnes", "headphones"))
+        # A request reads it once for all its lookups
+        with self.assertNumQueries(1), catalog_request():
+            for word in message.split():
+                product_vocabulary.suggest(word)
+
+    def test_renamed_product_updates_the_vocabulary(self):
+        self.assertEqual(product_vocabulary.suggest('speker'), None)
+        self.headphones.name = 'Wireless Speaker'
+        self.headphones.save()
+        self.assertEqual(product_vocabulary.suggest('speker').term, 'speaker')
+        self.assertNotIn('headphones', product_vocabulary)
+
+
+class CooccurrenceMatrixTests(SimpleTestCase):
+    """
+    Co-occurrence counts, cosine neighbors and the saved watermark
+    """
+
+    def setUp(self):
+        self.matrix = CooccurrenceMatrix()
+        self.touched = self.matrix.add([([1, 2, 3], 1.0), ([3, 2, 2], 1.0), ([4], 5.0)])
+
+    def test_counts(self):
+        counts = self.matrix.counts.toarray()
+        self.assertEqual(counts.shape, (5, 5))
+        # The diagonal counts each product once per group, repeats included once
+        self.assertEqual(counts.diagonal().tolist(), [0, 1, 2, 2, 5])
+        self.assertEqual((counts[1, 2], counts[2, 1], counts[2, 3], counts[1, 4]), (1, 1, 2, 0))
+        self.assertEqual(self.touched.tolist(), [1, 2, 3, 4])
+        self.assertEqual(self.matrix.add([]).tolist(), [])
+
+    def test_neighbors(self):
+        neighbors = {row: (ids, scores) for row, ids, scores in self.matrix.neighbors([1, 2, 4], k=5)}
+        self.assertEqual(neighbors[2], ([3, 1], [1.0, 0.7071]))
+        # Ties are broken by id
+        self.assertEqual(neighbors[1], ([2, 3], [0.7071, 0.7071]))
+        self.assertEqual(neighbors[4], ([], []))
+        self.assertEqual(next(self.matrix.neighbors([2], k=1))[1:], ([3], [1.0]))
+
+    def test_affected_rows(self):
+        self.assertEqual(self.matrix.affected_rows([1]).tolist(), [1, 2, 3])
+        self.assertEqual(self.matrix.affected_rows([4]).tolist(), [4])
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            directory = Path(directory)
+            empty = CooccurrenceMatrix.load(directory)
+            self.assertEqual((empty.counts.shape, empty.watermark), ((0, 0), 0))
+            self.matrix.watermark = 42
+            self.matrix.save(directory / 'recommendations')
+            loaded = CooccurrenceMatrix.load(directory / 'recommendations')
+        self.assertEqual(loaded.watermark, 42)
+        self.assertEqual(loaded.counts.toarray().tolist(), self.matrix.counts.toarray().tolist())
+
+
+class ProductNeighborsTests(QueryCountAssertionsMixin, TestCase):
+    """
+    Neighbor lists are saved per product and combined into recommendations
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Kitchen')
+        cls.kettle, cls.mug, cls.teapot, cls.toaster = [
+            Product.objects.create(
+                name=name, description=name, price=Decimal('10.00'), category=category,
+                image_url='https://example.com/kitchen.png', stock=1,
+            )
+            for name in ('Kettle', 'Mug', 'Teapot', 'Toaster')
+        ]
+
+    def setUp(self):
+        self.matrix = CooccurrenceMatrix()
+        self.matrix.add([
+            ([self.kettle.id, self.mug.id, self.teapot.id], 1.0),
+            ([self.kettle.id, self.teapot.id], 1.0),
+            ([self.toaster.id], 1.0),
+        ])
+
+    def neighbors(self):
+        return dict(ProductNeighbors.objects.values_list('product_id', 'neighbor_ids'))
+
+    def test_save_neighbors(self):
+        written = save_neighbors(self.matrix, [self.kettle.id, self.mug.id, self.toaster.id, 999])
+        self.assertEqual(written, 2)
+        self.assertEqual(self.neighbors(), {
+            self.kettle.id: [self.teapot.id, self.mug.id],
+            self.mug.id: [self.kettle.id, self.teapot.id],
+        })
+        scores = ProductNeighbors.objects.get(product=self.kettle).scores
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_save_neighbors_updates_and_removes(self):
+        save_neighbors(self.matrix, [self.kettle.id, self.mug.id], k=1)
+        self.assertEqual(self.neighbors()[self.kettle.id], [self.teapot.id])
+        # Deleted products are skipped; products left without neighbors lose their row
+        mug_id = self.mug.id
+        self.mug.delete()
+        self.matrix = CooccurrenceMatrix()
+        self.matrix.add([([mug_id], 1.0), ([self.kettle.id, self.toaster.id], 1.0)])
+        save_neighbors(self.matrix, [self.kettle.id, mug_id])
+        self.assertEqual(self.neighbors(), {self.kettle.id: [self.toaster.id]})
+        self.matrix = CooccurrenceMatrix()
+        self.matrix.add([([self.kettle.id], 1.0)])
+        save_neighbors(self.matrix, [self.kettle.id])
+        self.assertEqual(self.neighbors(), {})
+
+    def test_recommend_product_ids(self):
+        save_neighbors(self.matrix, [self.kettle.id, self.mug.id, self.teapot.id])
+        self.assertEqual(recommend_product_ids([], 5), [])
+        self.assertEqual(recommend_product_ids([self.mug.id], 5), [self.kettle.id, self.teapot.id])
+        # Seeds are never recommended, and earlier seeds count for more
+        self.assertEqual(recommend_product_ids([self.kettle.id, self.mug.id], 5), [self.teapot.id])
+        self.assertEqual(recommend_product_ids([self.teapot.id, self.kettle.id], 1), [self.mug.id])
+        with self.assertNumQueries(1):
+            recommend_product_ids([self.toaster.id, self.mug.id], 5)
+
+    def test_recommended_endpoint_tops_up_with_newest(self):
+        save_neighbors(self.matrix, [self.kettle.id, self.mug.id, self.teapot.id])
+        with mock.patch('chatbot.recommendations.seed_product_ids', return_value=[self.mug.id]):
+            products = self.client.get('/api/products/recommended/').json()
+        self.assertEqual(
+            [product['id'] for product in products], [self.kettle.id, self.teapot.id, self.toaster.id]
+        )
+
+
+class ImportProductsCommandTests(TestCase):
+    """
+    import_products streams a feed into bulk writes and refreshes what the signals would have
+    """
+
+    def setUp(self):
+        Product.objects.create(
+            name='Desk Lamp', description='A lamp', price=Decimal('10.00'),
+            category=Category.objects.create(name='Home'), image_url='https://example.com/lamp.png', stock=1,
+        )
+
+    def import_feed(self, content, suffix, *args):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False) as feed:
+            feed.write(content)
+        self.addCleanup(os.unlink, feed.name)
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('import_products', feed.name, *args, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_csv(self):
+        product_index.build()
+        stdout, stderr = self.import_feed(
+            "name,description,price,category,image_url,stock\n"
+            "Desk Lamp,Another lamp,12.5,home,https://example.com/2.png,3\n"
+            "Desk Lamp,A third lamp,13,Home,https://example.com/3.png,\n"
+            "Desk Lamp 2,Not a duplicate,14,Home,https://example.com/4.png,1\n"
+            "Garden Chair,A chair,abc,Garden,https://example.com/5.png,1\n"
+            "Garden Hose,A hose,20,Garden,https://example.com/6.png,4\n",
+            '.csv', '--batch-size', '2',
+        )
+        self.assertIn("Imported 4 new and 0 updated products, skipped 1 invalid rows", stdout)
+        self.assertIn("Line 5: Invalid price 'abc'", stderr)
+        self.assertEqual(
+            list(Product.objects.order_by('id').values_list('slug', 'category__name', 'price', 'stock')),
+            [
+                ('desk-lamp', 'Home', Decimal('10.00'), 1),
+                ('desk-lamp-2', 'Home', Decimal('12.50'), 3),
+                ('desk-lamp-3', 'Home', Decimal('13.00'), 0),
+                ('desk-lamp-2-2', 'Home', Decimal('14.00'), 1),
+                ('garden-hose', 'Garden', Decimal('20.00'), 4),
+            ],
+        )
+        # Bulk writes send no signals: the in-process index is rebuilt instead
+        self.assertEqual(product_index.search('hose'), [Product.objects.get(slug='garden-hose').id])
+        self.assertIsNotNone(category_cache.id_for_name('Garden'))
+
+    def test_suffix_taken_by_an_earlier_batch(self):
+        # The suffix cached for zed-shirt is behind the zed-shirt-3 of the third batch
+        stdout, _ = self.import_feed(
+            "name,description,price,category,image_url,stock\n"
+            "Zed Shirt,A shirt,10,Clothing,https://example.com/1.png,1\n"
+            "Zed Shirt,A shirt,10,Clothing,https://example.com/2.png,1\n"
+            "Zed Shirt 3,A shirt,10,Clothing,https://example.com/3.png,1\n"
+            "Zed Shirt,A shirt,10,Clothing,https://example.com/4.png,1\n",
+            '.csv', '--batch-size', '1',
+        )
+        self.assertIn("Imported 4 new and 0 updated products", stdout)
+        self.assertEqual(
+            list(Product.objects.filter(slug__startswith='zed').order_by('id').values_list('slug', flat=True)),
+            ['zed-shirt', 'zed-shirt-2', 'zed-shirt-3', 'zed-shirt-4'],
+        )
+
+    def test_jsonl_upsert(self):
+        lamp = Product.objects.get()
+        version = get_catalog_version()
+        stdout, _ = self.import_feed(
+            '{"name": "Desk Lamp", "slug": "desk-lamp", "description": "Brighter", "price": 11, '
+            '"category": "Home", "image_url": "https://example.com/lamp.png", "stock": 5}\n'
+            '\n'
+            '{"name": "Floor Lamp", "price": "30.00", "category": "Home", "image_url": "https://example.com/floor.png"}\n',
+            '.jsonl', '--upsert',
+        )
+        self.assertIn("Imported 1 new and 1 updated products", stdout)
+        updated = Product.objects.get(slug='desk-lamp')
+        self.assertEqual((updated.id, updated.description, updated.stock), (lamp.id, 'Brighter', 5))
+        self.assertEqual(updated.created_at, lamp.created_at)
+        self.assertGreater(updated.updated_at, lamp.updated_at)
+        self.assertTrue(Product.objects.filter(slug='floor-lamp').exists())
+        self.assertNotEqual(get_catalog_version(), version)
+
+    def test_max_errors(self):
+        with self.assertRaises(CommandError):
+            self.import_feed("name,price,category,image_url\nLamp,x,Home,https://example.com/1.png\n", '.csv',
+                             '--max-errors', '0')
+
+
+class SemanticIndexTests(TemporarySemanticIndexMixin, TestCase):
+    """
+    The semantic index is built by its command only; saves update it in place without rebuilding
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Sports')
+        for name, description in [
+            ('Running Shoes', 'Lightweight shoes for runners and joggers'),
+            ('Coffee Mug', 'Insulated mug that keeps coffee hot'),
+            ('Yoga Mat', 'Non-slip mat for yoga and pilates'),
+        ]:
+            Product.objects.create(
+                name=name, description=description, price=Decimal('10.00'), category=cls.category,
+                image_url='https://example.com/product.png', stock=1,
+            )
+
+    def create_product(self, name, description):
+        return Product.objects.create(
+            name=name, description=description, price=Decimal('10.00'), category=self.category,
+            image_url='https://example.com/product.png', stock=1,
+        )
+
+    def test_not_built_by_search(self):
+        self.assertEqual(semantic_index.search('running'), [])
+        self.assertIsNone(semantic_index.vectorize('running'))
+        self.assertEqual(os.listdir(self.semantic_index_dir), [])
+
+    def test_build_and_search(self):
+        call_command('build_semantic_index', stdout=io.StringIO())
+        self.assertEqual(semantic_index.search('joggers', limit=1), [Product.objects.get(name='Running Shoes').id])
+        self.assertEqual(semantic_index.search('insulated cup')[0], Product.objects.get(name='Coffee Mug').id)
+        self.assertEqual(semantic_index.search('the'), [])
+
+    def test_if_missing(self):
+        call_command('build_semantic_index', stdout=io.StringIO())
+        stdout = io.StringIO()
+        call_command('build_semantic_index', '--if-missing', stdout=stdout)
+        self.assertIn("already exists", stdout.getvalue())
+
+    def test_saves_update_in_place(self):
+        call_command('build_semantic_index', stdout=io.StringIO())
+        generation = semantic_index._generation
+        mat = Product.objects.get(name='Yoga Mat')
+        mat.description = 'Thick cushioned mat for meditation'
+        mat.save()
+        kettle = self.create_product('Kettle', 'Electric kettle that boils water fast')
+        self.assertEqual(semantic_index.search('meditation', limit=1), [mat.id])
+        self.assertEqual(semantic_index.search('kettle', limit=1), [kettle.id])
+        kettle.delete()
+        self.assertNotIn(kettle.id, semantic_index.search('kettle'))
+        self.assertEqual(semantic_index._generation, generation)
+
+    def test_full_index_is_not_rebuilt_by_save(self):
+        call_command('build_semantic_index', '--spare-rows', '0', stdout=io.StringIO())
+        generation = semantic_index._generation
+        with self.assertLogs('products.semantic', 'WARNING'):
+            kettle = self.create_product('Kettle', 'Electric kettle that boils water fast')
+        self.assertEqual(semantic_index._generation, generation)
+        self.assertNotIn(kettle.id, semantic_index.search('kettle'))
+        call_command('build_semantic_index', stdout=io.StringIO())
+        self.assertEqual(semantic_index.search('kettle', limit=1), [kettle.id])
@@ -1,46 +1,184 @@
 from django.shortcuts import render
-from rest_framework import viewsets, filters, permissions
+from rest_framework import viewsets, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from .models import Product, Category
 from .serializers import ProductSerializer, CategorySerializer
+from .search import search_product_ids, in_bulk_ordered
+from .filters import ProductSearchFilter, ProductOrderingFilter
+from .pagination import KeysetPagination, CategoryPagination
+from .planning import plan_queryset
+from .fastpath import ValuesSerializer
+from .fragments import product_fragments, key_rows, render_fragments
+from .fuzzy import product_vocabulary, correct_words
+from .recommendations import recommend_product_ids
+from .cache import category_cache
+from .conditional import CatalogConditionalGetMixin
 
 # Create your views here.
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(CatalogConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [permissions.AllowAny]
     lookup_field = 'slug'
+    pagination_class = CategoryPagination
+    
+    def list(self, request, *args, **kwargs):
+        """
+        Categories are paginated like products, in id order; the whole list is
+        an explicit opt-in (?page_size=all), served straight from the category cache
+        """
+        if dict(request.query_params) != {'page_size': ['all']}:
+            return super().list(request, *args, **kwargs)
+        return Response(category_cache.all())
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(CatalogConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [permissions.AllowAny]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter, ProductOrderingFilter]
     filterset_fields = ['category__slug', 'price']
     search_fields = ['name', 'description']
     ordering_fields = ['price', 'created_at', 'name']
     lookup_field = 'slug'
+    pagination_class = KeysetPagination
+    search_limit = 50
+    max_search_limit = 200
+    recommended_limit = 5
+    use_values_serializer = True
+    
+    def get_serializer(self, *args, **kwargs):
+        """
+        Trim reads to ?fields= / ?omit= (comma-separated field names); ?view=compact
+        selects ProductSerializer.COMPACT_FIELDS
+        """
+        if self.request is not None and self.request.method in permissions.SAFE_METHODS:
+            params = self.request.query_params
+            if params.get('fields'):
+                kwargs.setdefault('fields', [name for name in params['fields'].split(',') if name])
+            elif params.get('view') == 'compact':
+                kwargs.setdefault('fields', ProductSerializer.COMPACT_FIELDS)
+            if params.get('omit'):
+                kwargs.setdefault('omit', [name for name in params['omit'].split(',') if name])
+        return super().get_serializer(*args, **kwargs)
+    
+    def get_queryset(self):
+        """
+        Only load the columns and relations the response will render
+        """
+        queryset = super().get_queryset()
+        if self.request.method in permissions.SAFE_METHODS:
+            queryset = plan_queryset(queryset, self.get_serializer().fields)
+        return queryset
+    
+    def get_values_serializer(self):
+        """
+        The read-only fast path for the serializer's fields, or None to use the serializer
+        """
+        if not self.use_values_serializer:
+            return None
+        return ValuesSerializer.compile(self.get_serializer())
+    
+    def list(self, request, *args, **kwargs):
+        """
+        Render the page from the fragment cache, or from values() rows; the
+        output is the same as the serializer's
+        """
+        values_serializer = self.get_values_serializer()
+        if values_serializer is None:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        if product_fragments.max_size:
+            version = self.get_category_version()
+            rows = key_rows(queryset, extra=self.ordering_fields)
+            
+            def render(rows):
+                return render_fragments(values_serializer, self.get_queryset(), rows, version)
+        else:
+            rows = values_serializer.rows(queryset, extra=self.ordering_fields)
+            render = values_serializer.render
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(render(page))
+        return Response(render(rows))
+    
+    def render_ordered(self, values_serializer, queryset, ids):
+        """
+        Render the products with the given ids, in the order given
+        """
+        if not ids:
+            return []
+        if not product_fragments.max_size:
+            return values_serializer.render_ordered(queryset, ids)
+        version = self.get_category_version()
+        rows = {row.id: row for row in key_rows(queryset.filter(id__in=ids))}
+        return render_fragments(values_serializer, queryset, [rows[pk] for pk in ids if pk in rows], version)
     
     @action(detail=False, methods=['get'])
     def search(self, request):
         """
-        Search products by query parameter
+        Search products by query parameter, best matches first
+        Page through the results with `limit` and `offset`
+        When nothing matches, misspelled words are corrected against the product
+        names; the results for the corrected query are returned and the
+        correction is reported in the X-Did-You-Mean header
         """
         query = request.query_params.get('q', '')
         if query:
-            products = self.queryset.filter(name__icontains=query) | self.queryset.filter(description__icontains=query)
+            try:
+                limit = min(int(request.query_params.get('limit', self.search_limit)), self.max_search_limit)
+            except ValueError:
+                limit = self.search_limit
+            try:
+                offset = int(request.query_params.get('offset', 0))
+            except ValueError:
+                offset = 0
+            limit, offset = max(limit, 1), max(offset, 0)
+            product_ids = search_product_ids(query.split(), limit=limit, offset=offset)
+            headers = {}
+            if not product_ids and not offset:
+                corrected, corrections = correct_words(query, [product_vocabulary])
+                if corrections:
+                    product_ids = search_product_ids(corrected.split(), limit=limit)
+                    if product_ids:
+                        headers['X-Did-You-Mean'] = corrected
+            values_serializer = self.get_values_serializer()
+            if values_serializer is not None:
+                return Response(self.render_ordered(values_serializer, self.get_queryset(), product_ids), headers=headers)
+            products = in_bulk_ordered(self.get_queryset(), product_ids)
             serializer = self.get_serializer(products, many=True)
-            return Response(serializer.data)
+            return Response(serializer.data, headers=headers)
         return Response([])
     
     @action(detail=False, methods=['get'])
     def recommended(self, request):
         """
-        Get recommended products (for demo, just returns top 5 products)
+        Get recommended products for the current user, or for the chat session
+        given by `session_id`: the precomputed neighbors of the products the
+        chat last showed them, topped up with the newest products
         """
-        products = self.queryset.order_by('-created_at')[:5]
+        from chatbot.recommendations import seed_product_ids
+        
+        seed_ids = seed_product_ids(request.user, request.query_params.get('session_id'))
+        product_ids = recommend_product_ids(seed_ids, self.recommended_limit)
+        queryset = self.get_queryset()
+        newest = queryset.exclude(id__in=set(seed_ids) | set(product_ids)).order_by('-created_at')
+        values_serializer = self.get_values_serializer()
+        if values_serializer is not None:
+            products = self.render_ordered(values_serializer, queryset, product_ids)
+            if len(products) < self.recommended_limit:
+                if product_fragments.max_size:
+                    version = self.get_category_version()
+                    rows = key_rows(newest)[:self.recommended_limit - len(products)]
+                    products += render_fragments(values_serializer, queryset, rows, version)
+                else:
+                    rows = values_serializer.rows(newest)[:self.recommended_limit - len(products)]
+                    products += values_serializer.render(rows)
+            return Response(products)
+        products = in_bulk_ordered(queryset, product_ids)
+        if len(products) < self.recommended_limit:
+            products += list(newest[:self.recommended_limit - len(products)])
         serializer = self.get_serializer(products, many=True)
         return Response(serializer.data)
@@ -0,0 +1,30 @@
+import logging
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+
+logger = logging.getLogger(__name__)
+
+
+def warm_indexes():
+    """
+    Build the in-process catalog indexes before the first request, so that no
+    request pays for a full build. Called from the ASGI and WSGI entry points;
+    set WARM_INDEXES_AT_STARTUP = False to build them on first use instead.
+    """
+    from .fuzzy import product_vocabulary
+    from .search import get_search_backend, memory_search_backend, product_index
+
+    if not getattr(settings, 'WARM_INDEXES_AT_STARTUP', True):
+        return
+    try:
+        product_vocabulary.build()
+        # The search index is only read by the memory backend
+        if get_search_backend() is memory_search_backend:
+            product_index.build()
+    except DatabaseError as error:
+        # Not migrated yet: the indexes are built on first use
+        logger.warning("Catalog indexes were not built at startup: %s", error)
+    finally:
+        # Requests run on other threads, with their own connections
+        connection.close()
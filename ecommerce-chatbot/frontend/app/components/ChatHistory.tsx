@@ -48,7 +48,7 @@ export default function ChatHistory({
     try {
       setLoading(true);
       const data = await fetchChatHistory();
-      setSessions(data);
+      setSessions(data.results);
       setError(null);
     } catch (err) {
       console.error("Failed to load chat history:", err);
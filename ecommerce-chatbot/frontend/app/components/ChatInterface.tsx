@@ -6,8 +6,8 @@ import ProductCard from "./ProductCard";
 import ChatHistory from "./ChatHistory";
 import {
   createChatSession,
-  sendChatMessage,
-  fetchChatHistory,
+  streamChatMessage,
+  fetchChatMessages,
   deleteChatSession,
 } from "../lib/api";
 
@@ -589,13 +589,12 @@ export default function ChatInterface() {
     try {
       setIsLoading(true);
 
-      // Get the session data with its messages
-      const response = await fetchChatHistory();
-      const session = response.find((s: any) => s.id === sessionId);
+      // Get the session's messages
+      const response = await fetchChatMessages(sessionId);
 
-      if (session && session.messages && session.messages.length > 0) {
+      if (response.messages && response.messages.length > 0) {
         // Format messages to match the ChatMessageType interface
-        const formattedMessages = session.messages.map((msg: any) => ({
+        const formattedMessages = response.messages.map((msg: any) => ({
           id: msg.id,
           role: msg.role,
           content: msg.content,
@@ -711,16 +710,40 @@ export default function ChatInterface() {
     try {
       // Only try to use the real API if we have a valid session ID (not our mock ID)
       if (sessionId && sessionId !== 999) {
-        try {
-          // Send message to API and get response
-          const chatMessages = await sendChatMessage(sessionId, userQuery);
+        // The reply is shown as it streams in, in a placeholder message
+        // that the saved message replaces once the stream completes
+        const streamingId = Date.now() + 1;
+        const removeStreamingMessage = () =>
+          setMessages((prev) => prev.filter((msg) => msg.id !== streamingId));
 
-          // Get the latest assistant message
-          const assistantMessage = chatMessages.find(
-            (msg: any) => msg.role === "assistant" && msg.content
+        try {
+          let streamedContent = "";
+          const assistantMessage = await streamChatMessage(
+            sessionId,
+            userQuery,
+            (delta) => {
+              streamedContent += delta;
+              const content = streamedContent;
+              setMessages((prev) =>
+                prev.some((msg) => msg.id === streamingId)
+                  ? prev.map((msg) =>
+                      msg.id === streamingId ? { ...msg, content } : msg
+                    )
+                  : [
+                      ...prev,
+                      {
+                        id: streamingId,
+                        role: "assistant",
+                        content,
+                        timestamp: new Date().toISOString(),
+                      },
+                    ]
+              );
+            }
           );
+          removeStreamingMessage();
 
-          if (assistantMessage) {
+          if (assistantMessage && assistantMessage.content) {
             // Clear products from ALL previous messages
             // This ensures only the latest message shows products
             setMessages((prev) =>
@@ -812,6 +835,7 @@ export default function ChatInterface() {
           }
           return; // Exit if API call was successful
         } catch (error) {
+          removeStreamingMessage();
           console.error("API call failed, falling back to mock mode:", error);
           // Continue to fallback mode
         }
@@ -618,9 +618,13 @@ function getRelatedProductImage(
 }
 
 // Use public API for public endpoints with fallback to mock if necessary
-export const fetchProducts = async (params = {}) => {
+// Returns one page of products: { next, previous, results }
+// Pass the `next` URL of a previous page to continue from it
+export const fetchProducts = async (params = {}, pageUrl?: string) => {
   try {
-    const response = await publicApi.get("/products/", { params });
+    const response = pageUrl
+      ? await publicApi.get(pageUrl)
+      : await publicApi.get("/products/", { params });
     return response.data;
   } catch (error) {
     console.log("Using mock product data due to API unavailability");
@@ -651,7 +655,7 @@ export const fetchProducts = async (params = {}) => {
           });
         });
       }
-      return extendedMockProducts;
+      return { next: null, previous: null, results: extendedMockProducts };
     }
     throw error;
   }
@@ -712,7 +716,10 @@ export const fetchProduct = async (slug: string) => {
 
 export const fetchCategories = async () => {
   try {
-    const response = await publicApi.get("/categories/");
+    // Categories are paginated; the few there are come back as one list
+    const response = await publicApi.get("/categories/", {
+      params: { page_size: "all" },
+    });
     return response.data;
   } catch (error) {
     console.log("Using mock category data due to API unavailability");
@@ -784,9 +791,11 @@ export const fetchChatSessions = async () => {
   }
 };
 
-export const fetchChatHistory = async () => {
+// Returns one page of sessions: { next, previous, results }
+// Pass the `next` URL of a previous page to continue from it
+export const fetchChatHistory = async (pageUrl?: string) => {
   try {
-    const response = await api.get("/chat-sessions/history/");
+    const response = await api.get(pageUrl || "/chat-sessions/history/");
     return response.data;
   } catch (error) {
     console.error("Failed to fetch chat history:", error);
@@ -822,13 +831,89 @@ export const sendChatMessage = async (sessionId: number, message: string) => {
         message,
       }
     );
-    return response.data;
+    // The API returns only the new user/assistant pair plus a cursor
+    return response.data.messages;
   } catch (error) {
     console.error("Failed to send chat message:", error);
     throw error;
   }
 };
 
+// Send a message and receive the reply as Server-Sent Events.
+// onDelta is called with each chunk of reply text as it arrives;
+// resolves with the saved assistant message once the stream completes.
+// Uses the native async endpoint: under ASGI it sends each event as it is produced.
+export const streamChatMessage = async (
+  sessionId: number,
+  message: string,
+  onDelta: (content: string) => void
+) => {
+  const headers: Record<string, string> = {
+    "Content-Type": "application/json",
+    Accept: "text/event-stream",
+  };
+  const token =
+    typeof window !== "undefined" ? localStorage.getItem("token") : null;
+  if (token) {
+    headers.Authorization = `Bearer ${token}`;
+  }
+
+  const response = await fetch(
+    `${API_URL}/async/chat-sessions/${sessionId}/send_message_stream/`,
+    { method: "POST", headers, body: JSON.stringify({ message }) }
+  );
+  if (!response.ok || !response.body) {
+    throw new Error(`Failed to stream chat message: ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let assistantMessage = null;
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // Events are separated by a blank line
+    let boundary = buffer.indexOf("\n\n");
+    while (boundary !== -1) {
+      const rawEvent = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      boundary = buffer.indexOf("\n\n");
+
+      const event = rawEvent.match(/^event: (.*)$/m)?.[1];
+      const data = rawEvent.match(/^data: (.*)$/m)?.[1];
+      if (!event || !data) continue;
+
+      const payload = JSON.parse(data);
+      if (event === "delta") {
+        onDelta(payload.content);
+      } else if (event === "assistant") {
+        assistantMessage = payload.message;
+      }
+    }
+  }
+  return assistantMessage;
+};
+
+// Fetch only the messages that come after the given message id
+export const fetchChatMessages = async (
+  sessionId: number,
+  afterMessageId?: number
+) => {
+  try {
+    const response = await api.get(`/chat-sessions/${sessionId}/messages/`, {
+      params: afterMessageId ? { after: afterMessageId } : {},
+    });
+    return response.data;
+  } catch (error) {
+    console.error("Failed to fetch chat messages:", error);
+    throw error;
+  }
+};
+
 export const login = async (email: string, password: string) => {
   try {
     console.log("Login attempt with:", { email });
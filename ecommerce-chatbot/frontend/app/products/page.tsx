@@ -28,43 +28,70 @@ interface Category {
   slug: string;
 }
 
+// Products are fetched a page at a time, filtered and sorted by the API
+const PAGE_SIZE = 24;
+
+const SORT_ORDERING: Record<string, string | undefined> = {
+  featured: undefined,
+  "price-asc": "price",
+  "price-desc": "-price",
+  name: "name",
+  newest: "-created_at",
+};
+
+// Convert price strings to numbers for proper sorting and display
+const processProducts = (productsData: any[]): Product[] =>
+  productsData.map((product: any) => ({
+    ...product,
+    price:
+      typeof product.price === "string"
+        ? parseFloat(product.price)
+        : product.price,
+  }));
+
 export default function ProductsPage() {
   const [products, setProducts] = useState<Product[]>([]);
   const [categories, setCategories] = useState<Category[]>([]);
+  const [nextPage, setNextPage] = useState<string | null>(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const [searchQuery, setSearchQuery] = useState("");
+  const [debouncedSearch, setDebouncedSearch] = useState("");
   const [selectedCategory, setSelectedCategory] = useState("all");
   const [sortBy, setSortBy] = useState("featured");
 
-  // Fetch products and categories from API
+  // Fetch categories once
+  useEffect(() => {
+    fetchCategories()
+      .then((categoriesData) =>
+        setCategories([{ id: 0, name: "All", slug: "all" }, ...categoriesData])
+      )
+      .catch((error) => console.error("Error fetching categories:", error));
+  }, []);
+
+  // Wait for the user to stop typing before searching
+  useEffect(() => {
+    const timeout = setTimeout(() => setDebouncedSearch(searchQuery), 300);
+    return () => clearTimeout(timeout);
+  }, [searchQuery]);
+
+  // Fetch the first page whenever the search, category or sort order changes
   useEffect(() => {
     const loadData = async () => {
       try {
         setLoading(true);
         setError(null);
 
-        // Fetch products and categories in parallel
-        const [productsData, categoriesData] = await Promise.all([
-          fetchProducts(),
-          fetchCategories(),
-        ]);
-
-        // Convert price strings to numbers for proper sorting and display
-        const processedProducts = productsData.map((product: any) => ({
-          ...product,
-          price:
-            typeof product.price === "string"
-              ? parseFloat(product.price)
-              : product.price,
-        }));
-
-        setProducts(processedProducts);
-        setCategories([{ id: 0, name: "All", slug: "all" }, ...categoriesData]);
-
-        console.log(
-          `Loaded ${processedProducts.length} products and ${categoriesData.length} categories`
-        );
+        const params: Record<string, string | number> = { page_size: PAGE_SIZE };
+        if (debouncedSearch) params.search = debouncedSearch;
+        if (selectedCategory !== "all") params.category__slug = selectedCategory;
+        const ordering = SORT_ORDERING[sortBy];
+        if (ordering) params.ordering = ordering;
+
+        const page = await fetchProducts(params);
+        setProducts(processProducts(page.results));
+        setNextPage(page.next);
       } catch (error) {
         console.error("Error fetching data:", error);
         setError(
@@ -76,34 +103,21 @@ export default function ProductsPage() {
     };
 
     loadData();
-  }, []);
+  }, [debouncedSearch, selectedCategory, sortBy]);
 
-  // Filter products based on search query and category
-  const filteredProducts = products.filter((product) => {
-    const matchesSearch =
-      product.name.toLowerCase().includes(searchQuery.toLowerCase()) ||
-      product.description.toLowerCase().includes(searchQuery.toLowerCase());
-
-    if (selectedCategory === "all") return matchesSearch;
-
-    const matchesCategory = product.category.slug === selectedCategory;
-
-    return matchesSearch && matchesCategory;
-  });
-
-  // Sort products
-  const sortedProducts = [...filteredProducts].sort((a, b) => {
-    if (sortBy === "price-asc") return a.price - b.price;
-    if (sortBy === "price-desc") return b.price - a.price;
-    if (sortBy === "name") return a.name.localeCompare(b.name);
-    if (sortBy === "newest")
-      return (
-        new Date(b.created_at || 0).getTime() -
-        new Date(a.created_at || 0).getTime()
-      );
-    // Default: featured
-    return 0;
-  });
+  const loadMore = async () => {
+    if (!nextPage) return;
+    try {
+      setLoadingMore(true);
+      const page = await fetchProducts({}, nextPage);
+      setProducts((current) => [...current, ...processProducts(page.results)]);
+      setNextPage(page.next);
+    } catch (error) {
+      console.error("Error fetching more products:", error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
 
   return (
     <div className="min-h-screen flex flex-col">
@@ -179,8 +193,9 @@ export default function ProductsPage() {
 
           {/* Display products count */}
           <div className="mb-6 text-gray-300">
-            Showing {sortedProducts.length}{" "}
-            {sortedProducts.length === 1 ? "product" : "products"}
+            Showing {products.length}
+            {nextPage ? "+" : ""}{" "}
+            {products.length === 1 ? "product" : "products"}
             {searchQuery && ` matching "${searchQuery}"`}
             {selectedCategory !== "all" &&
               categories.find((c) => c.slug === selectedCategory) &&
@@ -193,12 +208,25 @@ export default function ProductsPage() {
             <div className="flex justify-center items-center h-64">
               <div className="animate-spin rounded-full h-32 w-32 border-b-2 border-purple-400"></div>
             </div>
-          ) : sortedProducts.length > 0 ? (
-            <div className="grid grid-cols-1 sm:grid-cols-2 md:grid-cols-3 lg:grid-cols-4 gap-6">
-              {sortedProducts.map((product) => (
-                <ProductCard key={product.id} product={product} />
-              ))}
-            </div>
+          ) : products.length > 0 ? (
+            <>
+              <div className="grid grid-cols-1 sm:grid-cols-2 md:grid-cols-3 lg:grid-cols-4 gap-6">
+                {products.map((product) => (
+                  <ProductCard key={product.id} product={product} />
+                ))}
+              </div>
+              {nextPage && (
+                <div className="flex justify-center mt-8">
+                  <button
+                    onClick={loadMore}
+                    disabled={loadingMore}
+                    className="bg-purple-600 text-white px-6 py-2 rounded-md transition-all duration-300 ease-in-out hover:bg-purple-500 hover:scale-105 hover:shadow-[0_0_15px_rgba(139,92,246,0.7)] disabled:opacity-50"
+                  >
+                    {loadingMore ? "Loading..." : "Load More"}
+                  </button>
+                </div>
+              )}
+            </>
           ) : (
             <div className="text-center py-12">
               <div className="text-gray-400 text-lg mb-4">